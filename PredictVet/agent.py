@@ -1,34 +1,553 @@
-from PredictVet.tools import all_tools
-from google.adk.agents import LlmAgent
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, NamedTuple
+
+from PredictVet import catalog, logging_config, metrics
+from PredictVet.analysis_cache import get_analysis_cache, make_key
+from PredictVet.llm_client import DEFAULT_PRIORITY, LLM_URL, LLMError, LLMOverloadedError, LLMTimeoutError, get_llm_client
+from PredictVet.matching import option_index
+from PredictVet.menus import get_menus
+from PredictVet.priority import BACKGROUND, complaint_priority
+from PredictVet.prompt_budget import merge_answer
+from PredictVet.session_store import SessionStore, get_session_store
+from PredictVet.single_flight import SingleFlight
+from PredictVet.triage import classify
 from PredictVet.tools import (
-    load_dataframes,
+    PROMPT_TEMPLATE_VERSION,
     ListarCategorias,
     ListarQueixasPorCategoria,
     GerarPerguntaEspecifica,
-    GerarAnaliseFinal
+    GerarAnaliseFinal,
+    GerarRelatorioLocal
 )
 
-# Opção 1: Importar do google.genai
-try:
-    from google.genai import types
-    Content = types.Content
-    Part = types.Part
-except ImportError:
-    # Opção 2: Usar apenas strings ou dict como fallback
-    Content = dict  # Fallback temporário
-    Part = dict     # Fallback temporário
-
-# Load dataframes when the module is loaded
-load_dataframes()
-
-# 1. Instancie seu LlmAgent como um componente
-llm_component = LlmAgent(
-    model="gemini-2.0-flash-exp",
-    name="PredictVetLLMComponent",
-    description="Componente LLM para o PredictVet, responsável pela geração de texto.",
-    instruction="Você é um assistente veterinário especializado em ajudar médicos veterinários no momento do atendimento de cães e gatos. Sempre responda em português brasileiro (PT-BR).",
-    tools=all_tools
-)
+if TYPE_CHECKING:
+    # Apenas para anotações: importar google.genai custa ~1s no cold start
+    from google.genai.types import Content
+
+logger = logging.getLogger(__name__)
+
+# Diagnósticos vão para o logging (PREDICTVET_LOG_*) e as métricas para um endpoint opcional
+if logging_config.CONFIGURED_BY_ENV:
+    logging_config.configure_logging()
+if metrics.METRICS_PORT:
+    metrics.start_http_server(metrics.METRICS_PORT)
+
+_STEP_SECONDS = metrics.histogram("predictvet_step_seconds", "Dialogue step latency, excluding the final LLM call")
+_LLM_SECONDS = metrics.histogram("predictvet_llm_seconds", "LLM call latency")
+_LLM_CALLS = metrics.counter("predictvet_llm_calls_total", "LLM calls by mode and outcome")
+_LOCAL_REPORTS = metrics.counter("predictvet_local_reports_total", "Analyses answered with the local report, by reason")
+_TRIAGE = metrics.counter("predictvet_triage_total", "Free-text triage of navigation messages, by outcome")
+
+# O catálogo é carregado na primeira consulta (ou no warmup), não na importação
+_llm_component_lock = threading.Lock()
+
+# 1. Instancie seu LlmAgent como um componente (sob demanda)
+def _build_llm_component():
+    """Constrói o LlmAgent. google.adk só é importado aqui."""
+    from google.adk.agents import LlmAgent
+    from PredictVet.tools import all_tools
+
+    return LlmAgent(
+        model="gemini-2.0-flash-exp",
+        name="PredictVetLLMComponent",
+        description="Componente LLM para o PredictVet, responsável pela geração de texto.",
+        instruction="Você é um assistente veterinário especializado em ajudar médicos veterinários no momento do atendimento de cães e gatos. Sempre responda em português brasileiro (PT-BR).",
+        tools=all_tools
+    )
+
+def get_llm_component():
+    """
+    Retorna o componente LLM, construindo-o no primeiro uso.
+    Um llm_component atribuído ao módulo (ex.: um mock em testes) tem precedência.
+    """
+    component = globals().get("llm_component")
+    if component is None:
+        with _llm_component_lock:
+            component = globals().get("llm_component")
+            if component is None:
+                component = _build_llm_component()
+                globals()["llm_component"] = component
+                # 3. Use diretamente o LlmAgent como root_agent
+                globals().setdefault("root_agent", component)
+    return component
+
+def __getattr__(name):
+    # llm_component e root_agent são construídos no primeiro acesso (ex.: pelo adk api_server)
+    if name in ("llm_component", "root_agent"):
+        get_llm_component()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@contextmanager
+def _llm_call(mode: str):
+    """Mede uma chamada ao LLM (sync, async, stream ou speculative) e conta o resultado."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "cancelled"
+        raise
+    finally:
+        _LLM_SECONDS.observe(time.perf_counter() - started, mode=mode)
+        _LLM_CALLS.inc(mode=mode, outcome=outcome)
+
+# Comandos que reiniciam o fluxo a partir de qualquer etapa
+RESTART_COMMANDS = ["INICIAR_FLUXO", "INICIAR", "COMEÇAR"]
+
+def _extract_message_text(new_message: Content) -> str:
+    """Extrai o texto da mensagem recebida (Content do ADK ou string simples)."""
+    user_message_text = ""
+    if hasattr(new_message, 'parts') and new_message.parts:
+        part = new_message.parts[0]
+        if hasattr(part, 'text'):
+            user_message_text = part.text.strip()
+    elif isinstance(new_message, str):
+        user_message_text = new_message.strip()
+    return user_message_text
+
+# Geração especulativa da análise final (opt-in): começa ao registrar a resposta,
+# enquanto o usuário ainda lê a confirmação
+SPECULATIVE_ANALYSIS = os.environ.get("PREDICTVET_SPECULATIVE_ANALYSIS", "").lower() in ("1", "true", "sim", "yes")
+SPECULATIVE_WORKERS = int(os.environ.get("PREDICTVET_SPECULATIVE_WORKERS", "4"))
+SPECULATIVE_MAX_PENDING = int(os.environ.get("PREDICTVET_SPECULATIVE_MAX_PENDING", "256"))
+
+# Relatório local (PredictVet.scoring), sem chamar o LLM: "fallback" quando o LLM falha,
+# estoura o prazo ou está acima do limite de chamadas; "always" para nunca chamar o LLM
+# (modo degradado sob carga); "off" para apenas informar o erro
+LOCAL_ANALYSIS = os.environ.get("PREDICTVET_LOCAL_ANALYSIS", "fallback").lower()
+
+# Triagem do texto livre (PredictVet.triage): "cachorro vomitando desde ontem" vai direto
+# à pergunta de "Vômito", sem passar pelos menus de categoria e queixa
+TRIAGE = os.environ.get("PREDICTVET_TRIAGE", "1").lower() in ("1", "true", "sim", "yes")
+
+class _AnalysisRequest(NamedTuple):
+    """
+    Análise final pronta para ser gerada: texto em cache, geração especulativa
+    já iniciada ou prompt para o LLM, com a prioridade da queixa no catálogo
+    (PredictVet.priority) para a fila de chamadas ao LLM.
+    """
+    complaint: str
+    cache_key: str
+    cached_text: str | None
+    prompt: str | None
+    speculation: Future | None = None
+    priority: int = DEFAULT_PRIORITY
+
+ANALYSIS_FOOTER = "\n\n---\n💡 **Para uma nova consulta, digite 'INICIAR' ou envie uma nova mensagem.**"
+
+def _analysis_header(selected_complaint: str) -> str:
+    return f"🔍 **Análise Veterinária Completa**\n\n**Caso:** {selected_complaint}\n\n"
+
+def _analysis_error(error: Exception) -> str:
+    return (f"❌ Erro ao gerar a análise final: {error}.\n\n"
+            "Suas respostas foram mantidas: digite **\"sim\"** para tentar novamente ou 'INICIAR' para recomeçar.")
+
+RETRY_FOOTER = "\n\n---\n🔁 **Digite \"sim\" para tentar a análise completa novamente ou 'INICIAR' para uma nova consulta.**"
+
+def _local_report(selected_complaint: str, collected_answers: dict) -> str:
+    return (f"📋 **Relatório Preliminar (sem IA)**\n\n**Caso:** {selected_complaint}\n\n"
+            + GerarRelatorioLocal(queixa_selecionada=selected_complaint, respostas_coletadas=collected_answers))
+
+def _response_text(response) -> str:
+    return response.text if hasattr(response, 'text') else str(response)
+
+def _reset_session_state(agent_session_state: dict) -> None:
+    """Reset para próxima interação (após a análise final ou um reinício)."""
+    agent_session_state["current_step"] = "initial"
+    agent_session_state["selected_category"] = None
+    agent_session_state["selected_complaint"] = None
+    agent_session_state["collected_answers"] = {}
+    agent_session_state["last_question_asked"] = None
+    # Estados gravados por versões antigas ainda podem trazer as listas copiadas
+    agent_session_state.pop("available_categories", None)
+    agent_session_state.pop("available_complaints", None)
+    agent_session_state["catalog_version"] = None
+    _discard_speculation(agent_session_state)
+
+def _prepare_analysis(selected_complaint: str, collected_answers: dict) -> _AnalysisRequest:
+    """
+    Resolve tudo o que depende do catálogo fixado na consulta: a chave do cache e,
+    se não houver análise em cache, o prompt final. Não chama o LLM.
+    """
+    snapshot = catalog.active_snapshot()
+    cache_key = make_key(selected_complaint, collected_answers, PROMPT_TEMPLATE_VERSION,
+                         snapshot.version if snapshot else None)
+    # Emergências do catálogo (ex.: obstrução urinária) passam à frente na fila do LLM
+    priority = complaint_priority(selected_complaint)
+    # Uma geração especulativa para exatamente estas respostas é reaproveitada
+    speculation = _take_speculation(cache_key)
+    if speculation is not None:
+        future, prompt = speculation
+        return _AnalysisRequest(selected_complaint, cache_key, None, prompt, future, priority)
+
+    # Casos equivalentes já analisados são servidos do cache, sem chamar o LLM
+    cached_text = get_analysis_cache().get(cache_key)
+    prompt = None
+    if cached_text is None:
+        prompt = GerarAnaliseFinal(queixa_selecionada=selected_complaint, respostas_coletadas=collected_answers)
+    return _AnalysisRequest(selected_complaint, cache_key, cached_text, prompt, priority=priority)
+
+# --- Geração especulativa ---
+_speculations = OrderedDict()
+_speculations_lock = threading.Lock()
+_speculation_executor = None
+
+def _component_backend(prompt: str, timeout: float) -> str:
+    # O prazo é imposto pelo cliente (PredictVet.llm_client): generate_content não recebe timeout
+    return _response_text(get_llm_component().generate_content(prompt))
+
+async def _component_backend_async(prompt: str, timeout: float) -> str:
+    # Aguardada no event loop; componentes sem generate_content_async rodam em uma thread
+    component = get_llm_component()
+    generate_async = getattr(component, "generate_content_async", None)
+    if generate_async is None:
+        return await asyncio.to_thread(_component_backend, prompt, timeout)
+    return _response_text(await generate_async(prompt))
+
+def _component_stream(prompt: str) -> Iterator[str]:
+    for chunk in get_llm_component().generate_content_stream(prompt):
+        text = _response_text(chunk)
+        if text:
+            yield text
+
+def generate_analysis_text(prompt: str, mode: str = "sync", priority: int = DEFAULT_PRIORITY) -> str:
+    """
+    Chama o LLM pelo cliente do processo: fila por prioridade, prazo por chamada,
+    novas tentativas com backoff para erros transitórios e, se configurado,
+    requisições em hedge.
+    """
+    with _llm_call(mode):
+        return get_llm_client(_component_backend, _component_backend_async).generate(prompt, priority=priority)
+
+# Pedidos simultâneos da mesma análise (recepção e veterinário confirmando o mesmo
+# caso, um "sim" repetido) compartilham uma única chamada ao LLM
+_analysis_flights = SingleFlight("analysis")
+
+def _flight_key(prompt: str) -> str:
+    """
+    Chave do voo compartilhado: o digest do prompt exato. A chave do cache é
+    normalizada e pode juntar prompts diferentes; um voo só junta pedidos que
+    enviariam ao LLM exatamente o mesmo texto.
+    """
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+def _generate_shared(cache_key: str, prompt: str, mode: str = "sync", priority: int = DEFAULT_PRIORITY) -> str:
+    """
+    Gera a análise uma única vez para todos os pedidos em andamento com este prompt.
+    O texto entra no cache antes de a chave ser liberada.
+    """
+    def generate() -> str:
+        text = generate_analysis_text(prompt, mode, priority)
+        get_analysis_cache().put(cache_key, text)
+        return text
+
+    return _analysis_flights.do(_flight_key(prompt), generate)
+
+def _start_speculation(agent_session_state: dict) -> None:
+    """
+    Inicia em segundo plano a análise para as respostas já coletadas e guarda a
+    chave no estado da sessão. Roda dentro do catálogo fixado da consulta.
+    """
+    global _speculation_executor
+    _discard_speculation(agent_session_state)
+    try:
+        request = _prepare_analysis(agent_session_state["selected_complaint"], agent_session_state["collected_answers"])
+    except Exception as e:
+        logger.warning("Speculative analysis not started: %s", e)
+        return
+    if request.speculation is not None:
+        # Outra sessão já antecipou exatamente esta análise: compartilha a mesma geração
+        _store_speculation(request.cache_key, request.speculation, request.prompt)
+        agent_session_state["speculative_key"] = request.cache_key
+        return
+    if request.prompt is None:
+        # Já está em cache: nada a antecipar
+        return
+
+    with _speculations_lock:
+        if _speculation_executor is None:
+            _speculation_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="predictvet-speculative")
+        # Ninguém aguarda a especulação ainda: ela fica um nível abaixo das confirmações da mesma prioridade
+        future = _speculation_executor.submit(_generate_shared, request.cache_key, request.prompt, "speculative",
+                                              min(request.priority + 1, BACKGROUND))
+    _store_speculation(request.cache_key, future, request.prompt)
+    agent_session_state["speculative_key"] = request.cache_key
+
+def _store_speculation(cache_key: str, future: Future, prompt: str) -> None:
+    with _speculations_lock:
+        _speculations[cache_key] = (future, prompt)
+        # Limite de especulações pendentes: as mais antigas são descartadas
+        while len(_speculations) > SPECULATIVE_MAX_PENDING:
+            _, (oldest, _) = _speculations.popitem(last=False)
+            oldest.cancel()
+
+def _take_speculation(cache_key: str) -> tuple | None:
+    with _speculations_lock:
+        return _speculations.pop(cache_key, None)
+
+def _discard_speculation(agent_session_state: dict) -> None:
+    """
+    Descarta a especulação da sessão ("não", novas respostas ou reinício).
+    Uma chamada ainda na fila é cancelada; uma já em andamento termina e é ignorada.
+    """
+    cache_key = agent_session_state.pop("speculative_key", None)
+    if cache_key:
+        speculation = _take_speculation(cache_key)
+        if speculation is not None:
+            speculation[0].cancel()
+
+def _speculation_result(future: Future) -> str | None:
+    """Resultado da especulação, ou None se ela falhou ou foi cancelada (gera de novo)."""
+    try:
+        return future.result()
+    except Exception as e:
+        # Inclui concurrent.futures.CancelledError (especulação descartada)
+        logger.warning("Speculative analysis failed, generating again: %r", e)
+        return None
+
+def _keep_for_retry(agent_session_state: dict, error: Exception) -> str:
+    """
+    Falha na geração: a sessão continua na confirmação, com as respostas coletadas,
+    para que um novo "sim" tente de novo sem refazer a consulta.
+    """
+    logger.warning("Final analysis failed; session kept for retry: %r", error)
+    agent_session_state.pop("speculative_key", None)
+    agent_session_state["current_step"] = "confirm_analysis"
+    if LOCAL_ANALYSIS == "off":
+        return _analysis_error(error)
+
+    # Modo degradado: relatório local com o catálogo da consulta, sem nova chamada ao LLM
+    reason = "timeout" if isinstance(error, LLMTimeoutError) else "overloaded" if isinstance(error, LLMOverloadedError) else "error"
+    _LOCAL_REPORTS.inc(reason=reason)
+    with catalog.pinned_snapshot(agent_session_state.get("catalog_version")):
+        report = _local_report(agent_session_state.get("selected_complaint"), agent_session_state.get("collected_answers"))
+    return f"⚠️ A análise completa não pôde ser gerada agora ({error}).\n\n" + report + RETRY_FOOTER
+
+def _complete_analysis(request: _AnalysisRequest, agent_session_state: dict) -> str:
+    """Gera a análise final (uma única chamada ao LLM) e reinicia a sessão."""
+    try:
+        final_analysis_text = request.cached_text
+        if final_analysis_text is None and request.speculation is not None:
+            final_analysis_text = _speculation_result(request.speculation)
+        if final_analysis_text is None:
+            final_analysis_text = _generate_shared(request.cache_key, request.prompt, priority=request.priority)
+    except Exception as e:
+        return _keep_for_retry(agent_session_state, e)
+
+    _reset_session_state(agent_session_state)
+    return _analysis_header(request.complaint) + final_analysis_text + ANALYSIS_FOOTER
+
+async def generate_analysis_text_async(prompt: str, priority: int = DEFAULT_PRIORITY) -> str:
+    """
+    Chama o LLM sem bloquear o event loop: a chamada pelo cliente (fila, prazo,
+    novas tentativas e hedge) é aguardada no próprio loop, sem ocupar uma thread
+    por chamada. Cancelar o await cancela também a requisição em andamento.
+    """
+    client = get_llm_client(_component_backend, _component_backend_async)
+    with _llm_call("async"):
+        return await client.agenerate(prompt, priority=priority)
+
+async def _generate_shared_async(cache_key: str, prompt: str, priority: int = DEFAULT_PRIORITY) -> str:
+    """Versão assíncrona de _generate_shared, com os mesmos voos compartilhados."""
+    flight_key = _flight_key(prompt)
+    flight, leader = _analysis_flights.claim(flight_key)
+    if not leader:
+        # shield: um pedido cancelado não cancela a geração de quem a lidera
+        return await asyncio.shield(asyncio.wrap_future(flight))
+    try:
+        text = await generate_analysis_text_async(prompt, priority)
+        await asyncio.to_thread(get_analysis_cache().put, cache_key, text)
+    except Exception as e:
+        _analysis_flights.finish(flight_key, flight, error=e)
+        raise
+    except BaseException:
+        # Líder cancelado (ex.: cliente desconectou): libera quem aguardava a mesma análise
+        _analysis_flights.finish(flight_key, flight, error=LLMError("Geração interrompida."))
+        raise
+    _analysis_flights.finish(flight_key, flight, text)
+    return text
+
+async def _speculation_result_async(future: Future) -> str | None:
+    """Versão assíncrona de _speculation_result: aguarda sem ocupar uma thread."""
+    try:
+        return await asyncio.shield(asyncio.wrap_future(future))
+    except asyncio.CancelledError:
+        if not future.cancelled():
+            raise
+        # Especulação descartada (não o await deste pedido)
+        logger.warning("Speculative analysis cancelled, generating again")
+        return None
+    except Exception as e:
+        logger.warning("Speculative analysis failed, generating again: %r", e)
+        return None
+
+async def _complete_analysis_async(request: _AnalysisRequest, agent_session_state: dict) -> str:
+    """Versão assíncrona de _complete_analysis."""
+    try:
+        final_analysis_text = request.cached_text
+        if final_analysis_text is None and request.speculation is not None:
+            final_analysis_text = await _speculation_result_async(request.speculation)
+        if final_analysis_text is None:
+            final_analysis_text = await _generate_shared_async(request.cache_key, request.prompt, request.priority)
+    except asyncio.CancelledError:
+        # Cancelamento (ex.: cliente desconectou) não é erro de geração: a sessão
+        # continua na confirmação para que um novo "sim" possa ser enviado
+        raise
+    except Exception as e:
+        return _keep_for_retry(agent_session_state, e)
+
+    _reset_session_state(agent_session_state)
+    return _analysis_header(request.complaint) + final_analysis_text + ANALYSIS_FOOTER
+
+def _iter_llm_chunks(prompt: str, priority: int = DEFAULT_PRIORITY) -> Iterator[str]:
+    """
+    Repassa os trechos do LLM à medida que chegam (generate_content_stream), com o
+    prazo e as novas tentativas do cliente até o primeiro trecho. Componentes sem
+    streaming, e o backend HTTP, produzem um único trecho com a resposta completa.
+    """
+    if LLM_URL or not hasattr(get_llm_component(), "generate_content_stream"):
+        yield generate_analysis_text(prompt, priority=priority)
+        return
+    with _llm_call("stream"):
+        client = get_llm_client(_component_backend, _component_backend_async)
+        yield from client.stream(prompt, _component_stream, priority=priority)
+
+def _stream_analysis(request: _AnalysisRequest, agent_session_state: dict) -> Iterator[str]:
+    """Versão em streaming de _complete_analysis: cabeçalho imediato, depois os trechos do LLM."""
+    yield _analysis_header(request.complaint)
+
+    cached_text = request.cached_text
+    if cached_text is None and request.speculation is not None:
+        cached_text = _speculation_result(request.speculation)
+    flight = flight_key = None
+    if cached_text is None:
+        flight_key = _flight_key(request.prompt)
+        flight, leader = _analysis_flights.claim(flight_key)
+        if not leader:
+            # A mesma análise já está sendo gerada para outro pedido: recebe o texto completo
+            try:
+                cached_text = flight.result()
+            except Exception as e:
+                yield "\n\n" + _keep_for_retry(agent_session_state, e)
+                return
+    if cached_text is not None:
+        _reset_session_state(agent_session_state)
+        yield cached_text + ANALYSIS_FOOTER
+        return
+
+    chunks = []
+    try:
+        for text in _iter_llm_chunks(request.prompt, request.priority):
+            chunks.append(text)
+            yield text
+    except Exception as e:
+        _analysis_flights.finish(flight_key, flight, error=e)
+        yield "\n\n" + _keep_for_retry(agent_session_state, e)
+        return
+    except BaseException:
+        # Streaming interrompido (ex.: cliente desconectou): libera quem aguardava a mesma análise
+        _analysis_flights.finish(flight_key, flight, error=LLMError("Geração interrompida."))
+        raise
+
+    final_analysis_text = "".join(chunks)
+    get_analysis_cache().put(request.cache_key, final_analysis_text)
+    _analysis_flights.finish(flight_key, flight, final_analysis_text)
+    _reset_session_state(agent_session_state)
+    yield ANALYSIS_FOOTER
+
+def _begin_turn(new_message: Content, agent_session_state: dict) -> str | _AnalysisRequest:
+    """
+    Inicializa o estado e executa a etapa atual com o catálogo fixado na consulta.
+    Retorna a resposta pronta ou, na confirmação da análise, um _AnalysisRequest.
+    """
+    # Initialize state variables if they don't exist
+    agent_session_state.setdefault("current_step", "initial")
+    agent_session_state.setdefault("selected_category", None)
+    agent_session_state.setdefault("selected_complaint", None)
+    agent_session_state.setdefault("collected_answers", {})
+    agent_session_state.setdefault("last_question_asked", None)
+    agent_session_state.setdefault("catalog_version", None)
+
+    user_message_text = _extract_message_text(new_message)
+
+    # Novas consultas sempre começam na versão mais recente do catálogo
+    starting_over = agent_session_state["current_step"] == "initial" or user_message_text.upper() in RESTART_COMMANDS
+    pinned_version = None if starting_over else agent_session_state["catalog_version"]
+
+    step = "initial" if starting_over else agent_session_state["current_step"]
+    with catalog.pinned_snapshot(pinned_version), _STEP_SECONDS.time(step=step):
+        return _handle_step(user_message_text, agent_session_state)
+
+def _select_category(agent_session_state: dict, menus, selected_category_name: str) -> str:
+    """Seleciona a categoria e mostra o menu de queixas dela."""
+    complaint_menu = menus.complaints.get(selected_category_name)
+
+    if complaint_menu is None:
+        queixas = ListarQueixasPorCategoria(categoria=selected_category_name)
+        return f"❌ Houve um problema ao listar as queixas para '{selected_category_name}': {queixas[0] if queixas else 'Nenhuma queixa disponível.'}. Por favor, escolha uma categoria novamente."
+
+    # Atualiza o estado
+    agent_session_state["selected_category"] = selected_category_name
+    agent_session_state["current_step"] = "choose_complaint"
+
+    return complaint_menu.selected
+
+def _select_complaint(agent_session_state: dict, selected_complaint_name: str) -> str:
+    """Seleciona a queixa e faz a pergunta específica dela."""
+    # Gera pergunta específica
+    pergunta = GerarPerguntaEspecifica(queixa=selected_complaint_name)
+
+    if "Error:" in pergunta:
+        return f"❌ Houve um problema ao gerar a pergunta para '{selected_complaint_name}': {pergunta}. Por favor, selecione a queixa novamente."
+
+    # Atualiza o estado
+    agent_session_state["selected_complaint"] = selected_complaint_name
+    agent_session_state["current_step"] = "answer_question"
+    agent_session_state["last_question_asked"] = pergunta
+
+    return f"""📋 **Queixa selecionada: {selected_complaint_name}**
+
+Para uma análise mais precisa, preciso de uma informação adicional:
+
+**{pergunta}**
+
+Por favor, forneça sua resposta com o máximo de detalhes possível."""
+
+def _triage(user_message_text: str, agent_session_state: dict, menus, complaint_only: bool = False) -> str | None:
+    """
+    Tenta classificar o texto livre em categoria e queixa. Retorna a resposta já na
+    pergunta específica (ou no menu de queixas, se só a categoria ficou clara), ou None.
+    """
+    if not TRIAGE:
+        return None
+    triage = classify(user_message_text)
+    if triage is None or triage.categoria not in menus.complaints or (complaint_only and triage.queixa is None):
+        _TRIAGE.inc(outcome="none")
+        return None
+
+    if triage.queixa is None:
+        _TRIAGE.inc(outcome="category")
+        return f"🔎 **Pela sua mensagem, identifiquei a categoria {triage.categoria}.**\n\n" + \
+            _select_category(agent_session_state, menus, triage.categoria)
+
+    _TRIAGE.inc(outcome="complaint")
+    agent_session_state["selected_category"] = triage.categoria
+    agent_session_state["current_step"] = "choose_complaint"
+    return f"🔎 **Pela sua mensagem, identifiquei: {triage.categoria} › {triage.queixa}.** " \
+           f"Se não for isso, digite **INICIAR** para escolher pelos menus.\n\n" + \
+           _select_complaint(agent_session_state, triage.queixa)
 
 # 2. Função de lógica de diálogo REFINADA
 def handle_predictvet_interaction(
@@ -39,69 +558,134 @@ def handle_predictvet_interaction(
     """
     Processa uma nova mensagem do usuário e gerencia o fluxo do diálogo para PredictVet.
     Versão refinada que é mais proativa na apresentação de opções.
+    Uma consulta em andamento continua usando a versão do catálogo em que começou,
+    mesmo que as planilhas sejam recarregadas no meio do caminho.
     """
     # Ensure agent_session_state is initialized
     if not isinstance(agent_session_state, dict):
         agent_session_state = {}
 
-    # Initialize state variables if they don't exist
-    agent_session_state.setdefault("current_step", "initial")
-    agent_session_state.setdefault("selected_category", None)
-    agent_session_state.setdefault("selected_complaint", None)
-    agent_session_state.setdefault("collected_answers", {})
-    agent_session_state.setdefault("last_question_asked", None)
+    result = _begin_turn(new_message, agent_session_state)
+    if isinstance(result, _AnalysisRequest):
+        return _complete_analysis(result, agent_session_state)
+    return result
 
-    user_message_text = ""
-    # Parse new_message
-    if hasattr(new_message, 'parts') and new_message.parts:
-        part = new_message.parts[0]
-        if hasattr(part, 'text'):
-            user_message_text = part.text.strip()
-    elif isinstance(new_message, str):
-        user_message_text = new_message.strip()
+async def handle_predictvet_interaction_async(
+    new_message: Content,
+    agent_session_state: dict,
+    **kwargs
+) -> str:
+    """
+    Versão assíncrona de handle_predictvet_interaction para servidores asyncio.
+    As etapas de navegação são consultas em memória e respondem sem esperar;
+    a primeira carga do catálogo roda em uma thread e a chamada ao LLM é aguardada
+    (e pode ser cancelada), de modo que uma análise lenta não ocupa o worker.
+    As etapas que preparam a análise (confirmação e, com geração especulativa, a
+    última resposta) rodam em uma thread: montar o índice de busca após uma
+    recarga do catálogo pode esperar pela trava de construção.
+    """
+    # Ensure agent_session_state is initialized
+    if not isinstance(agent_session_state, dict):
+        agent_session_state = {}
+
+    if catalog.current_snapshot() is None:
+        # Primeira carga do catálogo (leitura de disco) fora do event loop
+        await asyncio.to_thread(catalog.ensure_loaded)
+
+    current_step = agent_session_state.get("current_step")
+    if current_step == "confirm_analysis" or (SPECULATIVE_ANALYSIS and current_step == "answer_question"):
+        result = await asyncio.to_thread(_begin_turn, new_message, agent_session_state)
+    else:
+        result = _begin_turn(new_message, agent_session_state)
+    if isinstance(result, _AnalysisRequest):
+        return await _complete_analysis_async(result, agent_session_state)
+    return result
+
+def stream_predictvet_interaction(
+    new_message: Content,
+    agent_session_state: dict,
+    **kwargs
+) -> Iterator[str]:
+    """
+    Variante em streaming de handle_predictvet_interaction.
+    Etapas de navegação produzem um único trecho. Na análise final, o cabeçalho é
+    enviado imediatamente e o texto do LLM é repassado à medida que é gerado;
+    o estado da sessão é reiniciado ao final (ou mantido para nova tentativa, em
+    caso de erro), como na versão síncrona.
+    """
+    # Ensure agent_session_state is initialized
+    if not isinstance(agent_session_state, dict):
+        agent_session_state = {}
+
+    result = _begin_turn(new_message, agent_session_state)
+    if isinstance(result, _AnalysisRequest):
+        yield from _stream_analysis(result, agent_session_state)
+    else:
+        yield result
 
+def handle_session_message(session_id: str, new_message: Content, store: SessionStore | None = None) -> str:
+    """
+    Processa uma mensagem de uma sessão persistida: carrega o estado do store
+    (em memória, SQLite ou Redis, ver PredictVet.session_store), executa o turno e grava o estado.
+    Assim uma sessão pode ser atendida por qualquer processo que compartilhe o store
+    (no SQLite, os workers de uma mesma instância).
+    """
+    if store is None:
+        store = get_session_store()
+    agent_session_state = store.get(session_id)
+    try:
+        return handle_predictvet_interaction(new_message, agent_session_state)
+    finally:
+        store.put(session_id, agent_session_state)
+
+async def handle_session_message_async(session_id: str, new_message: Content, store: SessionStore | None = None) -> str:
+    """Versão assíncrona de handle_session_message."""
+    if store is None:
+        store = get_session_store()
+    agent_session_state = store.get(session_id)
+    try:
+        return await handle_predictvet_interaction_async(new_message, agent_session_state)
+    finally:
+        store.put(session_id, agent_session_state)
+
+def _handle_step(user_message_text: str, agent_session_state: dict) -> str | _AnalysisRequest:
+    """Executa a etapa atual do fluxo de diálogo para a mensagem já extraída."""
     current_step = agent_session_state.get("current_step")
 
     # --- ESTADO INICIAL OU REINÍCIO ---
-    if current_step == "initial" or user_message_text.upper() in ["INICIAR_FLUXO", "INICIAR", "COMEÇAR"]:
-        # Carrega categorias e apresenta mensagem de boas-vindas com lista
-        available_categories = ListarCategorias()
-        
-        if not available_categories or (available_categories and "Error:" in available_categories[0]):
+    if current_step == "initial" or user_message_text.upper() in RESTART_COMMANDS:
+        _discard_speculation(agent_session_state)
+        # Menus pré-renderizados da versão do catálogo (montados uma vez por versão)
+        menus = get_menus()
+
+        if menus is None:
+            available_categories = ListarCategorias()
             agent_session_state.clear()
             return f"❌ Desculpe, houve um problema ao carregar as categorias: {available_categories[0] if available_categories else 'Nenhuma categoria disponível.'}. Por favor, tente novamente mais tarde."
 
-        # Formata a lista de categorias numerada
-        categories_list = ""
-        for i, categoria in enumerate(available_categories, 1):
-            categories_list += f"{i}. {categoria}\n"
-
         # Atualiza o estado
         agent_session_state["current_step"] = "choose_category"
-        agent_session_state["available_categories"] = available_categories
-
-        return f"""🐾 **Olá! Eu sou o PredictVet**, seu assistente veterinário especializado.
-
-Estou aqui para ajudar médicos veterinários com informações técnicas sobre sintomas, diagnósticos e tratamentos para cães e gatos.
+        snapshot = catalog.active_snapshot()
+        agent_session_state["catalog_version"] = snapshot.version if snapshot else None
 
-Para começar, por favor, **escolha a categoria de sintoma** que você gostaria de analisar:
+        # Mensagem de abertura em texto livre: pula os menus quando a queixa é clara
+        if user_message_text.upper() not in RESTART_COMMANDS:
+            triaged = _triage(user_message_text, agent_session_state, menus)
+            if triaged is not None:
+                return triaged
 
-{categories_list}
-Você pode digitar o **número** ou o **nome da categoria**."""
+        return menus.welcome
 
     # --- ESCOLHA DE CATEGORIA ---
     elif current_step == "choose_category":
-        available_categories = agent_session_state.get("available_categories", [])
-        
-        # Se não temos as categorias em cache, recarrega
-        if not available_categories:
-            available_categories = ListarCategorias()
-            agent_session_state["available_categories"] = available_categories
-        
-        if not available_categories or "Error:" in available_categories[0]:
+        # Menus da versão do catálogo fixada na consulta (consulta em memória, não é copiada para o estado)
+        menus = get_menus()
+
+        if menus is None:
             agent_session_state["current_step"] = "initial"
             return "❌ Erro ao carregar categorias. Digite 'INICIAR' para tentar novamente."
 
+        available_categories = menus.categorias
         selected_category_name = None
         
         # Tenta interpretar como número
@@ -110,65 +694,37 @@ Você pode digitar o **número** ou o **nome da categoria**."""
             if 1 <= user_input_as_int <= len(available_categories):
                 selected_category_name = available_categories[user_input_as_int - 1]
         except ValueError:
-            # Tenta match direto (case-insensitive)
-            for categoria in available_categories:
-                if user_message_text.lower() == categoria.lower():
-                    selected_category_name = categoria
-                    break
+            # Tenta match pelo nome, tolerando acentos, caixa, prefixos e erros de digitação
+            selected_category_name = option_index(("categorias",), available_categories).resolve(user_message_text)
 
         if selected_category_name:
-            # Carrega queixas para a categoria selecionada
-            queixas = ListarQueixasPorCategoria(categoria=selected_category_name)
-            
-            if not queixas or (queixas and "Error:" in queixas[0]):
-                return f"❌ Houve um problema ao listar as queixas para '{selected_category_name}': {queixas[0] if queixas else 'Nenhuma queixa disponível.'}. Por favor, escolha uma categoria novamente."
-
-            # Formata a lista de queixas numerada
-            queixas_list = ""
-            for i, queixa in enumerate(queixas, 1):
-                queixas_list += f"{i}. {queixa}\n"
-
-            # Atualiza o estado
-            agent_session_state["selected_category"] = selected_category_name
-            agent_session_state["current_step"] = "choose_complaint"
-            agent_session_state["available_complaints"] = queixas
-
-            return f"""✅ **Ótimo! Você selecionou: {selected_category_name}**
-
-Agora, por favor, **escolha a queixa específica** que você gostaria de analisar:
-
-{queixas_list}
-Você pode digitar o **número** ou o **nome da queixa**."""
+            return _select_category(agent_session_state, menus, selected_category_name)
 
         else:
+            # Não é uma categoria: tenta a triagem do texto livre ("está tossindo à noite")
+            triaged = _triage(user_message_text, agent_session_state, menus)
+            if triaged is not None:
+                return triaged
             # Categoria inválida - mostra as opções novamente
-            categories_list = ""
-            for i, categoria in enumerate(available_categories, 1):
-                categories_list += f"{i}. {categoria}\n"
-            
-            return f"""❌ **Categoria não reconhecida.** Por favor, escolha uma das opções abaixo:
-
-{categories_list}
-Digite o **número** ou o **nome exato** da categoria."""
+            return menus.invalid_category
 
     # --- ESCOLHA DE QUEIXA ---
     elif current_step == "choose_complaint":
         selected_category = agent_session_state.get("selected_category")
-        available_complaints = agent_session_state.get("available_complaints", [])
 
         if not selected_category:
             agent_session_state["current_step"] = "initial"
             return "❌ Erro no fluxo. Digite 'INICIAR' para recomeçar."
 
-        # Se não temos as queixas em cache, recarrega
-        if not available_complaints:
-            available_complaints = ListarQueixasPorCategoria(categoria=selected_category)
-            agent_session_state["available_complaints"] = available_complaints
+        # Menu da versão do catálogo fixada na consulta (consulta em memória, não é copiada para o estado)
+        menus = get_menus()
+        complaint_menu = menus.complaints.get(selected_category) if menus is not None else None
 
-        if not available_complaints or "Error:" in available_complaints[0]:
+        if complaint_menu is None:
             agent_session_state["current_step"] = "choose_category"
             return f"❌ Erro ao carregar queixas para '{selected_category}'. Por favor, escolha a categoria novamente."
 
+        available_complaints = complaint_menu.queixas
         selected_complaint_name = None
 
         # Tenta interpretar como número
@@ -177,42 +733,19 @@ Digite o **número** ou o **nome exato** da categoria."""
             if 1 <= user_input_as_int <= len(available_complaints):
                 selected_complaint_name = available_complaints[user_input_as_int - 1]
         except ValueError:
-            # Tenta match direto (case-insensitive)
-            for queixa in available_complaints:
-                if user_message_text.lower() == queixa.lower():
-                    selected_complaint_name = queixa
-                    break
+            # Tenta match pelo nome, tolerando acentos, caixa, prefixos e erros de digitação
+            selected_complaint_name = option_index(("queixas", selected_category), available_complaints).resolve(user_message_text)
 
         if selected_complaint_name:
-            # Gera pergunta específica
-            pergunta = GerarPerguntaEspecifica(queixa=selected_complaint_name)
-            
-            if "Error:" in pergunta:
-                return f"❌ Houve um problema ao gerar a pergunta para '{selected_complaint_name}': {pergunta}. Por favor, selecione a queixa novamente."
-
-            # Atualiza o estado
-            agent_session_state["selected_complaint"] = selected_complaint_name
-            agent_session_state["current_step"] = "answer_question"
-            agent_session_state["last_question_asked"] = pergunta
-
-            return f"""📋 **Queixa selecionada: {selected_complaint_name}**
-
-Para uma análise mais precisa, preciso de uma informação adicional:
-
-**{pergunta}**
-
-Por favor, forneça sua resposta com o máximo de detalhes possível."""
+            return _select_complaint(agent_session_state, selected_complaint_name)
 
         else:
+            # Não é uma opção do menu: tenta a triagem do texto livre (inclusive de outra categoria)
+            triaged = _triage(user_message_text, agent_session_state, menus, complaint_only=True)
+            if triaged is not None:
+                return triaged
             # Queixa inválida - mostra as opções novamente
-            queixas_list = ""
-            for i, queixa in enumerate(available_complaints, 1):
-                queixas_list += f"{i}. {queixa}\n"
-            
-            return f"""❌ **Queixa não reconhecida.** Por favor, escolha uma das opções para **{selected_category}**:
-
-{queixas_list}
-Digite o **número** ou o **nome exato** da queixa."""
+            return complaint_menu.invalid
 
     # --- RESPOSTA À PERGUNTA ---
     elif current_step == "answer_question":
@@ -223,11 +756,17 @@ Digite o **número** ou o **nome exato** da queixa."""
             agent_session_state["current_step"] = "initial"
             return "❌ Erro no fluxo. Digite 'INICIAR' para recomeçar."
 
-        # Armazena a resposta
-        agent_session_state["collected_answers"][last_question] = user_message_text
+        # Armazena a resposta; detalhes enviados depois de um "não" na confirmação são somados
+        # à resposta anterior (sem repetir o que já foi dito), em vez de substituí-la
+        collected_answers = agent_session_state["collected_answers"]
+        answer = merge_answer(collected_answers.get(last_question), user_message_text)
+        collected_answers[last_question] = answer
         
         # MUDANÇA AQUI: Vai direto para confirmação da análise, não gera imediatamente
         agent_session_state["current_step"] = "confirm_analysis"
+        if SPECULATIVE_ANALYSIS and LOCAL_ANALYSIS != "always":
+            # ...a não ser no modo especulativo, em que a geração começa em segundo plano
+            _start_speculation(agent_session_state)
 
         return f"""✅ **Informação registrada com sucesso!**
 
@@ -235,7 +774,7 @@ Digite o **número** ou o **nome exato** da queixa."""
 • **Categoria:** {agent_session_state.get("selected_category")}
 • **Queixa:** {selected_complaint}
 • **Pergunta:** {last_question}
-• **Resposta:** {user_message_text}
+• **Resposta:** {answer}
 
 Agora posso gerar uma análise completa com recomendações técnicas baseadas nessas informações.
 
@@ -254,44 +793,22 @@ Agora posso gerar uma análise completa com recomendações técnicas baseadas n
         normalized_input = user_message_text.lower().strip()
 
         if normalized_input in ["sim", "s", "claro", "pode", "yes", "y", "ok", "prosseguir", "continuar"]:
-            # Gera análise final
-            prompt_final_para_llm = GerarAnaliseFinal(queixa_selecionada=selected_complaint, respostas_coletadas=collected_answers)
-
+            # A geração em si (com ou sem streaming) acontece fora desta função
             try:
-                final_analysis_response = llm_component.generate_content(prompt_final_para_llm)
-                final_analysis_text = final_analysis_response.text if hasattr(final_analysis_response, 'text') else str(final_analysis_response)
-
-                # Reset para próxima interação
-                agent_session_state["current_step"] = "initial"
-                agent_session_state["selected_category"] = None
-                agent_session_state["selected_complaint"] = None
-                agent_session_state["collected_answers"] = {}
-                agent_session_state["last_question_asked"] = None
-                agent_session_state["available_categories"] = []
-                agent_session_state["available_complaints"] = []
-
-                return f"""🔍 **Análise Veterinária Completa**
-
-**Caso:** {selected_complaint}
-
-{final_analysis_text}
-
----
-💡 **Para uma nova consulta, digite 'INICIAR' ou envie uma nova mensagem.**"""
-
+                request = _prepare_analysis(selected_complaint, collected_answers)
             except Exception as e:
-                # Reset state even on error during generation
-                agent_session_state["current_step"] = "initial"
-                agent_session_state["selected_category"] = None
-                agent_session_state["selected_complaint"] = None
-                agent_session_state["collected_answers"] = {}
-                agent_session_state["last_question_asked"] = None
-                agent_session_state["available_categories"] = []
-                agent_session_state["available_complaints"] = []
-                return f"❌ Erro ao gerar a análise final: {e}. Digite 'INICIAR' para tentar novamente."
+                return _keep_for_retry(agent_session_state, e)
+            if LOCAL_ANALYSIS == "always" and request.cached_text is None:
+                # Modo degradado permanente: relatório local, sem chamar o LLM
+                _LOCAL_REPORTS.inc(reason="always")
+                report = _local_report(selected_complaint, collected_answers)
+                _reset_session_state(agent_session_state)
+                return report + ANALYSIS_FOOTER
+            return request
 
         elif normalized_input in ["não", "n", "ainda não", "nao", "no", "adicionar", "mais"]:
-            # Volta para permitir adicionar mais informações
+            # Volta para permitir adicionar mais informações; a análise antecipada fica obsoleta
+            _discard_speculation(agent_session_state)
             agent_session_state["current_step"] = "answer_question"
             return """📝 **Perfeito!** Você pode adicionar mais informações sobre o caso.
 
@@ -312,6 +829,4 @@ Digite sua escolha:"""
         agent_session_state["current_step"] = "initial"
         return "❌ Estado inesperado. Digite 'INICIAR' para começar uma nova consulta."
 
-# 3. Use diretamente o LlmAgent como root_agent
-root_agent = llm_component
 
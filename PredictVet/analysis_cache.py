@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from PredictVet import metrics
+
+# Cache configuration (PREDICTVET_ANALYSIS_CACHE_SIZE=0 disables the cache)
+CACHE_SIZE = int(os.environ.get("PREDICTVET_ANALYSIS_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.environ.get("PREDICTVET_ANALYSIS_CACHE_TTL", str(24 * 60 * 60)))
+# Optional SQLite file for the on-disk tier that survives restarts
+CACHE_PATH = os.environ.get("PREDICTVET_ANALYSIS_CACHE_PATH", "")
+
+# Bumped whenever make_key() normalizes differently, so entries stored under the old keys are never served
+KEY_FORMAT = 2
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(value) -> str:
+    """
+    Normalizes free text so trivially different answers share a cache entry:
+    case, Unicode forms and repeated whitespace are ignored. Punctuation is kept:
+    "Não, tem febre" and "Não tem febre" mean different things.
+    """
+    text = unicodedata.normalize("NFKC", str(value)).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+def make_key(queixa: str, respostas: dict, template_version: str, catalog_version: str = None) -> str:
+    """
+    Builds the cache key for a final analysis.
+    Answers are normalized and sorted, so ordering and spacing do not matter.
+    The catalog version is included because the prompt embeds the diagnosis context.
+    """
+    respostas = respostas if isinstance(respostas, dict) else {}
+    payload = [
+        KEY_FORMAT,
+        template_version,
+        catalog_version,
+        normalize_text(queixa),
+        sorted((normalize_text(pergunta), normalize_text(resposta)) for pergunta, resposta in respostas.items()),
+    ]
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """
+    Bounded LRU cache with TTL for final-analysis texts, with an optional SQLite tier.
+    Memory hits are served from an OrderedDict; disk hits are promoted back to memory.
+    Thread-safe; hit/miss/eviction counters are available through stats().
+    """
+
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl_seconds: float = CACHE_TTL, path: str = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0,
+                       "evictions": 0, "expirations": 0, "stores": 0}
+        self._db = None
+        if self.path and self.enabled:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS analyses (key TEXT PRIMARY KEY, text TEXT NOT NULL, expires_at REAL NOT NULL)")
+            self._db.execute("DELETE FROM analyses WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached analysis for key, or None on a miss or expired entry."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, text = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return text
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT text, expires_at FROM analyses WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    self._store_in_memory(key, row[0], row[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        """Stores an analysis in memory (evicting the least recently used) and on disk."""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store_in_memory(key, text, expires_at)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO analyses (key, text, expires_at) VALUES (?, ?, ?)",
+                                 (key, text, expires_at))
+                self._db.commit()
+
+    def _store_in_memory(self, key: str, text: str, expires_at: float) -> None:
+        # Caller holds self._lock
+        self._entries[key] = (expires_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        """Drops every entry from both tiers (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM analyses")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the counters plus current size and hit ratio."""
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_entries=self.max_entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_analysis_cache() -> AnalysisCache:
+    """Returns the process-wide cache configured from the environment, creating it on first use."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = AnalysisCache(CACHE_SIZE, CACHE_TTL, CACHE_PATH)
+                metrics.register_collector(_collect_stats)
+    return _default_cache
+
+def _collect_stats():
+    """Exposes the process-wide cache counters as predictvet_analysis_cache_* gauges."""
+    stats = _default_cache.stats()
+    for name in ("hits", "memory_hits", "disk_hits", "misses", "evictions", "expirations", "stores", "size"):
+        yield f"predictvet_analysis_cache_{name}", f"Analysis cache {name.replace('_', ' ')}", {}, stats[name]
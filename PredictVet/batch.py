@@ -0,0 +1,191 @@
+"""
+Offline batch analysis of historical cases.
+
+Reads cases from a JSONL file, one per line:
+    {"case_id": "123", "queixa": "Vômito", "respostas": {"O vômito é acompanhado de diarreia?": "Sim"}}
+("id"/"complaint"/"answers" are accepted as aliases), builds each prompt with
+GerarAnaliseFinal and runs the LLM calls concurrently under a rate limit.
+
+Results are appended to the output JSONL as each case finishes, and the output
+doubles as the checkpoint: rerunning with the same output file skips cases already
+recorded as "ok" or "invalid", so a crashed run resumes where it stopped.
+
+Usage:
+    python -m PredictVet.batch casos.jsonl --output resultados.jsonl --concurrency 8 --rate 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from PredictVet import catalog, logging_config
+from PredictVet.agent import generate_analysis_text_async
+from PredictVet.analysis_cache import get_analysis_cache, make_key
+from PredictVet.priority import BACKGROUND
+from PredictVet.tools import PROMPT_TEMPLATE_VERSION, GerarAnaliseFinal
+
+# Statuses that count as finished when resuming; errors are retried
+FINISHED_STATUSES = {"ok", "invalid"}
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second (bursts up to `burst`)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def read_cases(path: str):
+    """Yields (case_id, case dict or None, error) for each non-empty input line."""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                case = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield f"line-{line_number}", None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(case, dict):
+                yield f"line-{line_number}", None, "Case must be a JSON object"
+                continue
+            case_id = str(case.get("case_id", case.get("id", f"line-{line_number}")))
+            yield case_id, case, None
+
+def finished_case_ids(output_path: str) -> set:
+    """Reads the case ids already completed in a previous run of the same output file."""
+    finished = set()
+    if not os.path.exists(output_path):
+        return finished
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partial line from a crashed run
+                continue
+            if isinstance(record, dict) and record.get("status") in FINISHED_STATUSES:
+                finished.add(record.get("case_id"))
+    return finished
+
+async def analyze_case(case_id: str, case: dict, limiter: RateLimiter) -> dict:
+    """Produces the result record for one case (cache hits skip the LLM and the rate limit)."""
+    if not isinstance(case, dict):
+        return {"case_id": case_id, "status": "invalid", "error": "Case must be a JSON object"}
+    queixa = case.get("queixa", case.get("complaint"))
+    respostas = case.get("respostas", case.get("answers", {}))
+    if not queixa or not isinstance(respostas, dict):
+        return {"case_id": case_id, "status": "invalid", "error": "Case needs 'queixa' and a 'respostas' object."}
+
+    started = time.perf_counter()
+    snapshot = catalog.ensure_loaded()
+    cache = get_analysis_cache()
+    cache_key = make_key(queixa, respostas, PROMPT_TEMPLATE_VERSION, snapshot.version if snapshot else None)
+    analysis = cache.get(cache_key)
+    cached = analysis is not None
+    try:
+        if not cached:
+            prompt = GerarAnaliseFinal(queixa_selecionada=queixa, respostas_coletadas=respostas)
+            await limiter.acquire()
+            # Offline cases yield to live consultations in the LLM client's queue
+            analysis = await generate_analysis_text_async(prompt, BACKGROUND)
+            cache.put(cache_key, analysis)
+    except Exception as e:
+        return {"case_id": case_id, "queixa": queixa, "status": "error", "error": str(e),
+                "latency_s": round(time.perf_counter() - started, 3)}
+
+    return {"case_id": case_id, "queixa": queixa, "status": "ok", "analysis": analysis, "cached": cached,
+            "catalog_version": snapshot.version if snapshot else None,
+            "latency_s": round(time.perf_counter() - started, 3)}
+
+async def run_batch(input_path: str, output_path: str, concurrency: int = 4, rate: float = 0.0, limit: int = None) -> dict:
+    """
+    Runs every pending case in input_path and appends the results to output_path.
+    At most `concurrency` cases are in flight, so memory stays bounded for any input size.
+    Returns a summary of the run.
+    """
+    finished = finished_case_ids(output_path)
+    limiter = RateLimiter(rate, burst=concurrency)
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    summary = {"ok": 0, "error": 0, "invalid": 0, "skipped": 0, "cached": 0}
+    started = time.perf_counter()
+
+    # A crash can leave a partial last line; start on a fresh one
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        if needs_newline:
+            output.write("\n")
+
+        def write(record: dict) -> None:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            summary[record["status"]] += 1
+            summary["cached"] += bool(record.get("cached"))
+
+        async def worker(case_id: str, case: dict) -> None:
+            try:
+                write(await analyze_case(case_id, case, limiter))
+            finally:
+                semaphore.release()
+
+        tasks = set()
+        scheduled = 0
+        for case_id, case, error in read_cases(input_path):
+            if case_id in finished:
+                summary["skipped"] += 1
+                continue
+            if limit is not None and scheduled >= limit:
+                break
+            scheduled += 1
+            if error:
+                write({"case_id": case_id, "status": "invalid", "error": error})
+                continue
+            finished.add(case_id)
+            await semaphore.acquire()
+            task = asyncio.create_task(worker(case_id, case))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return summary
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file with one case per line")
+    parser.add_argument("--output", help="results JSONL, also used as checkpoint (default: <input>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4, help="maximum LLM calls in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="maximum LLM calls per second (0 = unlimited)")
+    parser.add_argument("--limit", type=int, default=None, help="process at most this many pending cases")
+    args = parser.parse_args()
+
+    logging_config.configure_logging()
+    output_path = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    summary = asyncio.run(run_batch(args.input, output_path, args.concurrency, args.rate, args.limit))
+    print(json.dumps(summary, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Callable, Iterable, Mapping, NamedTuple
+
+try:
+    from PredictVet import ingest
+except ImportError:
+    # Imported from tools.py running as a script
+    import ingest
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Catalog file locations (overridable for deployments that mount the sheets elsewhere)
+QUEIXAS_PATH = os.environ.get("PREDICTVET_QUEIXAS_CSV", "PredictVet/planilha_queixas_tutor.csv")
+DIAGNOSTICO_PATH = os.environ.get("PREDICTVET_DIAGNOSTICO_CSV", "PredictVet/planilha_diagnostico_exames.csv")
+
+# Seconds between on-demand mtime/size checks (0 disables them)
+CHECK_INTERVAL = float(os.environ.get("PREDICTVET_CATALOG_CHECK_INTERVAL", "30"))
+# How many past snapshots stay reachable for sessions pinned to them
+HISTORY_SIZE = int(os.environ.get("PREDICTVET_CATALOG_HISTORY", "4"))
+# Compiled catalog built by `python -m PredictVet.catalog_binary` (see that module)
+BINARY_PATH = os.environ.get("PREDICTVET_CATALOG_BINARY", "PredictVet/catalog.pvc")
+# "auto" maps the compiled catalog when it is present and matches the CSVs, else uses "stdlib";
+# "binary" always uses the compiled catalog; "stdlib" keeps pandas off the serving path;
+# "pandas" also exposes the DataFrames
+LOADER = os.environ.get("PREDICTVET_CATALOG_LOADER", "auto")
+
+class CatalogIndex(NamedTuple):
+    """
+    Immutable lookup index over the complaint and diagnosis sheets.
+    Built once per catalog load so the tools answer with dict lookups
+    instead of scanning the DataFrames on every call.
+    """
+    categorias: tuple[str, ...]
+    queixas_por_categoria: Mapping[str, tuple[str, ...]]
+    perguntas_por_queixa: Mapping[str, tuple[str, ...]]
+    diagnosticos_por_queixa: Mapping[str, tuple[Mapping[str, object], ...]]
+
+class CatalogSnapshot(NamedTuple):
+    """
+    One fully loaded, immutable version of the catalog.
+    The version is a hash of the file contents, so it is stable across
+    processes and restarts; signature holds the (path, mtime, size) seen at load,
+    for the files it was loaded from (see paths).
+    The DataFrames are only populated by the "pandas" loader.
+    memo holds structures derived from this version (see memoize()).
+    """
+    version: str
+    loaded_at: float
+    signature: tuple
+    loader: str
+    queixas_columns: frozenset
+    diagnostico_columns: frozenset
+    queixas_df: "pd.DataFrame | None"
+    diagnostico_df: "pd.DataFrame | None"
+    index: CatalogIndex
+    memo: dict
+
+    @property
+    def paths(self) -> tuple:
+        """(queixas, diagnostico, compiled catalog) paths this snapshot was loaded from."""
+        return tuple(path for path, _, _ in self.signature)
+
+def _freeze(groups: dict) -> Mapping:
+    """Converts a dict of lists into a read-only mapping of tuples."""
+    return MappingProxyType({key: tuple(values) for key, values in groups.items()})
+
+def _is_blank(value) -> bool:
+    """True for missing cells: None, empty strings and NaN (NaN != NaN)."""
+    return value is None or value == "" or value != value
+
+def build_catalog_index(queixas_rows: Iterable[Mapping], diagnostico_rows: Iterable[Mapping]) -> CatalogIndex:
+    """
+    Builds the CatalogIndex in a single pass over each sheet's rows (dicts keyed by column).
+    Categories and complaints keep the order of their first appearance in the sheet,
+    matching what unique() returned. Rows missing the key columns are skipped.
+    """
+    queixas_por_categoria = {}
+    perguntas_por_queixa = {}
+    diagnosticos_por_queixa = {}
+
+    for row in queixas_rows:
+        categoria, queixa = row.get('Categoria'), row.get('Queixa')
+        if _is_blank(queixa):
+            continue
+        if not _is_blank(categoria):
+            # dict keys double as an insertion-ordered set of complaints
+            queixas_por_categoria.setdefault(categoria, {})[queixa] = None
+        if 'Pergunta_Especifica' in row:
+            perguntas_por_queixa.setdefault(queixa, []).append(row['Pergunta_Especifica'])
+
+    for row in diagnostico_rows:
+        if _is_blank(row.get('Queixa')):
+            continue
+        diagnosticos_por_queixa.setdefault(row['Queixa'], []).append(MappingProxyType(dict(row)))
+
+    return CatalogIndex(
+        categorias=tuple(queixas_por_categoria),
+        queixas_por_categoria=_freeze(queixas_por_categoria),
+        perguntas_por_queixa=_freeze(perguntas_por_queixa),
+        diagnosticos_por_queixa=_freeze(diagnosticos_por_queixa),
+    )
+
+def file_signature(paths=None) -> tuple:
+    """
+    Returns ((path, mtime_ns, size), ...) for the catalog files (both CSVs and the
+    compiled catalog by default). Missing files are reported with None values so
+    their reappearance counts as a change.
+    """
+    signature = []
+    for path in paths or (QUEIXAS_PATH, DIAGNOSTICO_PATH, BINARY_PATH):
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+def _sheet_rows(reader, frames: list = None) -> Iterable[dict]:
+    """
+    Streams a sheet's validated rows as dicts; with frames (pandas loader), also
+    collects each chunk as a categorical DataFrame.
+    """
+    for chunk in reader.chunks():
+        columns = reader.columns
+        if frames is not None:
+            frames.append(ingest.categorical_frame(columns, chunk))
+        for row in chunk:
+            yield dict(zip(columns, row))
+
+def _parse_snapshot(queixas_path: str, diagnostico_path: str, loader: str, signature: tuple) -> CatalogSnapshot:
+    """
+    Builds a snapshot from the CSVs in one streaming pass per sheet (see PredictVet.ingest):
+    rows are validated, repaired or quarantined and deduplicated as they are read,
+    and the content version is hashed from the same bytes.
+    """
+    digest = hashlib.sha1()
+    queixas = ingest.SheetReader(queixas_path, digest=digest)
+    diagnostico = ingest.SheetReader(diagnostico_path, digest=digest)
+    queixas_frames = diagnostico_frames = None
+    if loader == "pandas":
+        queixas_frames, diagnostico_frames = [], []
+
+    def diagnostico_rows():
+        # The index consumes the queixas sheet first; the version hashes queixas, NUL, diagnostico
+        digest.update(b"\0")
+        yield from _sheet_rows(diagnostico, diagnostico_frames)
+
+    index = build_catalog_index(_sheet_rows(queixas, queixas_frames), diagnostico_rows())
+    for report in (queixas.report, diagnostico.report):
+        if not report.clean:
+            # Repairs are routine for hand-edited sheets; dropped rows are worth a warning
+            level = logging.WARNING if report.quarantined or report.duplicates else logging.INFO
+            logger.log(level, "Catalog ingestion: %s", report, extra={"ingest": report.as_dict()})
+
+    queixas_df = diagnostico_df = None
+    if loader == "pandas":
+        queixas_df = ingest.concat_frames(queixas.columns, queixas_frames)
+        diagnostico_df = ingest.concat_frames(diagnostico.columns, diagnostico_frames)
+
+    return CatalogSnapshot(
+        version=digest.hexdigest()[:12],
+        loaded_at=time.time(),
+        signature=signature,
+        loader=loader,
+        queixas_columns=frozenset(queixas.columns),
+        diagnostico_columns=frozenset(diagnostico.columns),
+        queixas_df=queixas_df,
+        diagnostico_df=diagnostico_df,
+        index=index,
+        memo={("ingest_reports",): (queixas.report, diagnostico.report)},
+    )
+
+def _binary_snapshot(path: str, signature: tuple) -> CatalogSnapshot:
+    try:
+        from PredictVet import catalog_binary
+    except ImportError:
+        # Executed directly as a script (python PredictVet/tools.py)
+        import catalog_binary
+    version, index, queixas_columns, diagnostico_columns = catalog_binary.open_binary_catalog(path)
+    return CatalogSnapshot(version, time.time(), signature, "binary", queixas_columns, diagnostico_columns,
+                           None, None, index, {})
+
+def load_snapshot(queixas_path: str = None, diagnostico_path: str = None, loader: str = None,
+                  binary_path: str = None) -> CatalogSnapshot:
+    """
+    Builds a complete snapshot with the given loader (default LOADER):
+    "binary" maps the compiled catalog; "auto" does so only when it exists and was
+    compiled from the current CSVs (or the CSVs are absent), otherwise it parses
+    the CSVs like "stdlib"; "pandas" is only imported for the "pandas" loader.
+    Nothing is installed here; parsing errors propagate to the caller.
+    """
+    queixas_path = queixas_path or QUEIXAS_PATH
+    diagnostico_path = diagnostico_path or DIAGNOSTICO_PATH
+    binary_path = binary_path or BINARY_PATH
+    loader = loader or LOADER
+    signature = file_signature((queixas_path, diagnostico_path, binary_path))
+
+    if loader == "binary":
+        return _binary_snapshot(binary_path, signature)
+    if loader == "auto":
+        loader = "stdlib"
+        if os.path.exists(binary_path):
+            try:
+                version = ingest.content_version((queixas_path, diagnostico_path))
+            except FileNotFoundError:
+                version = None
+            try:
+                snapshot = _binary_snapshot(binary_path, signature)
+            except ValueError as e:
+                logger.warning("Ignoring compiled catalog %s: %s", binary_path, e)
+            else:
+                if version is None or snapshot.version == version:
+                    return snapshot
+                logger.warning("Compiled catalog %s (version %s) is older than the CSVs (version %s); "
+                               "parsing the CSVs. Rebuild it with `python -m PredictVet.catalog_binary`.",
+                               binary_path, snapshot.version, version)
+    if loader not in ("stdlib", "pandas"):
+        raise ValueError(f"Unknown catalog loader: {loader}")
+    return _parse_snapshot(queixas_path, diagnostico_path, loader, signature)
+
+def memoize(snapshot: CatalogSnapshot, key, build: Callable[[], object]):
+    """
+    Returns the value derived from snapshot under key, building it on first use.
+    Values live as long as the snapshot, so they are rebuilt once per catalog version.
+    """
+    try:
+        return snapshot.memo[key]
+    except KeyError:
+        # Concurrent builders may race; setdefault keeps the first value stored
+        return snapshot.memo.setdefault(key, build())
+
+def ingest_reports(snapshot: CatalogSnapshot) -> tuple:
+    """The (queixas, diagnostico) IngestReports of a snapshot parsed from the CSVs; () otherwise."""
+    return snapshot.memo.get(("ingest_reports",), ())
+
+# --- Snapshot registry ---
+_current = None
+_history = OrderedDict()
+_listeners = []
+_install_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_last_check = 0.0
+_pinned = ContextVar("predictvet_pinned_catalog", default=None)
+
+def install_snapshot(snapshot: CatalogSnapshot) -> None:
+    """
+    Atomically makes snapshot the current catalog and notifies listeners.
+    Readers either see the previous snapshot or this one, never a mix.
+    """
+    global _current
+    with _install_lock:
+        _history[snapshot.version] = snapshot
+        _history.move_to_end(snapshot.version)
+        while len(_history) > max(HISTORY_SIZE, 1):
+            _history.popitem(last=False)
+        _current = snapshot
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(snapshot)
+
+def ensure_loaded() -> CatalogSnapshot | None:
+    """
+    Loads and installs the catalog on first use, without the diagnostic dumps
+    of tools.load_dataframes(). Returns None (after logging) if loading fails.
+    """
+    if _current is not None:
+        return _current
+    with _reload_lock:
+        if _current is None:
+            try:
+                install_snapshot(load_snapshot())
+            except Exception as e:
+                logger.exception("Catalog load failed (%s loader): %s", LOADER, e)
+    return _current
+
+def subscribe(listener: Callable[[CatalogSnapshot], None]) -> None:
+    """Registers a callback invoked with every newly installed snapshot."""
+    with _install_lock:
+        _listeners.append(listener)
+
+def current_snapshot() -> CatalogSnapshot | None:
+    """Returns the latest installed snapshot, or None before the first load."""
+    return _current
+
+def get_snapshot(version: str) -> CatalogSnapshot | None:
+    """Returns a still-retained snapshot by version, or None if it was evicted."""
+    return _history.get(version)
+
+def active_snapshot() -> CatalogSnapshot | None:
+    """
+    Returns the snapshot pinned for the running conversation, falling back to the
+    current one. Also schedules a non-blocking update check when one is due.
+    """
+    maybe_check_for_updates()
+    pinned = _pinned.get()
+    return pinned if pinned is not None else _current
+
+@contextmanager
+def pinned_snapshot(version: str | None):
+    """
+    Pins the given catalog version for the duration of the block, so a
+    conversation keeps a consistent view while a newer catalog is swapped in.
+    Unknown or evicted versions leave the current snapshot in effect.
+    """
+    snapshot = _history.get(version) if version else None
+    if snapshot is None:
+        yield _current
+        return
+    token = _pinned.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        _pinned.reset(token)
+
+# --- Reloading ---
+def _reload_worker() -> None:
+    try:
+        current = _current
+        # Reloaded from the files the current snapshot came from; snapshots installed by
+        # tools.load_dataframes() keep their DataFrames
+        queixas_path, diagnostico_path, binary_path = current.paths if current else (None, None, None)
+        loader = "pandas" if current and current.loader == "pandas" else None
+        snapshot = load_snapshot(queixas_path, diagnostico_path, loader, binary_path)
+        if current is not None and current.version == snapshot.version:
+            # Touched but unchanged: keep the current snapshot, remember the new signature
+            install_snapshot(current._replace(signature=snapshot.signature))
+            return
+        install_snapshot(snapshot)
+        logger.info("Catalog reloaded: version %s (%d categories, %d complaints).", snapshot.version,
+                    len(snapshot.index.categorias), len(snapshot.index.perguntas_por_queixa),
+                    extra={"catalog_version": snapshot.version})
+    except Exception as e:
+        # Keep serving the previous snapshot; the next check will retry
+        logger.exception("Catalog reload failed, keeping version %s: %s", _current.version if _current else None, e)
+    finally:
+        _reload_lock.release()
+
+def reload_catalog(wait: bool = False) -> bool:
+    """
+    Rebuilds the catalog from disk in a background thread and swaps it in when complete.
+    Returns False if a reload is already running. With wait=True the caller
+    blocks until the new snapshot is installed (useful for admin endpoints and scripts).
+    """
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    worker = threading.Thread(target=_reload_worker, name="predictvet-catalog-reload", daemon=True)
+    worker.start()
+    if wait:
+        worker.join()
+    return True
+
+def check_for_updates() -> bool:
+    """
+    Compares the mtime/size of the files the current snapshot was loaded from
+    against its signature and starts a background reload if they changed.
+    Returns True if a reload was started.
+    """
+    global _last_check
+    _last_check = time.monotonic()
+    current = _current
+    if current is None or file_signature(current.paths) == current.signature:
+        return False
+    return reload_catalog()
+
+def maybe_check_for_updates() -> None:
+    """Runs check_for_updates() at most once every CHECK_INTERVAL seconds."""
+    if CHECK_INTERVAL > 0 and time.monotonic() - _last_check >= CHECK_INTERVAL:
+        check_for_updates()
+
+def start_catalog_watcher(interval: float = None) -> threading.Thread:
+    """Starts a daemon thread that polls the catalog files for changes."""
+    interval = interval or CHECK_INTERVAL or 30
+
+    def _watch():
+        while True:
+            time.sleep(interval)
+            check_for_updates()
+
+    watcher = threading.Thread(target=_watch, name="predictvet-catalog-watcher", daemon=True)
+    watcher.start()
+    return watcher
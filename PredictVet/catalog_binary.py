@@ -0,0 +1,291 @@
+"""
+Compiled binary catalog, loaded through mmap.
+
+`python -m PredictVet.catalog_binary` compiles the two catalog CSVs into a single
+file (default PredictVet/catalog.pvc, see PREDICTVET_CATALOG_BINARY). Workers then
+memory-map it instead of parsing the sheets: the pages come from the OS page
+cache and are shared by every process mapping the file, and nothing is parsed
+at startup. Strings are decoded on access.
+
+Layout (native-endian u32 arrays, 4-byte aligned):
+    header     magic, format version, byte-order mark, CRC32 of the body,
+               content version (same hash as catalog.load_snapshot) and a
+               directory of (offset, count) pairs, one per section
+    strings    offsets[n + 1] into one UTF-8 blob; every text is stored once
+    columns    string ids of each sheet's header
+    categorias string ids, in sheet order
+    maps       per CatalogIndex mapping: keys sorted by UTF-8 bytes (binary search),
+               the sheet order of the keys, (start, count) spans and a values pool
+    rows       diagnostico rows, one string id per column (NONE for missing)
+
+The file is written to a temporary name and renamed into place, so workers
+that still map the previous build keep a consistent view until they reload.
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping
+from types import MappingProxyType
+
+try:
+    from PredictVet import catalog
+except ImportError:
+    # Imported from catalog.py while tools.py runs as a script
+    import catalog
+
+MAGIC = b"PVCATLG\0"
+FORMAT_VERSION = 1
+BYTE_ORDER_MARK = 0x01020304
+NONE = 0xFFFFFFFF
+
+SECTIONS = (
+    "string_offsets", "string_blob", "queixas_columns", "diagnostico_columns", "categorias",
+    "queixas_keys", "queixas_order", "queixas_spans", "queixas_values",
+    "perguntas_keys", "perguntas_order", "perguntas_spans", "perguntas_values",
+    "diagnosticos_keys", "diagnosticos_order", "diagnosticos_spans", "diagnosticos_values",
+    "diagnostico_rows",
+)
+# magic, format version, byte-order mark, body CRC32, content version, then the directory
+_HEADER = struct.Struct("=8sIII16s" + "II" * len(SECTIONS))
+
+class BinaryCatalogError(ValueError):
+    """The file is not a valid compiled catalog for this build."""
+
+def _align(buffer: bytearray) -> None:
+    buffer.extend(b"\0" * (-len(buffer) % 4))
+
+def compile_catalog(queixas_path: str = None, diagnostico_path: str = None, output_path: str = None) -> str:
+    """
+    Parses the CSVs with the stdlib loader, validates them and writes the binary
+    catalog to output_path (default BINARY_PATH). Returns the content version.
+    """
+    snapshot = catalog.load_snapshot(queixas_path, diagnostico_path, loader="stdlib")
+    missing = ({"Categoria", "Queixa", "Pergunta_Especifica"} - snapshot.queixas_columns) | \
+              ({"Queixa"} - snapshot.diagnostico_columns)
+    if missing:
+        raise BinaryCatalogError(f"Catalog is missing required columns: {sorted(missing)}")
+    index = snapshot.index
+    if not index.categorias:
+        raise BinaryCatalogError("Catalog has no categories.")
+
+    strings = {}
+
+    def sid(value) -> int:
+        if value is None:
+            return NONE
+        return strings.setdefault(str(value), len(strings))
+
+    # Header order is not kept by the snapshot's frozensets; the diagnostico rows keep it
+    diagnostico_columns = next((tuple(row) for rows in index.diagnosticos_por_queixa.values() for row in rows),
+                               tuple(sorted(snapshot.diagnostico_columns)))
+    sections = {
+        "queixas_columns": array("I", map(sid, sorted(snapshot.queixas_columns))),
+        "diagnostico_columns": array("I", map(sid, diagnostico_columns)),
+        "categorias": array("I", map(sid, index.categorias)),
+    }
+    rows = array("I")
+
+    def encode_map(prefix: str, mapping: Mapping, encode_value) -> None:
+        keys = list(mapping)
+        key_ids = [sid(key) for key in keys]
+        by_bytes = sorted(range(len(keys)), key=lambda i: str(keys[i]).encode("utf-8"))
+        position = {original: sorted_position for sorted_position, original in enumerate(by_bytes)}
+        spans, values = array("I"), array("I")
+        for original in by_bytes:
+            items = [encode_value(value) for value in mapping[keys[original]]]
+            spans.extend((len(values), len(items)))
+            values.extend(items)
+        sections[f"{prefix}_keys"] = array("I", (key_ids[i] for i in by_bytes))
+        sections[f"{prefix}_order"] = array("I", (position[i] for i in range(len(keys))))
+        sections[f"{prefix}_spans"] = spans
+        sections[f"{prefix}_values"] = values
+
+    def encode_row(row: Mapping) -> int:
+        rows.extend(sid(row.get(column)) for column in diagnostico_columns)
+        return len(rows) // len(diagnostico_columns) - 1
+
+    encode_map("queixas", index.queixas_por_categoria, sid)
+    encode_map("perguntas", index.perguntas_por_queixa, sid)
+    encode_map("diagnosticos", index.diagnosticos_por_queixa, encode_row)
+    sections["diagnostico_rows"] = rows
+
+    blob = bytearray()
+    offsets = array("I", [0])
+    for text in strings:
+        blob.extend(text.encode("utf-8"))
+        offsets.append(len(blob))
+    sections["string_offsets"] = offsets
+
+    body = bytearray()
+    directory = []
+    for name in SECTIONS:
+        _align(body)
+        start = _HEADER.size + len(body)
+        if name == "string_blob":
+            body.extend(blob)
+            directory.extend((start, len(blob)))
+        else:
+            body.extend(sections[name].tobytes())
+            directory.extend((start, len(sections[name])))
+    _align(body)
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER_MARK, zlib.crc32(body),
+                          snapshot.version.encode("ascii"), *directory)
+    output_path = output_path or catalog.BINARY_PATH
+    temporary = f"{output_path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(temporary, output_path)
+    return snapshot.version
+
+class _Strings:
+    """String table view over the mapped file."""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def raw(self, string_id: int) -> bytes:
+        return bytes(self._blob[self._offsets[string_id]:self._offsets[string_id + 1]])
+
+    def get(self, string_id: int):
+        return None if string_id == NONE else self.raw(string_id).decode("utf-8")
+
+class BinaryMapping(Mapping):
+    """
+    Read-only mapping backed by the mapped file. Lookups binary-search the sorted
+    keys and decode the value into a tuple; up to DECODED_ENTRIES decoded values
+    are kept so hot keys are not decoded on every access.
+    Iteration follows the sheet order, like the CSV-built index.
+    """
+
+    DECODED_ENTRIES = 1024
+
+    def __init__(self, strings: _Strings, keys, order, spans, values, decode_value):
+        self._decoded = {}
+        self._strings = strings
+        self._keys = keys
+        self._order = order
+        self._spans = spans
+        self._values = values
+        self._decode_value = decode_value
+
+    def _find(self, key) -> int:
+        if not isinstance(key, str):
+            return -1
+        target = key.encode("utf-8")
+        low, high = 0, len(self._keys)
+        while low < high:
+            middle = (low + high) // 2
+            if self._strings.raw(self._keys[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._keys) and self._strings.raw(self._keys[low]) == target:
+            return low
+        return -1
+
+    def __getitem__(self, key):
+        try:
+            return self._decoded[key]
+        except (KeyError, TypeError):
+            pass
+        position = self._find(key)
+        if position < 0:
+            raise KeyError(key)
+        start, count = self._spans[2 * position], self._spans[2 * position + 1]
+        value = tuple(self._decode_value(value) for value in self._values[start:start + count])
+        if len(self._decoded) >= self.DECODED_ENTRIES:
+            # Start over rather than track recency: a clear() is safe across threads
+            self._decoded.clear()
+        self._decoded[key] = value
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self._find(key) >= 0
+
+    def __iter__(self):
+        for position in self._order:
+            yield self._strings.get(self._keys[position])
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+def open_binary_catalog(path: str = None) -> tuple[str, catalog.CatalogIndex, frozenset, frozenset]:
+    """
+    Maps and validates a compiled catalog.
+    Returns (content version, index, queixas columns, diagnostico columns).
+    Raises BinaryCatalogError if the file is corrupt or from another format version.
+    """
+    path = path or catalog.BINARY_PATH
+    with open(path, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            raise BinaryCatalogError(f"{path}: empty file") from e
+    if len(mapped) < _HEADER.size:
+        raise BinaryCatalogError(f"{path}: truncated header")
+    magic, format_version, byte_order, crc, version, *directory = _HEADER.unpack_from(mapped)
+    if magic != MAGIC:
+        raise BinaryCatalogError(f"{path}: not a PredictVet binary catalog")
+    if format_version != FORMAT_VERSION:
+        raise BinaryCatalogError(f"{path}: format version {format_version}, expected {FORMAT_VERSION}; rebuild it")
+    if byte_order != BYTE_ORDER_MARK:
+        raise BinaryCatalogError(f"{path}: built on a machine with a different byte order; rebuild it")
+    view = memoryview(mapped)
+    if zlib.crc32(view[_HEADER.size:]) != crc:
+        raise BinaryCatalogError(f"{path}: checksum mismatch (corrupt or partially written)")
+
+    sections = {}
+    for name, (offset, count) in zip(SECTIONS, zip(directory[::2], directory[1::2])):
+        size = count if name == "string_blob" else 4 * count
+        if offset + size > len(mapped):
+            raise BinaryCatalogError(f"{path}: section {name} out of bounds")
+        section = view[offset:offset + size]
+        sections[name] = section if name == "string_blob" else section.cast("I")
+
+    strings = _Strings(sections["string_offsets"], sections["string_blob"])
+    diagnostico_columns = tuple(strings.get(i) for i in sections["diagnostico_columns"])
+    rows = sections["diagnostico_rows"]
+    width = len(diagnostico_columns)
+
+    def decode_row(row: int) -> Mapping:
+        cells = rows[row * width:(row + 1) * width]
+        return MappingProxyType({column: strings.get(cell) for column, cell in zip(diagnostico_columns, cells) if cell != NONE})
+
+    def mapping(prefix: str, decode_value) -> BinaryMapping:
+        return BinaryMapping(strings, sections[f"{prefix}_keys"], sections[f"{prefix}_order"],
+                             sections[f"{prefix}_spans"], sections[f"{prefix}_values"], decode_value)
+
+    index = catalog.CatalogIndex(
+        categorias=tuple(strings.get(i) for i in sections["categorias"]),
+        queixas_por_categoria=mapping("queixas", strings.get),
+        perguntas_por_queixa=mapping("perguntas", strings.get),
+        diagnosticos_por_queixa=mapping("diagnosticos", decode_row),
+    )
+    queixas_columns = frozenset(strings.get(i) for i in sections["queixas_columns"])
+    return version.rstrip(b"\0").decode("ascii"), index, queixas_columns, frozenset(diagnostico_columns)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queixas", default=None, help="complaints CSV (default: PREDICTVET_QUEIXAS_CSV)")
+    parser.add_argument("--diagnostico", default=None, help="diagnosis CSV (default: PREDICTVET_DIAGNOSTICO_CSV)")
+    parser.add_argument("--output", default=None, help="compiled catalog (default: PREDICTVET_CATALOG_BINARY)")
+    args = parser.parse_args()
+
+    try:
+        version = compile_catalog(args.queixas, args.diagnostico, args.output)
+    except (OSError, BinaryCatalogError, catalog.ingest.CatalogFormatError) as e:
+        sys.exit(f"Catalog compilation failed: {e}")
+    output = args.output or catalog.BINARY_PATH
+    _, index, _, _ = open_binary_catalog(output)
+    print(f"Compiled catalog version {version} to {output} ({os.path.getsize(output)} bytes, "
+          f"{len(index.categorias)} categories, {len(index.perguntas_por_queixa)} complaints).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Local fake of the Gemini generateContent endpoint.
+
+Answers POST /v1beta/models/<model>:generateContent with a canned analysis after a
+configurable latency, and can be told to fail, stall or drop a fraction of the
+requests, so the LLM client's deadlines, retries and hedging (and whole-server
+load tests, see benchmarks/load_test.py) can be exercised without network access
+or API keys.
+
+Latency distributions (--latency is the mean, or the median for lognormal):
+    fixed        every answer takes --latency
+    uniform      between latency * (1 - jitter) and latency * (1 + jitter)
+    exponential  memoryless, mean --latency
+    lognormal    long-tailed like real model latencies, sigma --jitter
+Errors: --error-rate of the requests get a status drawn from --error-statuses
+("503=3,429=1,500=1"); --drop-rate of them get the connection closed unanswered.
+
+    python -m PredictVet.fake_llm --port 8089 --latency 0.3 --error-rate 0.2 --slow-rate 0.05
+    python -m PredictVet.fake_llm --latency 1.5 --latency-distribution lognormal --jitter 0.6 \
+        --error-rate 0.02 --error-statuses 503=3,429=1 --drop-rate 0.005
+    PREDICTVET_LLM_URL=http://127.0.0.1:8089 python test_agent_interaction.py
+
+In-process:
+    server = start_fake_llm(latency=0.05, error_rate=0.5)
+    ... server.url, server.requests ...
+    server.shutdown()
+"""
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_GENERATE_PATH = re.compile(r"^/v1beta/models/[^/:]+:generateContent$")
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+class _FakeLLMHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client's connection pool is exercised too
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs add ~40ms per answer
+    disable_nagle_algorithm = True
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        with server.lock:
+            server.requests += 1
+        if not _GENERATE_PATH.match(self.path.split("?")[0]):
+            self._reply(404, {"error": {"code": 404, "message": "not found"}})
+            return
+        try:
+            prompt = "".join(part.get("text", "") for part in json.loads(body)["contents"][0]["parts"])
+        except (ValueError, KeyError, IndexError, TypeError):
+            self._reply(400, {"error": {"code": 400, "message": "invalid request"}})
+            return
+
+        time.sleep(server.sample_latency())
+        if random.random() < server.drop_rate:
+            # Connection reset mid-request, as seen behind overloaded load balancers
+            self.close_connection = True
+            return
+        status = server.sample_error()
+        if status is not None:
+            self._reply(status, {"error": {"code": status, "message": "fake failure"}})
+            return
+        text = f"Análise simulada pelo fake LLM ({len(prompt)} caracteres de prompt)."
+        self._reply(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """Threading server holding the failure settings and a request counter."""
+    daemon_threads = True
+
+    def __init__(self, address: tuple, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 slow_rate: float = 0.0, slow_latency: float = 5.0, latency_distribution: str = "fixed",
+                 jitter: float = 0.5, error_statuses: dict = None, drop_rate: float = 0.0):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        super().__init__(address, _FakeLLMHandler)
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Status -> relative weight; error_status alone is the single-status shorthand
+        self.error_statuses = dict(error_statuses or {error_status: 1})
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.drop_rate = drop_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def sample_latency(self) -> float:
+        """Seconds before the next answer."""
+        if random.random() < self.slow_rate:
+            return self.slow_latency
+        latency = self.latency
+        if latency <= 0 or self.latency_distribution == "fixed":
+            return max(latency, 0.0)
+        if self.latency_distribution == "uniform":
+            return random.uniform(latency * max(1 - self.jitter, 0.0), latency * (1 + self.jitter))
+        if self.latency_distribution == "exponential":
+            return random.expovariate(1 / latency)
+        return random.lognormvariate(math.log(latency), self.jitter)
+
+    def sample_error(self) -> int | None:
+        """The error status for the next answer, or None to answer normally."""
+        if random.random() >= self.error_rate:
+            return None
+        return random.choices(list(self.error_statuses), weights=list(self.error_statuses.values()))[0]
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up (deadline, hedge lost) close the connection mid-answer
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_fake_llm(host: str = "127.0.0.1", port: int = 0, **settings) -> FakeLLMServer:
+    """Starts a FakeLLMServer on a daemon thread (port 0 picks a free port)."""
+    server = FakeLLMServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, name="predictvet-fake-llm", daemon=True).start()
+    return server
+
+def parse_statuses(text: str) -> dict:
+    """Parses "503=3,429=1" (or "503,429", equal weights) into {503: 3.0, 429: 1.0}."""
+    statuses = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        status, _, weight = item.partition("=")
+        statuses[int(status)] = float(weight or 1)
+    if not statuses:
+        raise ValueError("no error status given")
+    return statuses
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each answer (mean or median)")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--jitter", type=float, default=0.5,
+                        help="relative half-width (uniform) or sigma (lognormal) of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--error-statuses", type=parse_statuses, default=None,
+                        help='weighted error statuses, e.g. "503=3,429=1,500=1" (default: --error-status)')
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="fraction of requests whose connection is closed without an answer")
+    args = parser.parse_args()
+
+    server = FakeLLMServer((args.host, args.port), args.latency, args.error_rate, args.error_status,
+                           args.slow_rate, args.slow_latency, args.latency_distribution, args.jitter,
+                           args.error_statuses, args.drop_rate)
+    print(f"Fake LLM listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Streaming ingestion of the catalog CSVs.
+
+A sheet is read from its file in blocks (never held whole in memory), parsed row
+by row with the stdlib csv module and handed on in chunks of CHUNK_ROWS rows.
+Every row is validated as it is read:
+    repaired     missing trailing cells are filled with ""
+    quarantined  rows with a blank key column, too few fields to reach it, more
+                 fields than the header (an unquoted comma: which column it
+                 belongs to cannot be told), a cell spanning lines (an unclosed
+                 quote) or unparsable CSV are left out (and written to
+                 QUARANTINE_DIR, if set)
+    duplicates   rows identical to an earlier one are dropped; each distinct row
+                 costs a 16-byte BLAKE2b digest (about 80 bytes in the set) until
+                 the sheet has been read, for at most DEDUP_ROWS rows (80 MB by
+                 default): later rows are only checked against those
+Cells are stripped and deduplicated, so the repeated values of a large export
+("Hemograma", "Radiografia abdominal"...) share one string object. The content
+hash that versions the catalog is computed on the same pass over the bytes.
+
+    reader = SheetReader("PredictVet/planilha_diagnostico_exames.csv")
+    for chunk in reader.chunks():
+        ...  # lists of tuples, in reader.columns order
+    print(reader.report)
+
+`python -m PredictVet.ingest <file.csv> ...` validates sheets without loading them.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import logging
+import os
+import sys
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Rows per chunk handed to the catalog builders
+CHUNK_ROWS = int(os.environ.get("PREDICTVET_CATALOG_CHUNK_ROWS", "50000"))
+# Directory for <sheet>.quarantine.csv files with the rejected rows ("" only reports them)
+QUARANTINE_DIR = os.environ.get("PREDICTVET_CATALOG_QUARANTINE_DIR", "")
+# Bytes read from the file at a time
+READ_BLOCK = 1 << 20
+# Distinct cell values kept for sharing before the table is reset
+SHARED_VALUES = 1 << 16
+# Distinct rows remembered to spot duplicates (bounds the digest set of a huge export)
+DEDUP_ROWS = int(os.environ.get("PREDICTVET_CATALOG_DEDUP_ROWS", str(1 << 20)))
+
+# Columns that must not be blank for a row to be kept (when the sheet has them)
+KEY_COLUMNS = ("Queixa",)
+
+class CatalogFormatError(ValueError):
+    """The sheet cannot be ingested at all (e.g. it has no header)."""
+
+class IngestReport:
+    """What ingesting one sheet did: rows kept, repaired, quarantined and dropped."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows_read = 0
+        self.rows_kept = 0
+        self.blank = 0
+        self.duplicates = 0
+        self.repaired = {}
+        self.quarantined = {}
+        self.quarantine_path = None
+        # True once DEDUP_ROWS distinct rows were seen: duplicates of later rows are kept
+        self.dedup_limited = False
+
+    @property
+    def clean(self) -> bool:
+        """True when every row was kept as written."""
+        return not (self.repaired or self.quarantined or self.duplicates)
+
+    def as_dict(self) -> dict:
+        return {"path": self.path, "rows_read": self.rows_read, "rows_kept": self.rows_kept, "blank": self.blank,
+                "duplicates": self.duplicates, "repaired": dict(self.repaired),
+                "quarantined": dict(self.quarantined), "quarantine_path": self.quarantine_path,
+                "dedup_limited": self.dedup_limited}
+
+    def __str__(self) -> str:
+        def counts(reasons: dict) -> str:
+            return ", ".join(f"{reason}={count}" for reason, count in sorted(reasons.items())) or "none"
+        text = (f"{os.path.basename(self.path)}: {self.rows_read} rows read, {self.rows_kept} kept, "
+                f"{self.duplicates} duplicates dropped; repaired: {counts(self.repaired)}; "
+                f"quarantined: {counts(self.quarantined)}")
+        if self.dedup_limited:
+            text += f"; duplicates only checked against the first {DEDUP_ROWS} distinct rows"
+        return text + (f" (see {self.quarantine_path})" if self.quarantine_path else "")
+
+class _HashingFile(io.RawIOBase):
+    """Raw file wrapper feeding every byte read to a hashlib digest."""
+
+    def __init__(self, raw, digest):
+        self._raw = raw
+        self._digest = digest
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = self._raw.readinto(buffer)
+        if count:
+            self._digest.update(memoryview(buffer)[:count])
+        return count
+
+    def close(self) -> None:
+        self._raw.close()
+        super().close()
+
+def content_version(paths) -> str:
+    """
+    The catalog version of the given files without parsing them: the first 12
+    hex digits of the SHA-1 of their bytes, separated by a NUL byte.
+    """
+    digest = hashlib.sha1()
+    for position, path in enumerate(paths):
+        if position:
+            digest.update(b"\0")
+        with open(path, "rb") as f:
+            while block := f.read(READ_BLOCK):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+def row_digest(row: tuple) -> bytes:
+    """BLAKE2b digest of a row's cells, used to spot duplicates without keeping the rows."""
+    text = "\0".join(row)
+    if text.count("\0") != len(row) - 1:
+        # A cell holds a NUL byte: fall back to an unambiguous form
+        text = repr(row)
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+class SheetReader:
+    """
+    One pass over a CSV sheet. columns is known once chunks() has started;
+    report is complete once it is exhausted. If digest is given, the file's
+    bytes are fed to it as they are read.
+    """
+
+    def __init__(self, path: str, key_columns=KEY_COLUMNS, chunk_rows: int = None, digest=None,
+                 quarantine_dir: str = None, dedup_rows: int = None):
+        self.path = path
+        self.columns = ()
+        self.report = IngestReport(path)
+        self._key_columns = key_columns
+        self._chunk_rows = max(chunk_rows or CHUNK_ROWS, 1)
+        self._digest = digest
+        self._quarantine_dir = QUARANTINE_DIR if quarantine_dir is None else quarantine_dir
+        self._quarantine = None
+        self._dedup_rows = DEDUP_ROWS if dedup_rows is None else dedup_rows
+
+    def _open(self):
+        raw = open(self.path, "rb", buffering=0)
+        if self._digest is not None:
+            raw = _HashingFile(raw, self._digest)
+        return io.TextIOWrapper(io.BufferedReader(raw, READ_BLOCK), encoding="utf-8-sig", newline="")
+
+    def _reject(self, line: int, reason: str, fields) -> None:
+        self.report.quarantined[reason] = self.report.quarantined.get(reason, 0) + 1
+        if not self._quarantine_dir:
+            return
+        if self._quarantine is None:
+            os.makedirs(self._quarantine_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(self.path))[0] + ".quarantine.csv"
+            self.report.quarantine_path = os.path.join(self._quarantine_dir, name)
+            self._quarantine = open(self.report.quarantine_path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._quarantine)
+            self._writer.writerow(("line", "reason") + self.columns)
+        self._writer.writerow([line, reason, *fields])
+
+    def chunks(self) -> Iterator[list[tuple]]:
+        """Yields the kept rows, as tuples of stripped strings, CHUNK_ROWS at a time."""
+        # Equal cells share one string object; unlike sys.intern, these are freed after the load
+        shared = {}
+        share = shared.setdefault
+        report = self.report
+        with self._open() as f:
+            reader = csv.reader(f)
+            try:
+                header = next(reader)
+            except StopIteration:
+                raise CatalogFormatError(f"{self.path} is empty") from None
+            self.columns = columns = tuple(sys.intern(column.strip()) for column in header)
+            width = len(columns)
+            # Rows too short to reach the last key column cannot be padded
+            keys = [columns.index(column) for column in self._key_columns if column in columns]
+            min_width = max(keys) + 1 if keys else 1
+            seen = set()
+            dedup_rows = self._dedup_rows
+            chunk = []
+            chunk_rows = self._chunk_rows
+            read = kept = blank = duplicates = padded = 0
+            try:
+                while True:
+                    try:
+                        fields = next(reader)
+                    except StopIteration:
+                        break
+                    except csv.Error as e:
+                        read += 1
+                        self._reject(reader.line_num, "unparsable", [str(e)])
+                        continue
+                    read += 1
+                    joined = "".join(fields)
+                    if not joined or joined.isspace():
+                        blank += 1
+                        continue
+                    if "\n" in joined or "\r" in joined:
+                        # Catalog cells are one line: a line break means an unclosed quote swallowed rows
+                        self._reject(reader.line_num, "unclosed_quote", fields)
+                        continue
+                    if len(fields) > width:
+                        # Unquoted commas inside a cell: any column before the last may hold them
+                        self._reject(reader.line_num, "extra_fields", fields)
+                        continue
+                    if len(fields) < width:
+                        if len(fields) < min_width:
+                            self._reject(reader.line_num, "missing_fields", fields)
+                            continue
+                        fields = fields + [""] * (width - len(fields))
+                        padded += 1
+                    cells = [field.strip() for field in fields]
+                    row = tuple([share(cell, cell) for cell in cells])
+                    if len(shared) > SHARED_VALUES:
+                        # Unique values (names, ids) would otherwise grow it without bound
+                        shared.clear()
+                    if not all([row[key] for key in keys]):
+                        self._reject(reader.line_num, "blank_key", fields)
+                        continue
+                    # Digests, not rows, are kept to spot duplicates: memory stays per row, not per cell
+                    fingerprint = row_digest(row)
+                    if fingerprint in seen:
+                        duplicates += 1
+                        continue
+                    if len(seen) < dedup_rows:
+                        seen.add(fingerprint)
+                    elif not report.dedup_limited:
+                        report.dedup_limited = True
+                        logger.warning("%s: more than %d distinct rows; later duplicates are not dropped",
+                                       self.path, dedup_rows)
+                    kept += 1
+                    chunk.append(row)
+                    if len(chunk) >= chunk_rows:
+                        yield chunk
+                        chunk = []
+                if chunk:
+                    yield chunk
+            finally:
+                report.rows_read, report.rows_kept, report.blank, report.duplicates = read, kept, blank, duplicates
+                if padded:
+                    report.repaired["missing_fields"] = padded
+                if self._quarantine is not None:
+                    self._quarantine.close()
+                    self._quarantine = None
+
+    def rows(self) -> Iterator[dict]:
+        """The kept rows as dicts keyed by column."""
+        for chunk in self.chunks():
+            columns = self.columns
+            for row in chunk:
+                yield dict(zip(columns, row))
+
+def categorical_frame(columns: tuple, rows: list[tuple]) -> "pd.DataFrame":
+    """One chunk as a DataFrame of categorical columns (blank cells become NaN)."""
+    import pandas as pd
+    return pd.DataFrame({column: pd.Categorical([row[i] or None for row in rows])
+                         for i, column in enumerate(columns)}, columns=list(columns))
+
+def concat_frames(columns: tuple, frames: list) -> "pd.DataFrame":
+    """Concatenates categorical chunks, merging their categories (pd.concat would fall back to object)."""
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+    if not frames:
+        return pd.DataFrame({column: pd.Categorical([]) for column in columns}, columns=list(columns))
+    return pd.DataFrame({column: union_categoricals([frame[column] for frame in frames]) for column in columns},
+                        columns=list(columns))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validates catalog CSV sheets and reports repaired, "
+                                                 "quarantined and duplicate rows.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--quarantine-dir", default=QUARANTINE_DIR,
+                        help="write the rejected rows of each sheet to <dir>/<sheet>.quarantine.csv")
+    args = parser.parse_args()
+
+    clean = True
+    for path in args.paths:
+        reader = SheetReader(path, quarantine_dir=args.quarantine_dir)
+        for _ in reader.chunks():
+            pass
+        print(reader.report)
+        clean = clean and not reader.report.quarantined
+    sys.exit(0 if clean else 1)
+
+if __name__ == "__main__":
+    main()
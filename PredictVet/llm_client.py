@@ -0,0 +1,646 @@
+"""
+Resilient LLM calls: one pooled client per process, per-call deadlines,
+jittered retries for transient errors and optional hedged requests.
+
+    client = get_llm_client(backend)    # backend(prompt, timeout) -> text
+    client.generate(prompt)             # raises LLMTimeoutError, LLMUnavailableError...
+    await client.agenerate(prompt)      # same, awaited on the event loop
+
+The backend is either the caller's (the agent passes llm_component.generate_content)
+or, when PREDICTVET_LLM_URL is set, HTTPBackend talking to a Gemini-compatible
+generateContent endpoint over a pool of keep-alive connections. Point it at
+PredictVet.fake_llm to exercise timeouts, retries and hedging locally.
+
+Configuration:
+  PREDICTVET_LLM_URL               endpoint base URL, e.g. https://generativelanguage.googleapis.com
+  PREDICTVET_LLM_MODEL             model for the HTTP backend (default gemini-2.0-flash-exp)
+  PREDICTVET_LLM_TIMEOUT           deadline of one call in seconds, retries included (default 60)
+  PREDICTVET_LLM_RETRIES           retries after the first attempt (default 2)
+  PREDICTVET_LLM_BACKOFF           base of the exponential backoff in seconds (default 0.5)
+  PREDICTVET_LLM_BACKOFF_MAX       cap of a single backoff in seconds (default 8)
+  PREDICTVET_LLM_HEDGE_PERCENTILE  send a second request when the first is slower than this
+                                   latency percentile (e.g. 95; default 0 = no hedging)
+  PREDICTVET_LLM_POOL_SIZE         concurrent calls and pooled HTTP connections (default 16)
+  PREDICTVET_LLM_MAX_IN_FLIGHT     calls allowed in flight at once (default 0 = no limit)
+  PREDICTVET_LLM_QUEUE_SIZE        calls that may wait for a free slot beyond it; when the
+                                   queue is full calls fail fast with LLMOverloadedError
+                                   (default 0 = no queue, every call over the limit fails)
+  PREDICTVET_LLM_QUEUE_TIMEOUT     longest wait in the queue in seconds (default 5)
+  PREDICTVET_LLM_RESERVED_SLOTS    in-flight slots kept for priority-0 calls (default 0)
+
+Waiting calls are admitted by priority, lower first (PredictVet.priority: 0 for
+emergencies, 2 for routine complaints, 3 for background work), then in arrival
+order. When the queue is full, a more urgent call displaces the least urgent,
+most recent waiter, which fails with LLMOverloadedError.
+"""
+import asyncio
+import heapq
+import http.client
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import ssl
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from typing import Awaitable, Callable, Iterable, Iterator
+from urllib.parse import urlsplit
+
+from PredictVet import metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_URL = os.environ.get("PREDICTVET_LLM_URL", "")
+LLM_MODEL = os.environ.get("PREDICTVET_LLM_MODEL", "gemini-2.0-flash-exp")
+TIMEOUT = float(os.environ.get("PREDICTVET_LLM_TIMEOUT", "60"))
+RETRIES = int(os.environ.get("PREDICTVET_LLM_RETRIES", "2"))
+BACKOFF = float(os.environ.get("PREDICTVET_LLM_BACKOFF", "0.5"))
+BACKOFF_MAX = float(os.environ.get("PREDICTVET_LLM_BACKOFF_MAX", "8"))
+HEDGE_PERCENTILE = float(os.environ.get("PREDICTVET_LLM_HEDGE_PERCENTILE", "0"))
+POOL_SIZE = int(os.environ.get("PREDICTVET_LLM_POOL_SIZE", "16"))
+MAX_IN_FLIGHT = int(os.environ.get("PREDICTVET_LLM_MAX_IN_FLIGHT", "0"))
+QUEUE_SIZE = int(os.environ.get("PREDICTVET_LLM_QUEUE_SIZE", "0"))
+QUEUE_TIMEOUT = float(os.environ.get("PREDICTVET_LLM_QUEUE_TIMEOUT", "5"))
+RESERVED_SLOTS = int(os.environ.get("PREDICTVET_LLM_RESERVED_SLOTS", "0"))
+# Priority of calls that do not give one (routine, in PredictVet.priority terms)
+DEFAULT_PRIORITY = 2
+# Successful latencies needed before hedging starts, and how many recent ones are kept
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+# HTTP statuses worth retrying: timeouts, rate limiting and server-side failures
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+_ATTEMPTS = metrics.counter("predictvet_llm_attempts_total", "LLM backend attempts by outcome")
+_RETRIES = metrics.counter("predictvet_llm_retries_total", "LLM calls retried after a transient error")
+_HEDGES = metrics.counter("predictvet_llm_hedges_total", "Hedged LLM requests by winning request")
+_REJECTED = metrics.counter("predictvet_llm_rejected_total",
+                            "LLM calls refused by admission control, by priority and reason")
+_QUEUE_SECONDS = metrics.histogram("predictvet_llm_queue_seconds", "Wait for an in-flight slot, by priority",
+                                   buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+class LLMError(RuntimeError):
+    """The LLM call failed."""
+    retryable = False
+
+class LLMTimeoutError(LLMError):
+    """The call (or one attempt) did not finish before its deadline."""
+    retryable = True
+
+class LLMUnavailableError(LLMError):
+    """Transient failure: connection error, rate limiting or a 5xx response."""
+    retryable = True
+
+class LLMOverloadedError(LLMError):
+    """Refused without calling the LLM: the in-flight limit is reached and no queue slot was free (or waited too long)."""
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed attempt may succeed if repeated."""
+    if isinstance(error, LLMError):
+        return error.retryable
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # google.genai and most HTTP client errors carry the status as .code or .status_code
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return status in RETRYABLE_STATUSES
+
+class HTTPBackend:
+    """
+    Calls {url}/v1beta/models/{model}:generateContent, reusing keep-alive
+    connections from a bounded pool. Honours the per-attempt timeout on the socket.
+    acall() is the awaitable variant, over an httpx.AsyncClient per event loop.
+    """
+
+    def __init__(self, url: str = LLM_URL, model: str = LLM_MODEL, api_key: str = None, pool_size: int = POOL_SIZE):
+        parts = urlsplit(url)
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = f"{parts.path.rstrip('/')}/v1beta/models/{model}:generateContent"
+        self._url = f"{parts.scheme}://{parts.netloc}{self._path}"
+        self._headers = {"Content-Type": "application/json"}
+        api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+        if api_key:
+            self._headers["x-goog-api-key"] = api_key
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._pool_size = pool_size
+        # httpx clients are bound to the loop they were first used on. They share one TLS
+        # context, built here: loading the CA store per client would block the loop for tens of ms
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._ssl_context = ssl.create_default_context() if parts.scheme == "https" else None
+
+    def _acquire(self, timeout: float) -> tuple:
+        try:
+            connection = self._pool.get_nowait()
+        except queue.Empty:
+            return self._connection_class(self._host, self._port, timeout=timeout), False
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, True
+
+    def _release(self, connection, response) -> None:
+        if response.will_close:
+            connection.close()
+            return
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _post(self, body: bytes, timeout: float) -> tuple:
+        connection, reused = self._acquire(timeout)
+        try:
+            connection.request("POST", self._path, body, self._headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            connection.close()
+            if not reused:
+                raise
+            # The server closed an idle pooled connection; repeat once on a new one
+            connection = self._connection_class(self._host, self._port, timeout=timeout)
+            try:
+                connection.request("POST", self._path, body, self._headers)
+                response = connection.getresponse()
+                data = response.read()
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+        self._release(connection, response)
+        return response.status, data
+
+    @staticmethod
+    def _body(prompt: str) -> bytes:
+        return json.dumps({"contents": [{"role": "user", "parts": [{"text": prompt}]}]}).encode("utf-8")
+
+    def __call__(self, prompt: str, timeout: float) -> str:
+        try:
+            status, data = self._post(self._body(prompt), timeout)
+        except TimeoutError as e:
+            raise LLMTimeoutError(f"LLM did not answer within {timeout:.1f}s") from e
+        except (OSError, http.client.HTTPException) as e:
+            raise LLMUnavailableError(f"LLM connection failed: {e!r}") from e
+        return self._parse(status, data)
+
+    async def acall(self, prompt: str, timeout: float) -> str:
+        """Awaitable __call__; cancelling it closes the request."""
+        # httpx is google-genai's HTTP client, installed with google-adk
+        import httpx
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            # Concurrency is bounded by the client's admission; pool_size only caps idle connections
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=self._pool_size)
+            client = self._async_clients[loop] = httpx.AsyncClient(headers=self._headers, limits=limits,
+                                                                   verify=self._ssl_context or False)
+        try:
+            response = await client.post(self._url, content=self._body(prompt), timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise LLMTimeoutError(f"LLM did not answer within {timeout:.1f}s") from e
+        except httpx.HTTPError as e:
+            raise LLMUnavailableError(f"LLM connection failed: {e!r}") from e
+        return self._parse(response.status_code, response.content)
+
+    @staticmethod
+    def _parse(status: int, data: bytes) -> str:
+        if status != 200:
+            detail = data[:200].decode("utf-8", "replace")
+            error_class = LLMUnavailableError if status in RETRYABLE_STATUSES else LLMError
+            raise error_class(f"LLM returned HTTP {status}: {detail}")
+        try:
+            candidate = json.loads(data)["candidates"][0]
+            return "".join(part.get("text", "") for part in candidate["content"]["parts"])
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"Unexpected LLM response: {data[:200]!r}") from e
+
+class _Waiter:
+    __slots__ = ("wake", "admitted", "displaced")
+
+    def __init__(self, wake: Callable[[], None]):
+        self.wake = wake
+        self.admitted = False
+        self.displaced = False
+
+class Admission:
+    """
+    At most `limit` calls in flight, `reserved` of the slots only for priority-0
+    calls, and up to `queue_size` calls waiting for a slot in priority order.
+    A limit of 0 admits everything. Threads wait with admitted(), coroutines
+    with admitted_async() (without holding a thread while queued).
+    """
+
+    def __init__(self, limit: int = MAX_IN_FLIGHT, queue_size: int = QUEUE_SIZE, queue_timeout: float = QUEUE_TIMEOUT,
+                 reserved: int = RESERVED_SLOTS):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        # At least one slot stays open to every priority
+        self.reserved = max(0, min(reserved, limit - 1))
+        self._lock = threading.Lock()
+        self._running = 0
+        self._waiting = []
+        self._arrivals = itertools.count()
+
+    @property
+    def running(self) -> int:
+        """Calls holding a slot."""
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        """Calls waiting for a slot."""
+        return len(self._waiting)
+
+    def _has_room(self, priority: int) -> bool:
+        free = self.limit - self._running
+        return free > self.reserved or (free > 0 and priority <= 0)
+
+    def _reject(self, priority: int, reason: str, message: str) -> LLMOverloadedError:
+        _REJECTED.inc(priority=str(priority), reason=reason)
+        return LLMOverloadedError(message)
+
+    def _dispatch(self) -> None:
+        # Called with the lock held: hands the free slots to the most urgent waiters
+        while self._waiting and self._has_room(self._waiting[0][0]):
+            _, _, waiter = heapq.heappop(self._waiting)
+            waiter.admitted = True
+            self._running += 1
+            waiter.wake()
+
+    def _enqueue(self, priority: int, waiter: _Waiter) -> bool:
+        """Takes a slot at once (True), queues waiter (False) or raises LLMOverloadedError."""
+        with self._lock:
+            # Waiters of the same or a more urgent priority go first
+            if self._has_room(priority) and not (self._waiting and self._waiting[0][0] <= priority):
+                self._running += 1
+                _QUEUE_SECONDS.observe(0.0, priority=str(priority))
+                return True
+            if self.queue_size <= 0:
+                raise self._reject(priority, "full", f"{self.limit} LLM calls already in flight")
+            if len(self._waiting) >= self.queue_size:
+                least_urgent = max(self._waiting)
+                if least_urgent[0] <= priority:
+                    raise self._reject(priority, "full", f"{self.limit} LLM calls in flight and {len(self._waiting)} queued")
+                self._waiting.remove(least_urgent)
+                heapq.heapify(self._waiting)
+                least_urgent[2].displaced = True
+                least_urgent[2].wake()
+            heapq.heappush(self._waiting, (priority, next(self._arrivals), waiter))
+            return False
+
+    def _wait_timeout(self, started: float, deadline: float | None) -> float:
+        timeout = self.queue_timeout if deadline is None else min(self.queue_timeout, deadline - started)
+        return max(timeout, 0)
+
+    def _settle(self, waiter: _Waiter, priority: int, started: float, timeout: float) -> None:
+        """After the wait: returns if the waiter got a slot, else leaves the queue and raises."""
+        with self._lock:
+            if waiter.admitted:
+                _QUEUE_SECONDS.observe(time.monotonic() - started, priority=str(priority))
+                return
+            if waiter.displaced:
+                raise self._reject(priority, "displaced", "LLM call displaced from the queue by a more urgent one")
+            self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+            heapq.heapify(self._waiting)
+        raise self._reject(priority, "timeout", f"No LLM slot became free within {timeout:.1f}s")
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """A cancelled waiter: gives back the slot it may just have been handed, or leaves the queue."""
+        with self._lock:
+            if waiter.admitted:
+                self._running -= 1
+                self._dispatch()
+            elif not waiter.displaced:
+                self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+                heapq.heapify(self._waiting)
+
+    def acquire(self, priority: int = DEFAULT_PRIORITY, deadline: float = None) -> None:
+        """Takes a slot, waiting in the queue until the earlier of queue_timeout and deadline."""
+        started = time.monotonic()
+        event = threading.Event()
+        waiter = _Waiter(event.set)
+        if self._enqueue(priority, waiter):
+            return
+        timeout = self._wait_timeout(started, deadline)
+        event.wait(timeout)
+        self._settle(waiter, priority, started, timeout)
+
+    async def acquire_async(self, priority: int = DEFAULT_PRIORITY, deadline: float = None) -> None:
+        """acquire() for coroutines: the wait is awaited, and cancelling it leaves the queue."""
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake() -> None:
+            # Slots are released from any thread
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The loop is closed; the waiter is settled (or abandoned) by its own coroutine
+                pass
+
+        waiter = _Waiter(wake)
+        if self._enqueue(priority, waiter):
+            return
+        timeout = self._wait_timeout(started, deadline)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self._settle(waiter, priority, started, timeout)
+
+    def release(self) -> None:
+        with self._lock:
+            self._running -= 1
+            self._dispatch()
+
+    @contextmanager
+    def admitted(self, priority: int = DEFAULT_PRIORITY, deadline: float = None):
+        """Holds one in-flight slot for the block, or raises LLMOverloadedError."""
+        if self.limit <= 0:
+            yield
+            return
+        self.acquire(priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def admitted_async(self, priority: int = DEFAULT_PRIORITY, deadline: float = None):
+        """admitted() for coroutines."""
+        if self.limit <= 0:
+            yield
+            return
+        await self.acquire_async(priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+_END = object()
+
+class LLMClient:
+    """
+    Runs backend calls on a bounded thread pool so each call has a deadline even
+    when the backend itself cannot be interrupted (a timed-out attempt finishes in
+    the background and its result is dropped). Transient failures are retried with
+    full-jitter exponential backoff within the same deadline. With hedging on, an
+    attempt still running after the configured latency percentile gets a duplicate
+    request and the first successful answer wins.
+
+    agenerate() does the same for coroutines with async_backend(prompt, timeout),
+    awaited on the event loop instead of a pool thread: in-flight calls are bounded
+    by admission, not by threads, and cancelling the await (or losing a hedge)
+    cancels the request itself. Without an async_backend it runs backend in a thread.
+    """
+
+    def __init__(self, backend: Callable[[str, float], str], timeout: float = TIMEOUT, retries: int = RETRIES,
+                 backoff: float = BACKOFF, backoff_max: float = BACKOFF_MAX,
+                 hedge_percentile: float = HEDGE_PERCENTILE, pool_size: int = POOL_SIZE,
+                 max_in_flight: int = MAX_IN_FLIGHT, admission: Admission = None,
+                 async_backend: Callable[[str, float], Awaitable[str]] = None):
+        self.backend = backend
+        self.async_backend = async_backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="predictvet-llm")
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.admission = admission or Admission(max_in_flight)
+
+    def hedge_delay(self) -> float | None:
+        """Latency after which an attempt is hedged, or None (hedging off or too few samples)."""
+        if self.hedge_percentile <= 0:
+            return None
+        samples = sorted(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))]
+
+    def _submit(self, prompt: str, deadline: float):
+        started = time.monotonic()
+        future = self._executor.submit(self.backend, prompt, max(deadline - started, 0.001))
+
+        def record(future) -> None:
+            if future.cancelled():
+                return
+            if future.exception() is None:
+                self._latencies.append(time.monotonic() - started)
+                _ATTEMPTS.inc(outcome="ok")
+            else:
+                _ATTEMPTS.inc(outcome="error")
+
+        future.add_done_callback(record)
+        return future
+
+    def _attempt(self, prompt: str, deadline: float) -> str:
+        """One attempt, hedged if it runs past hedge_delay()."""
+        primary = self._submit(prompt, deadline)
+        pending = {primary}
+        hedged = False
+        delay = self.hedge_delay()
+        if delay is not None and time.monotonic() + delay < deadline:
+            if not wait(pending, timeout=delay)[0]:
+                pending.add(self._submit(prompt, deadline))
+                hedged = True
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for other in pending:
+                    other.cancel()
+                if hedged:
+                    _HEDGES.inc(winner="primary" if future is primary else "hedge")
+                return future.result()
+        if pending:
+            for future in pending:
+                future.cancel()
+            _ATTEMPTS.inc(outcome="timeout")
+            raise LLMTimeoutError("LLM call exceeded its deadline")
+        raise error
+
+    def _retry_delay(self, attempt: int, error: BaseException, deadline: float) -> float:
+        """Backoff before retrying, or re-raises error when it should not be retried."""
+        if attempt >= self.retries or not is_retryable(error):
+            raise error
+        delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            raise error
+        _RETRIES.inc()
+        logger.info("LLM attempt %d failed (%r); retrying in %.2fs", attempt + 1, error, delay)
+        return delay
+
+    def _backoff(self, attempt: int, error: BaseException, deadline: float) -> None:
+        """Sleeps before retrying, or re-raises error when it should not be retried."""
+        time.sleep(self._retry_delay(attempt, error, deadline))
+
+    def generate(self, prompt: str, timeout: float = None, priority: int = DEFAULT_PRIORITY) -> str:
+        """
+        Returns the generated text, retrying transient errors until the deadline.
+        Time spent queued for admission counts against the deadline.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        with self.admission.admitted(priority, deadline):
+            while True:
+                try:
+                    return self._attempt(prompt, deadline)
+                except Exception as e:
+                    self._backoff(attempt, e, deadline)
+                attempt += 1
+
+    async def _run_async(self, prompt: str, deadline: float) -> str:
+        started = time.monotonic()
+        timeout = max(deadline - started, 0.001)
+        try:
+            if self.async_backend is not None:
+                text = await self.async_backend(prompt, timeout)
+            else:
+                text = await asyncio.to_thread(self.backend, prompt, timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            _ATTEMPTS.inc(outcome="error")
+            raise
+        self._latencies.append(time.monotonic() - started)
+        _ATTEMPTS.inc(outcome="ok")
+        return text
+
+    async def _attempt_async(self, prompt: str, deadline: float) -> str:
+        """_attempt() as tasks: the request still running when another wins (or the deadline passes) is cancelled."""
+        primary = asyncio.ensure_future(self._run_async(prompt, deadline))
+        pending = {primary}
+        try:
+            hedged = False
+            delay = self.hedge_delay()
+            if delay is not None and time.monotonic() + delay < deadline:
+                if not (await asyncio.wait(pending, timeout=delay))[0]:
+                    pending.add(asyncio.ensure_future(self._run_async(prompt, deadline)))
+                    hedged = True
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(deadline - time.monotonic(), 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if hedged:
+                        _HEDGES.inc(winner="primary" if task is primary else "hedge")
+                    return task.result()
+            if pending:
+                _ATTEMPTS.inc(outcome="timeout")
+                raise LLMTimeoutError("LLM call exceeded its deadline")
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Let the cancelled requests close their connections before returning
+                await asyncio.wait(pending)
+
+    async def agenerate(self, prompt: str, timeout: float = None, priority: int = DEFAULT_PRIORITY) -> str:
+        """generate() for coroutines."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        async with self.admission.admitted_async(priority, deadline):
+            while True:
+                try:
+                    return await self._attempt_async(prompt, deadline)
+                except Exception as e:
+                    delay = self._retry_delay(attempt, e, deadline)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _call(self, func: Callable, deadline: float, *args):
+        future = self._executor.submit(func, *args)
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FuturesTimeoutError:
+            future.cancel()
+            raise LLMTimeoutError("LLM call exceeded its deadline") from None
+
+    def stream(self, prompt: str, open_stream: Callable[[str], Iterable[str]], timeout: float = None,
+               priority: int = DEFAULT_PRIORITY) -> Iterator[str]:
+        """
+        Yields the chunks of open_stream(prompt). Failures before the first chunk are
+        retried like generate(); after that they propagate, since text was already sent.
+        The first chunk must arrive before the deadline, and each later one within `timeout`.
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        attempt = 0
+        with self.admission.admitted(priority, deadline):
+            while True:
+                try:
+                    chunks = self._call(lambda: iter(open_stream(prompt)), deadline)
+                    chunk = self._call(next, deadline, chunks, _END)
+                    break
+                except Exception as e:
+                    self._backoff(attempt, e, deadline)
+                attempt += 1
+            while chunk is not _END:
+                yield chunk
+                chunk = self._call(next, time.monotonic() + timeout, chunks, _END)
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def _forget_client_after_fork() -> None:
+    # Pool threads and pooled sockets do not survive fork: each worker builds its own client
+    global _default_client, _default_client_lock
+    _default_client = None
+    _default_client_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_client_after_fork)
+
+def get_llm_client(backend: Callable[[str, float], str] = None,
+                   async_backend: Callable[[str, float], Awaitable[str]] = None) -> LLMClient:
+    """
+    Returns the process-wide client, creating it on first use: HTTPBackend when
+    PREDICTVET_LLM_URL is set, otherwise the given backends.
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                if LLM_URL:
+                    backend = HTTPBackend(LLM_URL, LLM_MODEL)
+                    async_backend = backend.acall
+                elif backend is None:
+                    raise LLMError("No LLM backend configured (set PREDICTVET_LLM_URL).")
+                _default_client = LLMClient(backend, async_backend=async_backend)
+    return _default_client
+
+def _collect_admission():
+    client = _default_client
+    if client is not None and client.admission.limit > 0:
+        yield "predictvet_llm_in_flight", "LLM calls holding an in-flight slot", {}, client.admission.running
+        yield "predictvet_llm_queued", "LLM calls waiting for an in-flight slot", {}, client.admission.queued
+
+metrics.register_collector(_collect_admission)
@@ -0,0 +1,74 @@
+"""
+Logging setup for PredictVet.
+
+Modules log through logging.getLogger(__name__) under the "PredictVet" logger.
+Without configuration only warnings and errors reach stderr (Python's default);
+configure_logging() installs a handler driven by:
+  PREDICTVET_LOG_LEVEL        DEBUG, INFO, WARNING... (default INFO)
+  PREDICTVET_LOG_FORMAT       "text" (default) or "json", one object per line
+  PREDICTVET_LOG_SAMPLE_RATE  fraction of DEBUG/INFO records kept (default 1.0);
+                              warnings and errors are never sampled out
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+LOG_LEVEL = os.environ.get("PREDICTVET_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("PREDICTVET_LOG_FORMAT", "text").lower()
+LOG_SAMPLE_RATE = float(os.environ.get("PREDICTVET_LOG_SAMPLE_RATE", "1.0"))
+# Whether the environment asked for logging to be configured at import time
+CONFIGURED_BY_ENV = any(name in os.environ for name in
+                        ("PREDICTVET_LOG_LEVEL", "PREDICTVET_LOG_FORMAT", "PREDICTVET_LOG_SAMPLE_RATE"))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else was passed through extra= and is a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+class SamplingFilter(logging.Filter):
+    """Keeps a random fraction of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including the fields passed with extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+_handler = None
+
+def configure_logging(level: str = None, fmt: str = None, sample_rate: float = None, stream=None) -> logging.Logger:
+    """
+    Installs (or replaces) the handler of the "PredictVet" logger.
+    Arguments default to the PREDICTVET_LOG_* environment variables.
+    """
+    global _handler
+    logger = logging.getLogger("PredictVet")
+    if _handler is not None:
+        logger.removeHandler(_handler)
+    _handler = logging.StreamHandler(stream or sys.stderr)
+    _handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else logging.Formatter(TEXT_FORMAT))
+    _handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE if sample_rate is None else sample_rate))
+    logger.addHandler(_handler)
+    logger.setLevel(level or LOG_LEVEL)
+    # Records are handled here; do not duplicate them through the root logger
+    logger.propagate = False
+    return logger
@@ -0,0 +1,138 @@
+import re
+import unicodedata
+from itertools import combinations
+
+try:
+    from PredictVet import catalog
+except ImportError:
+    # Imported from tools.py running as a script
+    import catalog
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Shortest typed prefix accepted as a selection
+MIN_PREFIX = 3
+
+def fold(text) -> str:
+    """
+    Accent-, case- and punctuation-insensitive form of a text:
+    "Respiratório " -> "respiratorio", "Pele e Pelos!" -> "pele e pelos".
+    """
+    decomposed = unicodedata.normalize("NFKD", str(text).casefold())
+    without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(" ", without_accents).strip()
+
+def max_typos(length: int) -> int:
+    """Edit distance tolerated for a word of the given length (short words must match exactly)."""
+    if length <= 4:
+        return 0
+    return 1 if length <= 8 else 2
+
+def _deletes(word: str, distance: int) -> set:
+    """All strings obtained by deleting up to `distance` characters from word."""
+    variants = {word}
+    for removed in range(1, min(distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), removed):
+            variants.add("".join(char for i, char in enumerate(word) if i not in positions))
+    return variants
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance between a and b, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class OptionIndex:
+    """
+    Precomputed lookup over a menu's options, resolving free-typed selections in
+    (near) constant time regardless of the number of options. Tried in order:
+      1. exact match after fold() ("vomito" -> "Vômito")
+      2. same text ignoring spaces ("peleepelos" -> "Pele e Pelos")
+      3. unique prefix of at least MIN_PREFIX characters ("resp" -> "Respiratório")
+      4. every typed word starting a word of exactly one option ("dific urinar")
+      5. closest option within max_typos() edits, via a deletion dictionary
+         (SymSpell-style), if it is the only one at that distance ("cocera" -> "Coceira");
+         skipped for texts longer than any option plus the typos allowed
+    Ambiguous inputs resolve to None, so the menu is shown again.
+    """
+
+    def __init__(self, options):
+        self.options = tuple(options)
+        self._exact = {}
+        self._prefixes = {}
+        self._words = {}
+        self._deletes = {}
+        for option in self.options:
+            folded = fold(option)
+            compact = folded.replace(" ", "")
+            self._exact.setdefault(folded, option)
+            self._exact.setdefault(compact, option)
+            for end in range(MIN_PREFIX, len(compact) + 1):
+                self._prefixes.setdefault(compact[:end], set()).add(option)
+            for word in set(folded.split()):
+                for end in range(MIN_PREFIX, len(word) + 1):
+                    self._words.setdefault(word[:end], set()).add(option)
+            for variant in _deletes(compact, max_typos(len(compact))):
+                self._deletes.setdefault(variant, set()).add(option)
+        self._compact = {option: fold(option).replace(" ", "") for option in self.options}
+        self._max_option_len = max(map(len, self._compact.values()), default=0)
+
+    def resolve(self, text: str):
+        """Returns the option the user most likely meant, or None if unknown or ambiguous."""
+        folded = fold(text)
+        if not folded:
+            return None
+        compact = folded.replace(" ", "")
+
+        option = self._exact.get(folded) or self._exact.get(compact)
+        if option is not None:
+            return option
+
+        if len(compact) >= MIN_PREFIX:
+            candidates = self._prefixes.get(compact, ())
+            if len(candidates) == 1:
+                return next(iter(candidates))
+
+        words = [word for word in folded.split() if len(word) >= MIN_PREFIX]
+        if words:
+            candidates = set.intersection(*(self._words.get(word, set()) for word in words))
+            if len(candidates) == 1:
+                return next(iter(candidates))
+
+        limit = max_typos(len(compact))
+        if limit == 0 or len(compact) > self._max_option_len + limit:
+            # No option is within `limit` edits of a longer text (e.g. a free-text message),
+            # and its deletion variants would grow with the cube of its length
+            return None
+        candidates = set()
+        for variant in _deletes(compact, limit):
+            candidates.update(self._deletes.get(variant, ()))
+        best, best_distance = [], limit + 1
+        for candidate in candidates:
+            distance = edit_distance(compact, self._compact[candidate], limit)
+            if distance < best_distance:
+                best, best_distance = [candidate], distance
+            elif distance == best_distance:
+                best.append(candidate)
+        return best[0] if len(best) == 1 and best_distance <= limit else None
+
+def option_index(key: tuple, options) -> OptionIndex:
+    """
+    Returns the OptionIndex for a menu, built once per catalog version.
+    key identifies the menu, e.g. ("categorias",) or ("queixas", categoria).
+    """
+    snapshot = catalog.active_snapshot()
+    if snapshot is None:
+        return OptionIndex(options)
+    return catalog.memoize(snapshot, ("option_index",) + tuple(key), lambda: OptionIndex(options))
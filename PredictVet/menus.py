@@ -0,0 +1,84 @@
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from PredictVet import catalog
+
+WELCOME_TEMPLATE = """🐾 **Olá! Eu sou o PredictVet**, seu assistente veterinário especializado.
+
+Estou aqui para ajudar médicos veterinários com informações técnicas sobre sintomas, diagnósticos e tratamentos para cães e gatos.
+
+Para começar, por favor, **escolha a categoria de sintoma** que você gostaria de analisar:
+
+{options}
+Você pode digitar o **número** ou o **nome da categoria**."""
+
+INVALID_CATEGORY_TEMPLATE = """❌ **Categoria não reconhecida.** Por favor, escolha uma das opções abaixo:
+
+{options}
+Digite o **número** ou o **nome exato** da categoria."""
+
+CATEGORY_SELECTED_TEMPLATE = """✅ **Ótimo! Você selecionou: {categoria}**
+
+Agora, por favor, **escolha a queixa específica** que você gostaria de analisar:
+
+{options}
+Você pode digitar o **número** ou o **nome da queixa**."""
+
+INVALID_COMPLAINT_TEMPLATE = """❌ **Queixa não reconhecida.** Por favor, escolha uma das opções para **{categoria}**:
+
+{options}
+Digite o **número** ou o **nome exato** da queixa."""
+
+class ComplaintMenu(NamedTuple):
+    """Complaint options of one category with its rendered messages."""
+    queixas: tuple
+    selected: str
+    invalid: str
+
+class Menus(NamedTuple):
+    """
+    Every navigation message of one catalog version, rendered once:
+    the welcome and invalid-category messages and one ComplaintMenu per category.
+    """
+    categorias: tuple
+    welcome: str
+    invalid_category: str
+    complaints: Mapping[str, ComplaintMenu]
+
+def numbered(options) -> str:
+    """Renders options as "1. first\\n2. second\\n..."."""
+    return "".join(f"{i}. {option}\n" for i, option in enumerate(options, 1))
+
+def build_menus(index: catalog.CatalogIndex) -> Menus:
+    """Renders every menu of a catalog index (categories without complaints get no menu)."""
+    complaints = {}
+    for categoria in index.categorias:
+        queixas = tuple(index.queixas_por_categoria.get(categoria, ()))
+        if not queixas:
+            continue
+        options = numbered(queixas)
+        complaints[categoria] = ComplaintMenu(
+            queixas,
+            CATEGORY_SELECTED_TEMPLATE.format(categoria=categoria, options=options),
+            INVALID_COMPLAINT_TEMPLATE.format(categoria=categoria, options=options),
+        )
+    options = numbered(index.categorias)
+    return Menus(tuple(index.categorias), WELCOME_TEMPLATE.format(options=options),
+                 INVALID_CATEGORY_TEMPLATE.format(options=options), MappingProxyType(complaints))
+
+def menus_for(snapshot: catalog.CatalogSnapshot) -> Menus | None:
+    """Returns the snapshot's rendered menus, or None if it has no usable categories."""
+    if not {"Categoria", "Queixa"} <= snapshot.queixas_columns or not snapshot.index.categorias:
+        return None
+    return catalog.memoize(snapshot, ("menus",), lambda: build_menus(snapshot.index))
+
+# Menus are rendered as soon as a catalog version is installed
+catalog.subscribe(menus_for)
+
+def get_menus() -> Menus | None:
+    """
+    Returns the rendered menus of the catalog version the conversation is pinned to,
+    or None if the catalog is unavailable (callers then report the tools' error).
+    """
+    snapshot = catalog.active_snapshot() or catalog.ensure_loaded()
+    return menus_for(snapshot) if snapshot is not None else None
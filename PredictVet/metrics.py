@@ -0,0 +1,230 @@
+"""
+In-process counters and latency histograms, exposed in the Prometheus text format.
+
+    from PredictVet import metrics
+    metrics.histogram("predictvet_step_seconds", "Dialogue step latency").observe(0.002, step="initial")
+    metrics.render()                    # text exposition, e.g. for a /metrics route
+    metrics.start_http_server(9464)     # or serve it from a background thread
+    metrics.add_hook(send_to_statsd)    # or forward every observation elsewhere
+
+PREDICTVET_METRICS=0 turns recording off; PREDICTVET_METRICS_PORT starts the
+HTTP endpoint when the agent module is imported (under PredictVet.serve, each
+worker serves its own on the port plus its worker number instead).
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable
+
+ENABLED = os.environ.get("PREDICTVET_METRICS", "1").lower() not in ("0", "false", "no")
+METRICS_PORT = int(os.environ.get("PREDICTVET_METRICS_PORT", "0"))
+
+# Latency buckets in seconds: sub-millisecond navigation turns up to slow LLM calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_hooks = []
+_collectors = []
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _notify(name: str, kind: str, labels: dict, value: float) -> None:
+    for hook in _hooks:
+        try:
+            hook(name, kind, labels, value)
+        except Exception:
+            # A broken exporter must never break a request
+            pass
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _notify(self.name, self.kind, labels, amount)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (count and sum included)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+        _notify(self.name, self.kind, labels, value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            series_list = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in series_list:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_format_labels(key, (('le', le),))} {cumulative}"
+            yield f"{self.name}_count{_format_labels(key)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(key)} {series[-1]}"
+
+def _get_or_create(cls, name: str, help_text: str, **kwargs):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.setdefault(name, cls(name, help_text, **kwargs))
+    return metric
+
+def counter(name: str, help_text: str = "") -> Counter:
+    """Returns the process-wide counter with this name, creating it on first use."""
+    return _get_or_create(Counter, name, help_text)
+
+def histogram(name: str, help_text: str = "", buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    """Returns the process-wide histogram with this name, creating it on first use."""
+    return _get_or_create(Histogram, name, help_text, buckets=buckets)
+
+def timed(name: str, help_text: str = "", **labels) -> Callable:
+    """Decorator observing each call's duration in the named histogram."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram(name, help_text).time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def disabled():
+    """Turns recording off process-wide for the block, e.g. for warmup traffic."""
+    global ENABLED
+    previous = ENABLED
+    ENABLED = False
+    try:
+        yield
+    finally:
+        ENABLED = previous
+
+def add_hook(hook: Callable[[str, str, dict, float], None]) -> None:
+    """Calls hook(name, kind, labels, value) on every increment or observation."""
+    _hooks.append(hook)
+
+def register_collector(collector: Callable[[], Iterable[tuple]]) -> None:
+    """
+    Registers a callable evaluated at render time, yielding (name, help, labels, value)
+    gauges for values kept elsewhere (e.g. cache sizes).
+    """
+    _collectors.append(collector)
+
+def render() -> str:
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in sorted(_registry.values(), key=lambda metric: metric.name):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    for collector in _collectors:
+        described = set()
+        for name, help_text, labels, value in collector():
+            if name not in described:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                described.add(name)
+            lines.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the logs
+        pass
+
+_server = None
+
+def start_http_server(port: int = METRICS_PORT, address: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves render() on http://address:port/metrics from a daemon thread (once per process)."""
+    global _server
+    with _registry_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((address, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="predictvet-metrics", daemon=True).start()
+    return _server
+
+def stop_http_server() -> None:
+    """Stops the endpoint started by start_http_server() and frees its port."""
+    global _server
+    with _registry_lock:
+        server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
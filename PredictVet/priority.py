@@ -0,0 +1,71 @@
+"""
+Priority of a complaint's LLM analysis, read from the catalog metadata.
+
+Each complaint gets the most urgent level among its diagnosis rows:
+    EMERGENCY   "Dificuldade para urinar" -> Obstrução Urinária, "Cateterismo uretral de emergência"
+    URGENT      "Vômito" -> Corpo Estranho Gastrointestinal, "Cirurgia (se confirmado)"
+    ROUTINE     everything else, including complaints without diagnosis rows ("Queda de pelo")
+A row's level comes from its PRIORITY_COLUMN cell when the sheet has one
+("emergência", "urgente", "rotina" or 0-3); otherwise from the words of its
+diagnosis, exams and procedures (EMERGENCY_TERMS, URGENT_TERMS, accent-folded
+prefixes). BACKGROUND is for calls nobody is waiting on (speculative analyses,
+batch runs).
+
+Lower levels are admitted first by the LLM client's queue (PredictVet.llm_client).
+The levels are computed once per catalog version.
+
+    complaint_priority("Dificuldade para urinar") -> 0
+"""
+try:
+    from PredictVet import catalog
+    from PredictVet.matching import fold
+except ImportError:
+    # Imported from tools.py running as a script
+    import catalog
+    from matching import fold
+
+EMERGENCY, URGENT, ROUTINE, BACKGROUND = 0, 1, 2, 3
+LEVEL_NAMES = ("emergency", "urgent", "routine", "background")
+
+# Optional column of the diagnosis sheet with an explicit level per row
+PRIORITY_COLUMN = "Prioridade"
+COLUMN_VALUES = {"emergencia": EMERGENCY, "emergente": EMERGENCY, "urgente": URGENT, "urgencia": URGENT,
+                 "rotina": ROUTINE, "eletivo": ROUTINE, "0": EMERGENCY, "1": URGENT, "2": ROUTINE, "3": BACKGROUND}
+
+# Word prefixes (folded) that mark a row as an emergency or as urgent
+EMERGENCY_TERMS = ("emergenc", "imediat", "risco de vida")
+URGENT_TERMS = ("urgenc", "urgente", "cirurgi", "internac", "obstruc", "intravenos")
+TEXT_COLUMNS = ("Diagnostico_Possivel", "Exames_Sugeridos", "Procedimentos_Adicionais")
+
+def level_name(level: int) -> str:
+    """Metric label of a level ("emergency"...)."""
+    return LEVEL_NAMES[level] if 0 <= level < len(LEVEL_NAMES) else str(level)
+
+def row_priority(row) -> int:
+    """Level of one diagnosis row."""
+    explicit = row.get(PRIORITY_COLUMN)
+    if explicit is not None and explicit == explicit:
+        level = COLUMN_VALUES.get(fold(str(explicit)).strip())
+        if level is not None:
+            return level
+    words = fold(" ".join(str(row.get(column) or "") for column in TEXT_COLUMNS))
+    padded = " " + words
+    if any(" " + term in padded for term in EMERGENCY_TERMS):
+        return EMERGENCY
+    if any(" " + term in padded for term in URGENT_TERMS):
+        return URGENT
+    return ROUTINE
+
+def complaint_priorities(snapshot: catalog.CatalogSnapshot) -> dict:
+    """Level of every complaint with diagnosis rows, built on first use per catalog version."""
+    def build() -> dict:
+        return {queixa: min(row_priority(row) for row in rows)
+                for queixa, rows in snapshot.index.diagnosticos_por_queixa.items() if rows}
+    return catalog.memoize(snapshot, ("complaint_priorities",), build)
+
+def complaint_priority(queixa: str) -> int:
+    """Level of a complaint in the active catalog version (ROUTINE if unknown or without a catalog)."""
+    snapshot = catalog.active_snapshot()
+    if snapshot is None:
+        return ROUTINE
+    return complaint_priorities(snapshot).get(queixa, ROUTINE)
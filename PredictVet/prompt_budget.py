@@ -0,0 +1,163 @@
+"""
+Token budgeting of the final-analysis prompt.
+
+Sizes are estimated locally (no tokenizer download, no API call): every word
+counts one token per 4 characters, every punctuation mark one token, which is
+close to what SentencePiece-style tokenizers give for Portuguese prose.
+
+Before rendering, answers are compacted: a clause already given in an earlier
+answer is not repeated. If the prompt still exceeds TOKEN_BUDGET, lower-value
+parts are cut until it fits, in this order:
+    1. related entries of other complaints, lowest score first
+    2. the complaint's diagnosis rows, lowest score first (the best one stays)
+    3. the longest answers, truncated down to ANSWER_MIN_TOKENS each
+The static prefix (persona, instruction, complaint) is never cut, so its
+provider-side prefix caching is unaffected.
+
+Details added to an answer over several turns are merged with merge_answer(),
+so they neither overwrite each other nor repeat.
+"""
+import logging
+import os
+import re
+from typing import Callable, NamedTuple
+
+try:
+    from PredictVet import metrics
+    from PredictVet.matching import fold
+except ImportError:
+    # Imported from tools.py running as a script
+    import metrics
+    from matching import fold
+
+logger = logging.getLogger(__name__)
+
+# Estimated tokens allowed in the final-analysis prompt (0 disables the budget)
+TOKEN_BUDGET = int(os.environ.get("PREDICTVET_PROMPT_TOKEN_BUDGET", "1500"))
+# Answers are never truncated below this many tokens
+ANSWER_MIN_TOKENS = 40
+# Clauses shorter than this (e.g. "Sim", "Não") depend on their question and are never deduplicated
+MIN_DEDUP_WORDS = 3
+TRUNCATION_MARK = " […]"
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_CLAUSE_END = re.compile(r"(?<=[.;!?])\s+|\n+")
+
+# Prompt sizes in estimated tokens
+_TOKEN_BUCKETS = (100, 250, 500, 1000, 1500, 2000, 4000, 8000, 16000, 32000)
+_PROMPT_TOKENS = metrics.histogram("predictvet_prompt_tokens",
+                                   "Final-analysis prompt size in estimated tokens, before and after budgeting",
+                                   buckets=_TOKEN_BUCKETS)
+_COMPACTIONS = metrics.counter("predictvet_prompt_compactions_total", "Prompt parts cut to fit the token budget, by step")
+
+class PromptFit(NamedTuple):
+    """A rendered prompt with its estimated size, the size before budgeting and the steps applied."""
+    prompt: str
+    tokens: int
+    original_tokens: int
+    steps: tuple
+
+def estimate_tokens(text: str) -> int:
+    """Local estimate of the tokens in a text."""
+    return sum((len(token) + 3) // 4 for token in _TOKEN.findall(text))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to at most max_tokens tokens (mark included), at a word boundary."""
+    used = estimate_tokens(TRUNCATION_MARK)
+    for match in _TOKEN.finditer(text):
+        used += (len(match.group(0)) + 3) // 4
+        if used > max_tokens:
+            return text[:match.start()].rstrip(" ,;:") + TRUNCATION_MARK
+    return text
+
+def _clauses(text: str) -> list[str]:
+    return [clause.strip() for clause in _CLAUSE_END.split(str(text)) if clause.strip()]
+
+def _dedup_key(clause: str) -> str | None:
+    folded = fold(clause)
+    return folded if len(folded.split()) >= MIN_DEDUP_WORDS else None
+
+def merge_answer(previous: str, addition: str) -> str:
+    """
+    Appends the clauses of addition that previous does not already contain:
+    ("Vomitou duas vezes.", "Vomitou duas vezes. Está apático.") -> "Vomitou duas vezes. Está apático."
+    Only whole clauses are compared, and short ones are always kept, so a new or
+    contradicting detail ("Sem diarreia." then "Diarreia.") is never dropped.
+    """
+    if not previous:
+        return addition
+    if fold(addition) == fold(previous):
+        return previous
+    known = {_dedup_key(clause) for clause in _clauses(previous)} - {None}
+    new = [clause for clause in _clauses(addition) if _dedup_key(clause) not in known]
+    if not new:
+        return previous
+    separator = " " if previous.rstrip()[-1:] in ".;!?" else "; "
+    return previous.rstrip() + separator + " ".join(new)
+
+def compact_answers(respostas_coletadas: dict) -> dict:
+    """Drops clauses already given in an earlier answer (answers left empty keep their text)."""
+    if not isinstance(respostas_coletadas, dict):
+        return respostas_coletadas
+    seen = set()
+    compacted = {}
+    for pergunta, resposta in respostas_coletadas.items():
+        kept, dropped = [], False
+        for clause in _clauses(resposta):
+            key = _dedup_key(clause)
+            if key is not None:
+                if key in seen:
+                    dropped = True
+                    continue
+                seen.add(key)
+            kept.append(clause)
+        compacted[pergunta] = " ".join(kept) if dropped and kept else resposta
+    return compacted
+
+def fit_prompt(render: Callable[[dict, list, list], str], respostas_coletadas: dict, matches: list,
+               related: list = (), budget: int = None) -> PromptFit:
+    """
+    Renders the prompt with render(respostas, matches, related), cutting the parts
+    described in the module docstring until it fits the budget (default TOKEN_BUDGET).
+    matches and related are ordered best first.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    respostas = compact_answers(respostas_coletadas)
+    matches, related = list(matches), list(related)
+    prompt = render(respostas, matches, related)
+    original_tokens = tokens = estimate_tokens(prompt)
+    steps = []
+
+    def cut(step: str) -> None:
+        nonlocal prompt, tokens
+        prompt = render(respostas, matches, related)
+        tokens = estimate_tokens(prompt)
+        _COMPACTIONS.inc(step=step)
+        if step not in steps:
+            steps.append(step)
+
+    if budget > 0:
+        while tokens > budget and related:
+            related.pop()
+            cut("related")
+        while tokens > budget and len(matches) > 1:
+            matches.pop()
+            cut("diagnoses")
+        if tokens > budget and isinstance(respostas, dict):
+            # Longest answers first, each cut by the remaining excess (but not below ANSWER_MIN_TOKENS)
+            for pergunta in sorted(respostas, key=lambda pergunta: -estimate_tokens(str(respostas[pergunta]))):
+                size = estimate_tokens(str(respostas[pergunta]))
+                if tokens <= budget or size <= ANSWER_MIN_TOKENS:
+                    break
+                respostas[pergunta] = truncate_tokens(str(respostas[pergunta]),
+                                                      max(ANSWER_MIN_TOKENS, size - (tokens - budget)))
+                cut("answers")
+        if tokens > budget:
+            logger.warning("Final-analysis prompt exceeds the token budget after compaction: %d > %d estimated tokens",
+                           tokens, budget)
+
+    _PROMPT_TOKENS.observe(original_tokens, stage="original")
+    _PROMPT_TOKENS.observe(tokens, stage="final")
+    logger.debug("Final-analysis prompt: %d estimated tokens (%d before budgeting, steps: %s)",
+                 tokens, original_tokens, ", ".join(steps) or "none")
+    return PromptFit(prompt, tokens, original_tokens, tuple(steps))
@@ -0,0 +1,182 @@
+"""
+BM25 retrieval over the whole diagnostic knowledge base.
+
+Every diagnostico row, of every complaint, is one document made of its Queixa,
+Sintoma_Chave, Diagnostico_Possivel, Exames_Sugeridos and Procedimentos_Adicionais
+(field-weighted term frequencies over the stems of PredictVet.scoring). The
+inverted index is built in the background as soon as a catalog version is
+installed and kept for that version; postings are compact arrays of ascending
+document ids and their term frequencies.
+
+A query (the complaint plus the terms the answers affirm) is scored term by term,
+rarest first. Terms found in more than COMMON_TERM_FRACTION of the documents
+("exame", "hemograma"...) only re-score the candidates found by rarer terms,
+looked up by bisection, once those are enough to fill the top k; so a query
+stays in the milliseconds at hundreds of thousands of entries. No network access and no third-party dependencies.
+
+    related_entries(snapshot, "Vômito", {"O vômito é acompanhado de diarreia?": "Sim"})
+    -> [RetrievedEntry(queixa="Diarreia", row=<Colite Infecciosa>, score=2.1), ...]
+"""
+import heapq
+import logging
+import math
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Mapping, NamedTuple
+
+try:
+    from PredictVet import catalog, scoring
+except ImportError:
+    # Imported from tools.py running as a script
+    import catalog
+    import scoring
+
+logger = logging.getLogger(__name__)
+
+# Entries from other complaints added to the prompt (0 disables retrieval)
+TOP_K = int(os.environ.get("PREDICTVET_RETRIEVAL_TOP_K", "3"))
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Term frequency weight of each column
+FIELD_WEIGHTS = (("Queixa", 2.0), ("Sintoma_Chave", 2.0), ("Diagnostico_Possivel", 1.5),
+                 ("Exames_Sugeridos", 1.0), ("Procedimentos_Adicionais", 1.0))
+# Terms in more than this fraction of the documents do not add candidates
+COMMON_TERM_FRACTION = 0.05
+# Documents scanned for a common term when rarer terms found too few candidates
+MAX_COMMON_SCAN = 10000
+
+class RetrievedEntry(NamedTuple):
+    """A diagnostico row found by a query, with its complaint and BM25 score."""
+    queixa: str
+    row: Mapping
+    score: float
+
+class RetrievalIndex:
+    """BM25 inverted index over every diagnostico row of a catalog index."""
+
+    def __init__(self, index: catalog.CatalogIndex):
+        self._index = index
+        self._queixas = []
+        self._positions = array("I")
+        lengths = array("f")
+        postings = {}
+        # Exams and procedures repeat across rows: stem each distinct text once
+        text_terms = {}
+        for queixa in index.diagnosticos_por_queixa:
+            for position, row in enumerate(index.diagnosticos_por_queixa[queixa]):
+                document = len(self._queixas)
+                self._queixas.append(queixa)
+                self._positions.append(position)
+                frequencies = {}
+                length = 0.0
+                for field, weight in FIELD_WEIGHTS:
+                    text = row.get(field)
+                    if not text:
+                        continue
+                    field_terms = text_terms.get(text)
+                    if field_terms is None:
+                        field_terms = text_terms[text] = tuple(scoring.terms(text))
+                    for term in field_terms:
+                        frequencies[term] = frequencies.get(term, 0.0) + weight
+                    length += weight * len(field_terms)
+                lengths.append(length)
+                for term, frequency in frequencies.items():
+                    posting = postings.get(term)
+                    if posting is None:
+                        posting = postings[term] = (array("I"), array("f"))
+                    posting[0].append(document)
+                    posting[1].append(frequency)
+
+        self.documents = len(self._queixas)
+        average = (sum(lengths) / self.documents) if self.documents else 1.0
+        # Per-document part of the BM25 denominator, precomputed
+        self._norms = array("f", (K1 * (1 - B + B * length / (average or 1.0)) for length in lengths))
+        self._postings = postings
+        self._idf = {term: math.log(1 + (self.documents - len(docs) + 0.5) / (len(docs) + 0.5))
+                     for term, (docs, _) in postings.items()}
+
+    def _query_terms(self, queixa: str, respostas_coletadas: dict) -> set:
+        query = set(scoring.terms(queixa))
+        for pergunta, resposta in (respostas_coletadas or {}).items():
+            query |= scoring.answer_terms(str(pergunta), str(resposta))[0]
+        return query
+
+    def search(self, queixa: str, respostas_coletadas: dict, k: int = TOP_K,
+               exclude_queixa: str = None) -> list[RetrievedEntry]:
+        """Top-k documents for the complaint and answers, best first."""
+        query = [term for term in self._query_terms(queixa, respostas_coletadas) if term in self._postings]
+        if not query or k <= 0:
+            return []
+        query.sort(key=lambda term: len(self._postings[term][0]))
+        common = max(COMMON_TERM_FRACTION * self.documents, 1)
+        # Rows of the excluded complaint take places in the ranking that the results cannot use
+        excluded = len(self._index.diagnosticos_por_queixa.get(exclude_queixa, ())) if exclude_queixa else 0
+        wanted = k + excluded
+        norms = self._norms
+        scores = {}
+        for term in query:
+            documents, frequencies = self._postings[term]
+            idf = self._idf[term]
+            if len(documents) <= common or len(scores) < wanted:
+                # Rare term (or too few candidates yet): every document in the posting is a candidate
+                for document, frequency in zip(documents[:MAX_COMMON_SCAN] if len(documents) > common else documents,
+                                               frequencies):
+                    scores[document] = scores.get(document, 0.0) + idf * frequency * (K1 + 1) / (frequency + norms[document])
+            else:
+                # Common term: only re-scores the candidates found so far
+                for document in scores:
+                    i = bisect_left(documents, document)
+                    if i < len(documents) and documents[i] == document:
+                        frequency = frequencies[i]
+                        scores[document] += idf * frequency * (K1 + 1) / (frequency + norms[document])
+
+        best = heapq.nlargest(wanted, scores.items(), key=lambda item: (item[1], -item[0]))
+        entries = []
+        for document, score in best:
+            queixa_documento = self._queixas[document]
+            if queixa_documento == exclude_queixa:
+                continue
+            row = self._index.diagnosticos_por_queixa[queixa_documento][self._positions[document]]
+            entries.append(RetrievedEntry(queixa_documento, row, round(score, 3)))
+            if len(entries) == k:
+                break
+        return entries
+
+def retrieval_index_for(snapshot: catalog.CatalogSnapshot) -> RetrievalIndex | None:
+    """
+    The snapshot's index, or None if the catalog has no diagnostico rows. Callers
+    arriving while it is being built wait for that build instead of starting another.
+    """
+    if "Queixa" not in snapshot.diagnostico_columns or not snapshot.index.diagnosticos_por_queixa:
+        return None
+    lock = catalog.memoize(snapshot, ("retrieval_lock",), threading.Lock)
+    with lock:
+        return catalog.memoize(snapshot, ("retrieval_index",), lambda: RetrievalIndex(snapshot.index))
+
+def _build_in_background(snapshot: catalog.CatalogSnapshot) -> None:
+    def build():
+        try:
+            retrieval_index_for(snapshot)
+        except Exception:
+            logger.exception("Retrieval index build failed for catalog version %s", snapshot.version)
+
+    if TOP_K > 0:
+        threading.Thread(target=build, name="predictvet-retrieval-index", daemon=True).start()
+
+# The index is built when a catalog version is installed, without delaying the install
+catalog.subscribe(_build_in_background)
+
+def related_entries(snapshot: catalog.CatalogSnapshot, queixa: str, respostas_coletadas: dict,
+                    k: int = TOP_K) -> list[RetrievedEntry]:
+    """Entries of other complaints most relevant to this consultation."""
+    if k <= 0:
+        return []
+    index = retrieval_index_for(snapshot)
+    if index is None:
+        return []
+    return index.search(queixa, respostas_coletadas if isinstance(respostas_coletadas, dict) else {}, k,
+                        exclude_queixa=queixa)
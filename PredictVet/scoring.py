@@ -0,0 +1,143 @@
+"""
+Local, deterministic ranking of a complaint's diagnostico rows against the
+collected answers.
+
+Each row's Sintoma_Chave (and, with less weight, its Diagnostico_Possivel) is
+reduced to stemmed terms. A per-complaint inverted index, built once per catalog
+version, maps each term to the rows containing it, weighted by how rare the term
+is among the complaint's rows; scoring a consultation is one dictionary lookup
+per answer term. Terms after a negation ("não", "sem"...) count against the rows
+instead of for them, and a bare "sim"/"não" answer affirms or denies the terms
+of its question ("O vômito é acompanhado de diarreia?" -> "Sim").
+
+    rank_diagnoses(snapshot, "Vômito", {"O vômito é acompanhado de diarreia?": "Sim"})
+    -> [DiagnosisMatch(row=<Gastroenterite Aguda>, score=1.1, matched=("Diarreia",)), ...]
+"""
+import math
+from typing import Mapping, NamedTuple
+
+try:
+    from PredictVet import catalog
+    from PredictVet.matching import fold
+except ImportError:
+    # Imported from tools.py running as a script
+    import catalog
+    from matching import fold
+
+# Terms are compared by their first STEM_LENGTH characters ("diária" ~ "diariamente")
+STEM_LENGTH = 5
+MIN_TERM_LENGTH = 3
+# Words after a negation that are taken as denied
+NEGATION_WINDOW = 3
+# Diagnoses passed to the prompt and to the local report
+TOP_MATCHES = 3
+
+# Columns matched against the answers, with their weight
+FIELD_WEIGHTS = (("Sintoma_Chave", 1.0), ("Diagnostico_Possivel", 0.5))
+
+# Leading words that answer a yes/no question
+AFFIRMATIVES = frozenset({"sim", "s", "yes", "claro", "positivo"})
+DENIALS = frozenset({"nao", "n", "no", "negativo"})
+NEGATIONS = DENIALS | {"sem", "nunca", "nenhum", "nenhuma", "nega", "ausente", "ausencia"}
+# Words that end a negation ("não tem diarreia, mas vomita diariamente")
+CONTRASTS = frozenset({"mas", "porem", "entretanto", "contudo"})
+STOPWORDS = frozenset(fold(
+    "com por para que dos das nos nas uma uns umas ele ela eles elas isso este esta esse essa "
+    "mais muito pouco tem teve esta estao foi ser ter como quando qual quais vezes animal pet"
+).split())
+
+class DiagnosisMatch(NamedTuple):
+    """A diagnostico row with its score and the row words found in the answers."""
+    row: Mapping
+    score: float
+    matched: tuple
+
+def _stem(word: str) -> str | None:
+    if len(word) < MIN_TERM_LENGTH or word in STOPWORDS or word in NEGATIONS or word.isdigit():
+        return None
+    return word[:STEM_LENGTH]
+
+def terms(text) -> list[str]:
+    """Stems of a text, without stopwords, negations and numbers."""
+    return [stem for stem in map(_stem, fold(text).split()) if stem]
+
+def answer_terms(pergunta: str, resposta: str) -> tuple[set, set]:
+    """Returns the (affirmed, denied) stems of one question/answer pair."""
+    affirmed, denied = set(), set()
+    words = fold(resposta).split()
+    if words and (words[0] in AFFIRMATIVES or words[0] in DENIALS):
+        # "Sim"/"Não" answers the question itself ("Não" also negates the words after it)
+        question_terms = set(terms(pergunta))
+        (denied if words[0] in DENIALS else affirmed).update(question_terms)
+    negated_until = -1
+    for position, word in enumerate(words):
+        if word in NEGATIONS:
+            negated_until = position + NEGATION_WINDOW
+            continue
+        if word in CONTRASTS:
+            negated_until = -1
+            continue
+        stem = _stem(word)
+        if stem:
+            (denied if position <= negated_until else affirmed).add(stem)
+    return affirmed, denied
+
+class ScoringModel:
+    """Inverted index over one complaint's diagnostico rows."""
+
+    def __init__(self, rows):
+        self.rows = tuple(rows)
+        postings = {}
+        self._words = [{} for _ in self.rows]
+        for position, row in enumerate(self.rows):
+            for field, weight in FIELD_WEIGHTS:
+                for original in str(row.get(field) or "").split():
+                    for word in fold(original).split():
+                        stem = _stem(word)
+                        if stem:
+                            weights = postings.setdefault(stem, {})
+                            weights[position] = max(weights.get(position, 0.0), weight)
+                            # Shown as written in the sheet, e.g. in the local report
+                            self._words[position].setdefault(stem, original.strip(",.;:()"))
+        # Rarer terms among the complaint's rows discriminate more
+        count = len(self.rows)
+        self._postings = {stem: tuple((position, weight * math.log(1 + count / len(weights)))
+                                      for position, weight in weights.items())
+                          for stem, weights in postings.items()}
+
+    def rank(self, respostas_coletadas: dict, limit: int = TOP_MATCHES) -> list[DiagnosisMatch]:
+        """Rows ordered by score; ties (e.g. no answer matched) keep the sheet order."""
+        affirmed, denied = set(), set()
+        for pergunta, resposta in (respostas_coletadas or {}).items():
+            terms = answer_terms(str(pergunta), str(resposta))
+            affirmed |= terms[0]
+            denied |= terms[1]
+        denied -= affirmed
+
+        scores = [0.0] * len(self.rows)
+        matched = [[] for _ in self.rows]
+        for stem in affirmed:
+            for position, weight in self._postings.get(stem, ()):
+                scores[position] += weight
+                matched[position].append(self._words[position][stem])
+        for stem in denied:
+            for position, weight in self._postings.get(stem, ()):
+                scores[position] -= weight
+        order = sorted(range(len(self.rows)), key=lambda position: -scores[position])
+        return [DiagnosisMatch(self.rows[position], round(scores[position], 3), tuple(sorted(matched[position])))
+                for position in order[:limit]]
+
+def scoring_model(snapshot: catalog.CatalogSnapshot, queixa: str) -> ScoringModel | None:
+    """The complaint's model, built on first use and kept for the catalog version."""
+    if "Queixa" not in snapshot.diagnostico_columns or queixa not in snapshot.index.diagnosticos_por_queixa:
+        return None
+    return catalog.memoize(snapshot, ("scoring_model", queixa),
+                           lambda: ScoringModel(snapshot.index.diagnosticos_por_queixa[queixa]))
+
+def rank_diagnoses(snapshot: catalog.CatalogSnapshot, queixa: str, respostas_coletadas: dict,
+                   limit: int = TOP_MATCHES) -> list[DiagnosisMatch]:
+    """Best-matching diagnostico rows for the answers; empty if the complaint has none."""
+    model = scoring_model(snapshot, queixa)
+    if model is None:
+        return []
+    return model.rank(respostas_coletadas if isinstance(respostas_coletadas, dict) else {}, limit)
@@ -0,0 +1,358 @@
+"""
+Pre-forking HTTP server for PredictVet.
+
+The parent process loads the catalog, builds llm_component and runs a warmup
+pass (menus, name matching and prompt templates) once, then forks the workers,
+which inherit all of it copy-on-write. Workers share the listening socket and
+are replaced after --max-requests requests (plus a random jitter, so workers do
+not all restart together).
+
+APIs (--api, or PREDICTVET_API):
+    adk     (default) the `adk api_server` API, unchanged for existing clients:
+            each worker runs the ADK FastAPI app (google.adk.cli.fast_api) under
+            uvicorn. Sessions go to the ADK session service at
+            --session-service-uri; by default a SQLite file (PREDICTVET_SESSION_DB,
+            or a temporary file when several workers are used).
+    chat    a minimal JSON API for load tests and custom frontends, one request at
+            a time per worker:
+                POST /chat      {"session_id": "...", "message": "..."} -> {"session_id": "...", "reply": "..."}
+                                (session_id is optional; a new one is returned)
+                GET  /healthz   readiness of the worker and its catalog version
+                GET  /metrics   the worker's metrics in the Prometheus text format
+            Sessions are shared through the SQLite session store (same default file),
+            or across instances through Redis (PREDICTVET_SESSION_URL).
+
+The port defaults to $PORT (as set by Cloud Run), else 8000. With
+PREDICTVET_METRICS_PORT set, worker n (0, 1...) serves its own metrics on that
+port + n, started after the fork: a replacement worker takes over the number of
+the one it replaces. Warmup traffic is not recorded.
+
+Usage:
+    python -m PredictVet.serve --workers 4 --max-requests 1000 [--llm-ping]
+    python -m PredictVet.serve --api chat --port 8080
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import tempfile
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from PredictVet import agent, catalog, logging_config, metrics
+from PredictVet.matching import option_index
+from PredictVet.menus import get_menus
+from PredictVet.session_store import SESSION_DB, SESSION_URL, SessionStore, SQLiteSessionStore, get_session_store
+from PredictVet.tools import GerarAnaliseFinal, GerarPerguntaEspecifica
+
+logger = logging.getLogger(__name__)
+
+PORT = int(os.environ.get("PORT", "8000"))
+API = os.environ.get("PREDICTVET_API", "adk").lower()
+# Directory holding the PredictVet agent package, as passed to `adk api_server`
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = int(os.environ.get("PREDICTVET_WORKERS", str(os.cpu_count() or 1)))
+# Requests a worker serves before it is replaced (0 = never)
+MAX_REQUESTS = int(os.environ.get("PREDICTVET_MAX_REQUESTS", "1000"))
+MAX_REQUESTS_JITTER = int(os.environ.get("PREDICTVET_MAX_REQUESTS_JITTER", "100"))
+# Complaints whose prompt templates are compiled during warmup
+WARMUP_COMPLAINTS = 1000
+# Seconds to wait for the first workers to report ready
+READY_TIMEOUT = 60.0
+
+_PATHS = ("/chat", "/healthz", "/metrics")
+_REQUESTS = metrics.counter("predictvet_http_requests_total", "HTTP requests by path and status")
+
+def warmup() -> dict:
+    """
+    Loads the catalog, builds llm_component and exercises the navigation and prompt
+    paths so their per-version structures exist before the workers are forked.
+    Returns a summary; raises RuntimeError if the catalog cannot be loaded.
+    """
+    started = time.perf_counter()
+    snapshot = catalog.ensure_loaded()
+    if snapshot is None:
+        raise RuntimeError("catalog could not be loaded")
+    agent.get_llm_component()
+
+    # Warmup turns are not user traffic: the workers inherit the counters at fork
+    with metrics.disabled(), catalog.pinned_snapshot(snapshot.version):
+        menus = get_menus()
+        complaints = 0
+        if menus is not None:
+            option_index(("categorias",), menus.categorias)
+            for categoria, menu in menus.complaints.items():
+                option_index(("queixas", categoria), menu.queixas)
+        for queixa in snapshot.index.perguntas_por_queixa:
+            if complaints == WARMUP_COMPLAINTS:
+                break
+            GerarPerguntaEspecifica(queixa=queixa)
+            GerarAnaliseFinal(queixa_selecionada=queixa, respostas_coletadas={})
+            complaints += 1
+
+        # One consultation through the real handler, stopping before the LLM call
+        state = {}
+        for message in ("INICIAR", "1", "1"):
+            agent.handle_predictvet_interaction(message, state)
+    return {"catalog_version": snapshot.version, "loader": snapshot.loader,
+            "warmed_complaints": complaints, "seconds": round(time.perf_counter() - started, 3)}
+
+def ping_llm() -> bool:
+    """Sends a tiny prompt so the worker's LLM client connects before the first user does."""
+    try:
+        agent.generate_analysis_text("ping", mode="ping")
+        return True
+    except Exception as e:
+        logger.warning("LLM warmup ping failed: %s", e)
+        return False
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "PredictVet"
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json; charset=utf-8") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        path = self.path.split("?")[0]
+        _REQUESTS.inc(path=path if path in _PATHS else "other", status=status)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/healthz":
+            snapshot = catalog.current_snapshot()
+            self._send_json(200, {"status": "ok", "pid": os.getpid(),
+                                  "catalog_version": snapshot.version if snapshot else None})
+        elif path == "/metrics":
+            self._send(200, metrics.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            message = body["message"]
+            if not isinstance(message, str):
+                raise TypeError("message must be a string")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"invalid request: {e}"})
+            return
+        session_id = str(body.get("session_id") or uuid.uuid4().hex)
+        try:
+            reply = agent.handle_session_message(session_id, message, self.server.session_store)
+        except Exception:
+            logger.exception("Unhandled error for session %s", session_id)
+            self._send_json(500, {"error": "internal error", "session_id": session_id})
+            return
+        self._send_json(200, {"session_id": session_id, "reply": reply})
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+class _WorkerServer(HTTPServer):
+    """HTTPServer accepting on the listening socket inherited from the parent."""
+
+    def __init__(self, listener: socket.socket, session_store: SessionStore):
+        super().__init__(listener.getsockname()[:2], _Handler, bind_and_activate=False)
+        self.socket.close()
+        self.socket = listener
+        self.session_store = session_store
+        self.served = 0
+        self.timeout = 1.0
+
+    def process_request(self, request, client_address):
+        self.served += 1
+        super().process_request(request, client_address)
+
+def _start_worker_metrics(slot: int) -> None:
+    """Serves this worker's metrics on PREDICTVET_METRICS_PORT + slot, if set."""
+    if metrics.METRICS_PORT:
+        metrics.start_http_server(metrics.METRICS_PORT + slot)
+
+def _run_worker(listener: socket.socket, ready_fd: int, session_db: str, max_requests: int, llm_ping: bool,
+                slot: int = 0) -> None:
+    """Worker main loop; never returns."""
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    status = 0
+    try:
+        _start_worker_metrics(slot)
+        # Connections must not be shared across fork, so the store is opened here
+        store = SQLiteSessionStore(session_db) if session_db else get_session_store()
+        if llm_ping:
+            ping_llm()
+        server = _WorkerServer(listener, store)
+        os.write(ready_fd, b"1")
+        while not stopping and (max_requests <= 0 or server.served < max_requests):
+            server.handle_request()
+        logger.info("Worker %d exiting after %d requests", os.getpid(), server.served)
+    except Exception:
+        logger.exception("Worker %d failed", os.getpid())
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def _run_adk_worker(listener: socket.socket, ready_fd: int, session_service_uri: str | None, max_requests: int,
+                    llm_ping: bool, slot: int = 0) -> None:
+    """ADK worker: the `adk api_server` app under uvicorn on the inherited socket; never returns."""
+    # The parent's handlers would signal the other workers; uvicorn installs its own when it starts
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    status = 0
+    try:
+        import uvicorn
+        from google.adk.cli.fast_api import get_fast_api_app
+
+        _start_worker_metrics(slot)
+        if llm_ping:
+            ping_llm()
+        # Built after fork: the app's session service must not share connections with other workers.
+        # Its agent loader imports PredictVet, which the parent already loaded and warmed up.
+        app = get_fast_api_app(agents_dir=AGENTS_DIR, session_service_uri=session_service_uri, web=False,
+                               host=listener.getsockname()[0], port=listener.getsockname()[1])
+        server = uvicorn.Server(uvicorn.Config(app, limit_max_requests=max_requests or None, log_config=None))
+        os.write(ready_fd, b"1")
+        # uvicorn handles SIGTERM/SIGINT itself, finishing the requests in progress
+        server.run(sockets=[listener])
+        logger.info("Worker %d exiting", os.getpid())
+    except Exception:
+        logger.exception("Worker %d failed", os.getpid())
+        status = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+
+def serve(host: str = "0.0.0.0", port: int = PORT, workers: int = WORKERS, max_requests: int = MAX_REQUESTS,
+          max_requests_jitter: int = MAX_REQUESTS_JITTER, llm_ping: bool = False, session_db: str = None,
+          api: str = API, session_service_uri: str = None) -> None:
+    """Warms up, forks the workers and keeps their number constant until SIGTERM/SIGINT."""
+    if api not in ("adk", "chat"):
+        raise ValueError(f"unknown API {api!r} (expected 'adk' or 'chat')")
+    workers = max(workers, 1)
+    # The chat API prefers the store shared by all instances (PREDICTVET_SESSION_URL) to
+    # PREDICTVET_SESSION_DB; the ADK API keeps its sessions in the ADK session service
+    shared_store = bool(SESSION_URL) and api == "chat"
+    session_db = session_db or (None if shared_store else SESSION_DB)
+    temporary_db = not session_db and not shared_store and not session_service_uri and workers > 1
+    if temporary_db:
+        # Each worker would otherwise keep its own in-memory sessions
+        session_db = os.path.join(tempfile.gettempdir(), f"predictvet-sessions-{os.getpid()}.db")
+        logger.warning("PREDICTVET_SESSION_DB not set; sharing sessions between workers through %s", session_db)
+    if api == "adk" and not session_service_uri and session_db:
+        session_service_uri = f"sqlite:///{os.path.abspath(session_db)}"
+
+    listener = socket.create_server((host, port), backlog=128)
+    summary = warmup()
+    logger.info("Warmup done: %s", summary, extra=summary)
+    # Started when the agent module was imported; the parent serves no traffic and worker 0 takes its port
+    metrics.stop_http_server()
+    if api == "adk":
+        # Imported once here, so the workers share the ADK and FastAPI modules copy-on-write
+        import uvicorn  # noqa: F401
+        from google.adk.cli import fast_api  # noqa: F401
+
+    ready_r, ready_w = os.pipe()
+    # Worker pid -> worker number (its metrics port offset)
+    children = {}
+    shutting_down = False
+
+    def spawn(slot: int) -> None:
+        limit = max_requests + random.randint(0, max_requests_jitter) if max_requests > 0 else 0
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            if api == "adk":
+                _run_adk_worker(listener, ready_w, session_service_uri, limit, llm_ping, slot)
+            _run_worker(listener, ready_w, session_db, limit, llm_ping, slot)
+        children[pid] = slot
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for slot in range(workers):
+        spawn(slot)
+
+    ready = 0
+    deadline = time.monotonic() + READY_TIMEOUT
+    while ready < workers and time.monotonic() < deadline and not shutting_down:
+        if select.select([ready_r], [], [], 0.5)[0]:
+            ready += len(os.read(ready_r, workers))
+    if ready < workers:
+        logger.warning("Only %d of %d workers reported ready", ready, workers)
+    logger.info("PredictVet ready on http://%s:%d with %d workers (%s API)", host, port, workers, api)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        if not shutting_down and slot is not None:
+            if os.waitstatus_to_exitcode(status) != 0:
+                logger.warning("Worker %d exited with status %d; replacing it", pid, os.waitstatus_to_exitcode(status))
+                # Avoid a tight fork loop if workers crash on startup
+                time.sleep(1)
+            spawn(slot)
+        # Drain readiness bytes from replacement workers
+        while select.select([ready_r], [], [], 0)[0]:
+            os.read(ready_r, 1024)
+    listener.close()
+    if temporary_db:
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(session_db + suffix)
+            except FileNotFoundError:
+                pass
+    logger.info("PredictVet stopped")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", choices=("adk", "chat"), default=API,
+                        help="adk: the `adk api_server` API (default); chat: POST /chat")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=PORT, help="listening port (default: $PORT or 8000)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS, help="requests before a worker is replaced (0 = never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=MAX_REQUESTS_JITTER)
+    parser.add_argument("--llm-ping", action="store_true", help="send a tiny prompt from each worker before it reports ready")
+    parser.add_argument("--session-db", default=None, help="SQLite session file shared by the workers")
+    parser.add_argument("--session-service-uri", default=None,
+                        help="ADK session service URI (adk API), e.g. postgresql+asyncpg://...; default: --session-db")
+    args = parser.parse_args()
+
+    logging_config.configure_logging()
+    serve(args.host, args.port, args.workers, args.max_requests, args.max_requests_jitter, args.llm_ping, args.session_db,
+          args.api, args.session_service_uri)
+
+if __name__ == "__main__":
+    main()
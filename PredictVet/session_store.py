@@ -0,0 +1,335 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from PredictVet import catalog
+
+try:
+    import redis
+except ImportError:
+    # Optional: only needed for the shared store (PREDICTVET_SESSION_URL)
+    redis = None
+
+# Store configuration: PREDICTVET_SESSION_URL (redis://...) selects the Redis backend, shared
+# by every instance; PREDICTVET_SESSION_DB selects the SQLite backend (a file shared by the
+# worker processes of one instance); otherwise sessions live in process memory
+SESSION_URL = os.environ.get("PREDICTVET_SESSION_URL", "")
+SESSION_DB = os.environ.get("PREDICTVET_SESSION_DB", "")
+SESSION_TTL = float(os.environ.get("PREDICTVET_SESSION_TTL", "3600"))
+MAX_SESSIONS = int(os.environ.get("PREDICTVET_SESSION_MAX", "10000"))
+
+# Dialogue steps, stored by position
+STEPS = ("initial", "choose_category", "choose_complaint", "answer_question", "confirm_analysis")
+_KNOWN_KEYS = {"current_step", "selected_category", "selected_complaint", "collected_answers",
+               "last_question_asked", "catalog_version"}
+
+def _is_index(reference) -> bool:
+    return isinstance(reference, int) and not isinstance(reference, bool)
+
+def _position(options, value):
+    """Index of value in options, or the value itself if it is not there (or is None)."""
+    if value is None:
+        return None
+    try:
+        return options.index(value)
+    except (ValueError, AttributeError):
+        return value
+
+def _resolve(options, reference):
+    """Inverse of _position: ints are looked up in options, anything else is kept as-is."""
+    if _is_index(reference):
+        return options[reference] if 0 <= reference < len(options) else None
+    return reference
+
+def encode_state(state: dict) -> bytes:
+    """
+    Serializes a session into compact JSON. Category, complaint and question texts
+    are stored as indices into the session's catalog version instead of copies of
+    its lists; values not found in that version are kept as text. The texts behind
+    the indices are kept once in "t", so the session can still be restored by an
+    instance that does not have that catalog version loaded.
+    """
+    version = state.get("catalog_version")
+    snapshot = catalog.get_snapshot(version) if version else None
+    index = snapshot.index if snapshot else None
+
+    categoria = state.get("selected_category")
+    queixa = state.get("selected_complaint")
+    ultima_pergunta = state.get("last_question_asked")
+    categorias = index.categorias if index else ()
+    queixas = index.queixas_por_categoria.get(categoria, ()) if index else ()
+    perguntas = index.perguntas_por_queixa.get(queixa, ()) if index else ()
+
+    answers = state.get("collected_answers") or {}
+    compact = {
+        "s": _position(STEPS, state.get("current_step", "initial")),
+        "c": _position(categorias, categoria),
+        "q": _position(queixas, queixa),
+        "p": _position(perguntas, ultima_pergunta),
+        "a": [[_position(perguntas, pergunta), resposta] for pergunta, resposta in answers.items()],
+    }
+    # Same order as the references in decode_state(): category, complaint, last question, answers
+    texts = [categoria, queixa, ultima_pergunta, *answers]
+    references = [compact["c"], compact["q"], compact["p"]] + [pergunta for pergunta, _ in compact["a"]]
+    compact["t"] = [text for text, reference in zip(texts, references) if _is_index(reference)]
+    if version:
+        compact["v"] = version
+    extra = {key: value for key, value in state.items() if key not in _KNOWN_KEYS}
+    if extra:
+        compact["x"] = extra
+    compact = {key: value for key, value in compact.items() if value not in (None, [])}
+    return json.dumps(compact, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def decode_state(data: bytes) -> dict:
+    """
+    Restores a session encoded by encode_state(). If the catalog version it refers to
+    is not loaded here, the indices are replaced by the texts stored alongside them;
+    sessions written without those texts then restart.
+    """
+    compact = json.loads(data)
+    version = compact.get("v")
+    snapshot = catalog.get_snapshot(version) if version else None
+    if version and snapshot is None:
+        current = catalog.ensure_loaded()
+        snapshot = current if current is not None and current.version == version else None
+
+    answers = compact.get("a", [])
+    if snapshot is None:
+        references = [compact.get(key) for key in ("c", "q", "p")] + [pergunta for pergunta, _ in answers]
+        texts = iter(compact.get("t", ()))
+        resolved = [next(texts, None) if _is_index(reference) else reference for reference in references]
+        if any(text is None and _is_index(reference) for text, reference in zip(resolved, references)):
+            return {}
+        compact["c"], compact["q"], compact["p"] = resolved[:3]
+        answers = [[pergunta, resposta] for pergunta, (_, resposta) in zip(resolved[3:], answers)]
+
+    index = snapshot.index if snapshot else None
+    categoria = _resolve(index.categorias if index else (), compact.get("c"))
+    queixa = _resolve(index.queixas_por_categoria.get(categoria, ()) if index else (), compact.get("q"))
+    perguntas = index.perguntas_por_queixa.get(queixa, ()) if index else ()
+
+    state = dict(compact.get("x", {}))
+    state.update({
+        "current_step": _resolve(STEPS, compact.get("s", 0)),
+        "selected_category": categoria,
+        "selected_complaint": queixa,
+        "collected_answers": {_resolve(perguntas, pergunta): resposta for pergunta, resposta in answers},
+        "last_question_asked": _resolve(perguntas, compact.get("p")),
+        "catalog_version": version,
+    })
+    return state
+
+class SessionStore(ABC):
+    """
+    Interface for session persistence. get() returns a fresh dict for unknown or
+    expired sessions; put() saves and refreshes the idle timer.
+    Sessions idle for longer than ttl_seconds expire, and the least recently used
+    are evicted once more than max_sessions are stored.
+    """
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+
+    @abstractmethod
+    def get(self, session_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, state: dict) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def evict(self) -> int:
+        """Removes expired and surplus sessions; returns how many were removed."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+class InMemorySessionStore(SessionStore):
+    """Per-process store keeping encoded sessions in an LRU-ordered dict."""
+
+    def __init__(self, ttl_seconds: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        super().__init__(ttl_seconds, max_sessions)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> dict:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return {}
+            updated_at, data = entry
+            if time.time() - updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                return {}
+        return decode_state(data)
+
+    def put(self, session_id: str, state: dict) -> None:
+        data = encode_state(state)
+        with self._lock:
+            self._sessions[session_id] = (time.time(), data)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict(self) -> int:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [key for key, (updated_at, _) in self._sessions.items() if updated_at < cutoff]
+            for key in expired:
+                del self._sessions[key]
+            surplus = max(len(self._sessions) - self.max_sessions, 0)
+            for _ in range(surplus):
+                self._sessions.popitem(last=False)
+        return len(expired) + surplus
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store backed by a SQLite file, so the worker processes of one instance can serve
+    the same session. Uses WAL mode for concurrent readers, which needs the file on a
+    local filesystem (its shared-memory index does not work over network volumes):
+    it does not share sessions across instances, e.g. several Cloud Run instances;
+    use RedisSessionStore for that.
+    """
+
+    # Run evict() after this many writes
+    EVICT_EVERY = 256
+
+    def __init__(self, path: str, ttl_seconds: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS):
+        super().__init__(ttl_seconds, max_sessions)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state BLOB NOT NULL, updated_at REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections are not shared across threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, session_id: str) -> dict:
+        row = self._connection().execute("SELECT state, updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return {}
+        return decode_state(row[0])
+
+    def put(self, session_id: str, state: dict) -> None:
+        with self._connection() as db:
+            db.execute("INSERT OR REPLACE INTO sessions (id, state, updated_at) VALUES (?, ?, ?)",
+                       (session_id, encode_state(state), time.time()))
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def delete(self, session_id: str) -> None:
+        with self._connection() as db:
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def evict(self) -> int:
+        with self._connection() as db:
+            removed = db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,)).rowcount
+            removed += db.execute(
+                "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)).rowcount
+        return removed
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+class RedisSessionStore(SessionStore):
+    """
+    Store backed by a Redis server (e.g. Memorystore), shared by every instance, so a
+    session can land on any of them. Each session is a key expiring after ttl_seconds;
+    a sorted set of session ids by last write drives the size eviction.
+    """
+
+    # Run evict() after this many writes
+    EVICT_EVERY = 256
+
+    def __init__(self, url: str, ttl_seconds: float = SESSION_TTL, max_sessions: int = MAX_SESSIONS,
+                 prefix: str = "predictvet:session:"):
+        if redis is None:
+            raise RuntimeError("PREDICTVET_SESSION_URL needs the 'redis' package (pip install redis)")
+        super().__init__(ttl_seconds, max_sessions)
+        # redis-py opens new connections in a forked worker, so the client survives the pre-fork
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._index = prefix + "index"
+        self._writes = 0
+
+    def get(self, session_id: str) -> dict:
+        data = self._redis.get(self.prefix + session_id)
+        return decode_state(data) if data is not None else {}
+
+    def put(self, session_id: str, state: dict) -> None:
+        pipeline = self._redis.pipeline()
+        pipeline.set(self.prefix + session_id, encode_state(state), px=int(self.ttl_seconds * 1000))
+        pipeline.zadd(self._index, {session_id: time.time()})
+        pipeline.execute()
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def delete(self, session_id: str) -> None:
+        pipeline = self._redis.pipeline()
+        pipeline.delete(self.prefix + session_id)
+        pipeline.zrem(self._index, session_id)
+        pipeline.execute()
+
+    def evict(self) -> int:
+        # Expired sessions are already gone (key TTL); only their index entries remain
+        removed = self._redis.zremrangebyscore(self._index, "-inf", time.time() - self.ttl_seconds)
+        surplus = self._redis.zcard(self._index) - self.max_sessions
+        if surplus > 0:
+            oldest = [member.decode() for member in self._redis.zrange(self._index, 0, surplus - 1)]
+            pipeline = self._redis.pipeline()
+            pipeline.delete(*[self.prefix + session_id for session_id in oldest])
+            pipeline.zrem(self._index, *oldest)
+            pipeline.execute()
+            removed += len(oldest)
+        return removed
+
+    def __len__(self) -> int:
+        return self._redis.zcount(self._index, time.time() - self.ttl_seconds, "+inf")
+
+def open_session_store(target: str) -> SessionStore:
+    """Opens the store for a redis:// (or rediss://) URL, or the SQLite file at target."""
+    if target.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionStore(target)
+    return SQLiteSessionStore(target)
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """Returns the process-wide store configured from the environment, creating it on first use."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                target = SESSION_URL or SESSION_DB
+                _default_store = open_session_store(target) if target else InMemorySessionStore()
+    return _default_store
@@ -0,0 +1,77 @@
+"""
+Single-flight coalescing: concurrent callers asking for the same key share one
+in-flight call instead of each starting their own.
+
+    flights = SingleFlight("analysis")
+    text = flights.do(cache_key, lambda: generate(prompt))
+
+The first caller for a key (the leader) runs the call; callers arriving while it
+runs (followers) wait for it and get the same result, or the same exception.
+Once the call finishes the key is released, so later callers start a new call
+(results are not kept here; that is the analysis cache's job).
+"""
+import threading
+from concurrent.futures import Future
+from typing import Callable
+
+from PredictVet import metrics
+
+_CALLS = metrics.counter("predictvet_single_flight_calls_total",
+                         "Calls by flight and role (leader ran the call, coalesced shared it)")
+
+class SingleFlight:
+    """Thread-safe; async callers use claim()/finish() and await asyncio.wrap_future(future)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"leaders": 0, "coalesced": 0}
+        metrics.register_collector(self._collect_stats)
+
+    def claim(self, key) -> tuple[Future, bool]:
+        """
+        Returns (future, is_leader). The leader must call finish() with the outcome;
+        followers wait on the future.
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+                self._stats["leaders"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        _CALLS.inc(flight=self.name, role="leader" if leader else "coalesced")
+        return future, leader
+
+    def finish(self, key, future: Future, result=None, error: BaseException = None) -> None:
+        """Releases the key and hands the leader's outcome to the followers."""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func: Callable):
+        """Runs func() once for all concurrent callers with this key and returns its result."""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        """Leaders (calls made), coalesced callers (calls saved) and keys currently in flight."""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
+
+    def _collect_stats(self):
+        yield "predictvet_single_flight_in_flight", "Keys with a call in flight", {"flight": self.name}, self.stats()["in_flight"]
@@ -1,148 +1,171 @@
-import pandas as pd
-from google.adk.tools import FunctionTool
+import io
+import logging
 import os
-import traceback
+from typing import NamedTuple
 
-# DataFrame Placeholders
+try:
+    from PredictVet import catalog, metrics, prompt_budget, retrieval, scoring
+except ImportError:
+    # Executed directly as a script (python PredictVet/tools.py)
+    import catalog
+    import metrics
+    import prompt_budget
+    import retrieval
+    import scoring
+
+logger = logging.getLogger(__name__)
+CatalogIndex = catalog.CatalogIndex
+CatalogSnapshot = catalog.CatalogSnapshot
+build_catalog_index = catalog.build_catalog_index
+
+# DataFrame Placeholders (kept in sync with the current catalog snapshot)
 queixas_df = None
 diagnostico_df = None
+catalog_index = None
+
+def _sync_globals(snapshot: CatalogSnapshot) -> None:
+    """Mirrors a newly installed snapshot into the module-level placeholders."""
+    global queixas_df, diagnostico_df, catalog_index
+    queixas_df = snapshot.queixas_df
+    diagnostico_df = snapshot.diagnostico_df
+    catalog_index = snapshot.index
+
+catalog.subscribe(_sync_globals)
 
 def load_dataframes():
     """
-    Loads the dataframes from the CSV files.
+    Loads the dataframes from the CSV files with pandas, builds the catalog index and
+    installs them as the current catalog snapshot.
+    The tools do not need this: on first use they load the catalog through the
+    configured loader (see PredictVet.catalog.LOADER), which avoids pandas by default.
+    Later changes to the files are picked up in the background.
     """
-    global queixas_df, diagnostico_df
-    print(f"Current Working Directory: {os.getcwd()}")
+    logger.debug("Current Working Directory: %s", os.getcwd())
 
     try:
         # Ensure paths are correct relative to the script's execution context
         # For example, if running from d:\PredictVetAgent, these paths should be correct.
-        queixas_path = "PredictVet/planilha_queixas_tutor.csv"
-        diagnostico_path = "PredictVet/planilha_diagnostico_exames.csv"
-        
-        print(f"Attempting to load queixas_df from absolute path: {os.path.abspath(queixas_path)}")
-        queixas_df = pd.read_csv(queixas_path)
-        print("Successfully loaded queixas_df.")
-        print("queixas_df.head():")
-        print(queixas_df.head())
-        print("queixas_df.info():")
-        queixas_df.info()
-        print("queixas_df['Categoria'].unique():")
-        print(queixas_df['Categoria'].unique())
-
-        print(f"Attempting to load diagnostico_df from absolute path: {os.path.abspath(diagnostico_path)}")
-        diagnostico_df = pd.read_csv(diagnostico_path)
-        print("Successfully loaded diagnostico_df.")
-        print("diagnostico_df.head():")
-        print(diagnostico_df.head())
-        print("diagnostico_df.info():")
-        diagnostico_df.info()
-        # print("Dataframes loaded successfully.")
+        logger.debug("Attempting to load catalog from absolute paths: %s, %s",
+                     os.path.abspath(catalog.QUEIXAS_PATH), os.path.abspath(catalog.DIAGNOSTICO_PATH))
+        snapshot = catalog.load_snapshot(loader="pandas")
+        if logger.isEnabledFor(logging.DEBUG):
+            # DataFrame dumps are only rendered when debug logging is on
+            for name, df in (("queixas_df", snapshot.queixas_df), ("diagnostico_df", snapshot.diagnostico_df)):
+                info = io.StringIO()
+                df.info(buf=info)
+                logger.debug("Successfully loaded %s.\n%s.head():\n%s\n%s.info():\n%s",
+                             name, name, df.head(), name, info.getvalue())
+            logger.debug("queixas_df['Categoria'].unique(): %s", list(snapshot.index.categorias))
+
+        catalog.install_snapshot(snapshot)
+        logger.info("Catalog version %s installed: %d categories, %d complaints.", snapshot.version,
+                    len(snapshot.index.categorias), len(snapshot.index.perguntas_por_queixa),
+                    extra={"catalog_version": snapshot.version, "loader": "pandas"})
     except FileNotFoundError as fnf_error:
-        print(f"Error: File not found. Absolute path checked: {os.path.abspath(queixas_path if 'queixas_path' in locals() else diagnostico_path)}. Details: {fnf_error}")
+        logger.error("File not found. Absolute path checked: %s. Details: %s",
+                     os.path.abspath(fnf_error.filename or ''), fnf_error)
         # DataFrames will remain None, tools should handle this.
-    except pd.errors.EmptyDataError as ede_error:
-        print(f"Error: One or both CSV files are empty. Details: {ede_error}")
+    except catalog.ingest.CatalogFormatError as format_error:
+        # An empty file or one without a header; malformed rows are quarantined, not raised
+        logger.error("One or both CSV files cannot be read as a catalog sheet. Details: %s", format_error)
         # DataFrames will remain None.
-    except pd.errors.ParserError as pe_error:
-        print(f"Error: Failed to parse one or both CSV files. Check for malformed data. Details: {pe_error}")
-        # DataFrames will remain None.
-    except Exception as e:
-        print(f"An unexpected error occurred while loading dataframes: {e}")
-        print(f"Full traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("An unexpected error occurred while loading dataframes")
         # DataFrames will remain None.
 
-# Example of how a tool will use load_dataframes (do not implement the tool itself yet):
-# def ListarCategorias():
-# if queixas_df is None:
-# load_dataframes()
-# # ... rest of the tool logic using queixas_df
+def _catalog() -> CatalogSnapshot | None:
+    """
+    Returns the catalog snapshot the current conversation should read from,
+    loading it on first use. Returns None if the catalog could not be loaded.
+    """
+    snapshot = catalog.active_snapshot()
+    if snapshot is None:
+        catalog.ensure_loaded()
+        snapshot = catalog.active_snapshot()
+    return snapshot
+
+# Tool functions (each call's latency is recorded in predictvet_tool_seconds)
+_TOOL_SECONDS = "predictvet_tool_seconds"
+_TOOL_HELP = "Latency of the catalog tools"
 
-# Tool functions
+@metrics.timed(_TOOL_SECONDS, _TOOL_HELP, tool="ListarCategorias")
 def ListarCategorias() -> list[str]:
     """
     Lists unique categories from the 'queixas_df' DataFrame.
-    Ensures load_dataframes() is called if queixas_df is None.
-    Returns a list of unique strings from the 'Categoria' column.
+    Ensures the catalog is loaded on first use.
+    Returns a list of unique strings from the 'Categoria' column, served from the catalog index.
     Handles potential errors if queixas_df is None or 'Categoria' column is missing.
     """
-    global queixas_df
-    if queixas_df is None:
-        load_dataframes()
-
-    if queixas_df is None:
-        print("ListarCategorias: queixas_df is None or not loaded.")
+    snapshot = _catalog()
+    if snapshot is None:
+        logger.warning("ListarCategorias: queixas_df is None or not loaded.")
         return ["Error: Queixas DataFrame not loaded. Cannot list categories."]
     
-    if 'Categoria' not in queixas_df.columns:
-        print("ListarCategorias: 'Categoria' column missing.")
+    if 'Categoria' not in snapshot.queixas_columns:
+        logger.warning("ListarCategorias: 'Categoria' column missing.")
         return ["Error: 'Categoria' column missing from Queixas DataFrame."]
 
     try:
-        categories = queixas_df['Categoria'].unique().tolist()
-        print(f"ListarCategorias: Returning categories: {categories}")
+        categories = list(snapshot.index.categorias)
+        logger.debug("ListarCategorias: Returning categories: %s", categories)
         return categories
     except Exception as e:
-        print(f"ListarCategorias: Error: {e}")
+        logger.exception("ListarCategorias: Error: %s", e)
         return [f"Error listing categories: {e}"]
 
+@metrics.timed(_TOOL_SECONDS, _TOOL_HELP, tool="ListarQueixasPorCategoria")
 def ListarQueixasPorCategoria(categoria: str) -> list[str]:
     """
     Lists unique complaints for a given category from the 'queixas_df' DataFrame.
-    Ensures load_dataframes() is called if queixas_df is None.
-    Filters queixas_df for rows where 'Categoria' matches the input categoria.
+    Ensures the catalog is loaded on first use.
+    Looks up the complaints indexed under the input categoria.
     Returns a list of unique strings from the 'Queixa' column for that category.
     Handles cases where the category is not found or queixas_df is unavailable.
     """
-    global queixas_df
-    if queixas_df is None:
-        load_dataframes()
-
-    if queixas_df is None:
-        print("ListarQueixasPorCategoria: queixas_df is None or not loaded.")
+    snapshot = _catalog()
+    if snapshot is None:
+        logger.warning("ListarQueixasPorCategoria: queixas_df is None or not loaded.")
         return ["Error: Queixas DataFrame not loaded. Cannot list queixas."]
 
-    if 'Categoria' not in queixas_df.columns or 'Queixa' not in queixas_df.columns:
-        print("ListarQueixasPorCategoria: Required columns missing.")
+    if 'Categoria' not in snapshot.queixas_columns or 'Queixa' not in snapshot.queixas_columns:
+        logger.warning("ListarQueixasPorCategoria: Required columns missing.")
         return ["Error: Required columns ('Categoria' or 'Queixa') missing from Queixas DataFrame."]
 
     try:
-        filtered_queixas = queixas_df[queixas_df['Categoria'] == categoria]
-        if filtered_queixas.empty:
-            print(f"ListarQueixasPorCategoria: No queixas found for category: {categoria}")
+        queixas_categoria = snapshot.index.queixas_por_categoria.get(categoria)
+        if not queixas_categoria:
+            logger.info("ListarQueixasPorCategoria: No queixas found for category: %s", categoria)
             return [f"No queixas found for category: {categoria}"]
-        queixas_list = filtered_queixas['Queixa'].unique().tolist()
-        print(f"ListarQueixasPorCategoria: Returning queixas: {queixas_list} for category: {categoria}")
+        queixas_list = list(queixas_categoria)
+        logger.debug("ListarQueixasPorCategoria: Returning queixas: %s for category: %s", queixas_list, categoria)
         return queixas_list
     except Exception as e:
-        print(f"ListarQueixasPorCategoria: Error for category {categoria}: {e}")
+        logger.exception("ListarQueixasPorCategoria: Error for category %s: %s", categoria, e)
         return [f"Error listing queixas for category {categoria}: {e}"]
 
+@metrics.timed(_TOOL_SECONDS, _TOOL_HELP, tool="GerarPerguntaEspecifica")
 def GerarPerguntaEspecifica(queixa: str) -> str:
     """
     Generates a specific question for a given complaint from the 'queixas_df' DataFrame.
-    Ensures load_dataframes() is called if queixas_df is None.
-    Finds the first row in queixas_df where 'Queixa' matches the input queixa.
+    Ensures the catalog is loaded on first use.
+    Looks up the questions indexed under the input queixa.
     Returns the string from the 'Pergunta_Especifica' column for that row.
     Handles cases where the queixa is not found or queixas_df is unavailable.
     If multiple questions exist for the same queixa, returns the first one.
     """
-    global queixas_df
-    if queixas_df is None:
-        load_dataframes()
-
-    if queixas_df is None:
+    snapshot = _catalog()
+    if snapshot is None:
         return "Error: Queixas DataFrame not loaded. Cannot generate specific question."
 
-    if 'Queixa' not in queixas_df.columns or 'Pergunta_Especifica' not in queixas_df.columns:
+    if 'Queixa' not in snapshot.queixas_columns or 'Pergunta_Especifica' not in snapshot.queixas_columns:
         return "Error: Required columns ('Queixa' or 'Pergunta_Especifica') missing from Queixas DataFrame."
 
     try:
-        pergunta_row = queixas_df[queixas_df['Queixa'] == queixa]
-        if pergunta_row.empty:
+        perguntas = snapshot.index.perguntas_por_queixa.get(queixa)
+        if not perguntas:
             return f"No specific question found for queixa: {queixa}"
-        # Ensure it returns a string, not a Series/DataFrame element if only one.
-        return str(pergunta_row['Pergunta_Especifica'].iloc[0]) 
+        # Ensure it returns a string, not a raw cell value.
+        return str(perguntas[0])
     except Exception as e:
         return f"Error generating specific question for queixa {queixa}: {e}"
 
@@ -159,67 +182,147 @@ def ProcessarRespostaPergunta(queixa: str, pergunta_feita: str, resposta_usuario
         "status": "resposta_registrada_aguardando_analise"
     }
 
+# Bump whenever the prompt built by GerarAnaliseFinal changes, so cached analyses are not reused
+# (the token budget is part of it: a different budget can cut different parts of the prompt)
+PROMPT_TEMPLATE_VERSION = f"5/{prompt_budget.TOKEN_BUDGET}"
+
+PERSONA = "Você é um assistente veterinário especializado em ajudar médicos veterinários no momento do atendimento de cães e gatos. Você deve fornecer informações precisas e úteis sobre sintomas, tratamentos e cuidados gerais. Seja carinhoso, atencioso e profissional em suas respostas."
+INSTRUCAO_LLM = "Com base nas informações fornecidas, gere uma análise detalhada para o médico veterinário apresentar ao tutor, incluindo possíveis diagnósticos, exames recomendados e próximos passos."
+CONTEXTO_INDISPONIVEL = "Informação de diagnóstico específica para esta queixa não disponível."
+
+class PromptTemplate(NamedTuple):
+    """
+    Final-analysis prompt for one complaint. prefix holds everything static (persona,
+    instruction, complaint) and is byte-identical across requests, so provider-side
+    prefix caching can reuse it; the diagnosis context, which depends on the answers,
+    and the answers themselves are appended.
+    """
+    queixa: str
+    prefix: str
+
+    def render(self, respostas_coletadas: dict, contexto_diagnostico: str = CONTEXTO_INDISPONIVEL) -> str:
+        prompt = f"{self.prefix}Contexto do Diagnóstico:\n{contexto_diagnostico}\n\nRespostas Coletadas:\n"
+        if not isinstance(respostas_coletadas, dict):
+            # Handle case where respostas_coletadas might not be a dict as expected
+            return prompt + "Respostas coletadas não estão no formato esperado.\n"
+        return prompt + "".join(f"Pergunta: {pergunta}, Resposta: {resposta}\n"
+                                for pergunta, resposta in respostas_coletadas.items())
+
+def compile_prompt_template(queixa: str) -> PromptTemplate:
+    """Builds the static part of the prompt for a complaint."""
+    prefix = f"{PERSONA}\n\nInstrução:\n{INSTRUCAO_LLM}\n\nQueixa Principal: {queixa}\n\n"
+    return PromptTemplate(queixa, prefix)
+
+def prompt_template_for(snapshot: CatalogSnapshot, queixa: str) -> PromptTemplate:
+    """
+    Returns the complaint's template, compiled on first use and kept for the catalog
+    version. Complaints unknown to the catalog get an uncached template.
+    """
+    if queixa not in snapshot.index.perguntas_por_queixa:
+        return compile_prompt_template(queixa)
+    return catalog.memoize(snapshot, ("prompt_template", queixa), lambda: compile_prompt_template(queixa))
+
+def _format_diagnosis_row(row, queixa: str = None) -> str:
+    header = f"Queixa: {queixa}\n" if queixa else ""
+    return (f"{header}Diagnóstico Possível: {row.get('Diagnostico_Possivel', 'N/A')}\n"
+            f"Sintoma-Chave: {row.get('Sintoma_Chave', 'N/A')}\n"
+            f"Exames Sugeridos: {row.get('Exames_Sugeridos', 'N/A')}\n"
+            f"Procedimentos Adicionais: {row.get('Procedimentos_Adicionais', 'N/A')}")
+
+def format_diagnosis_context(matches: list, related: list = ()) -> str:
+    """
+    Diagnosis context for the prompt: the complaint's best-matching rows, best first,
+    then the related entries retrieved from other complaints.
+    """
+    contexto = "\n\n".join(_format_diagnosis_row(match.row) for match in matches) or CONTEXTO_INDISPONIVEL
+    if related:
+        contexto += "\n\nDiagnósticos Relacionados (outras queixas):\n" + \
+                    "\n\n".join(_format_diagnosis_row(entry.row, entry.queixa) for entry in related)
+    return contexto
+
+@metrics.timed(_TOOL_SECONDS, _TOOL_HELP, tool="GerarAnaliseFinal")
 def GerarAnaliseFinal(queixa_selecionada: str, respostas_coletadas: dict) -> str:
     """
     Generates a final analysis prompt for the LLM based on the selected complaint and collected answers.
-    Ensures load_dataframes() is called if diagnostico_df is None.
-    Looks up queixa_selecionada in diagnostico_df.
-    Constructs and returns a detailed prompt string for the LLM.
+    Ensures the catalog is loaded on first use.
+    Uses the complaint's precompiled PromptTemplate (static prefix), the diagnostico rows
+    that best match the answers (see PredictVet.scoring), the most relevant entries of
+    other complaints (see PredictVet.retrieval) and the collected answers, fitted to
+    the token budget (see PredictVet.prompt_budget).
+    Returns the detailed prompt string for the LLM.
     """
-    global diagnostico_df
-    if diagnostico_df is None:
-        load_dataframes()
+    snapshot = _catalog()
+    if snapshot is None:
+        template, matches, related = compile_prompt_template(queixa_selecionada), [], []
+    else:
+        template = prompt_template_for(snapshot, queixa_selecionada)
+        matches = scoring.rank_diagnoses(snapshot, queixa_selecionada, respostas_coletadas)
+        related = retrieval.related_entries(snapshot, queixa_selecionada, respostas_coletadas)
 
-    persona = "Você é um assistente veterinário especializado em ajudar médicos veterinários no momento do atendimento de cães e gatos. Você deve fornecer informações precisas e úteis sobre sintomas, tratamentos e cuidados gerais. Seja carinhoso, atencioso e profissional em suas respostas."
-    
-    respostas_formatadas = ""
-    if isinstance(respostas_coletadas, dict):
-        for pergunta, resposta in respostas_coletadas.items():
-            respostas_formatadas += f"Pergunta: {pergunta}, Resposta: {resposta}\n"
+    def render(respostas: dict, matches: list, related: list) -> str:
+        if snapshot is None:
+            return template.render(respostas)
+        return template.render(respostas, format_diagnosis_context(matches, related))
+
+    return prompt_budget.fit_prompt(render, respostas_coletadas, matches, related).prompt
+
+RELATORIO_LOCAL_AVISO = ("⚠️ Relatório preliminar gerado localmente a partir do catálogo, sem o modelo de linguagem. "
+                         "Confirme o diagnóstico com o exame clínico.")
+
+@metrics.timed(_TOOL_SECONDS, _TOOL_HELP, tool="GerarRelatorioLocal")
+def GerarRelatorioLocal(queixa_selecionada: str, respostas_coletadas: dict) -> str:
+    """
+    Generates a structured report without calling the LLM (degraded mode).
+    Ensures the catalog is loaded on first use.
+    Lists the diagnostico rows that best match the collected answers, with their
+    suggested exams and procedures, followed by the answers considered.
+    Returns the report as Markdown.
+    """
+    snapshot = _catalog()
+    matches = scoring.rank_diagnoses(snapshot, queixa_selecionada, respostas_coletadas) if snapshot else []
+    lines = []
+    if matches:
+        lines.append("**Diagnósticos possíveis (mais compatíveis com as respostas primeiro):**")
+        for number, match in enumerate(matches, 1):
+            row = match.row
+            lines.append(f"{number}. **{row.get('Diagnostico_Possivel', 'N/A')}** (sintoma-chave: {row.get('Sintoma_Chave', 'N/A')})")
+            if match.matched:
+                lines.append(f"   • Citado nas respostas: {', '.join(match.matched)}")
+            lines.append(f"   • Exames sugeridos: {row.get('Exames_Sugeridos', 'N/A')}")
+            lines.append(f"   • Procedimentos adicionais: {row.get('Procedimentos_Adicionais', 'N/A')}")
     else:
-        # Handle case where respostas_coletadas might not be a dict as expected
-        respostas_formatadas = "Respostas coletadas não estão no formato esperado.\n"
+        lines.append(CONTEXTO_INDISPONIVEL)
+    if isinstance(respostas_coletadas, dict) and respostas_coletadas:
+        lines.append("\n**Respostas consideradas:**")
+        lines.extend(f"• {pergunta} {resposta}" for pergunta, resposta in respostas_coletadas.items())
+    lines.append("\n" + RELATORIO_LOCAL_AVISO)
+    return "\n".join(lines)
 
+# FunctionTool instances are created on first access, so importing this module
+# does not pull in google.adk (see __getattr__ below)
+_TOOL_FUNCTIONS = {
+    "listar_categorias_tool": ListarCategorias,
+    "listar_queixas_por_categoria_tool": ListarQueixasPorCategoria,
+    "gerar_pergunta_especifica_tool": GerarPerguntaEspecifica,
+    "processar_resposta_pergunta_tool": ProcessarRespostaPergunta,
+    "gerar_analise_final_tool": GerarAnaliseFinal,
+    "gerar_relatorio_local_tool": GerarRelatorioLocal,
+}
 
-    contexto_diagnostico_str = "Informação de diagnóstico específica para esta queixa não disponível."
-    diagnostico_possivel = "N/A"
-    exames_sugeridos = "N/A"
-    procedimentos_adicionais = "N/A"
+def _create_tools() -> None:
+    """Wraps each tool function in a FunctionTool and builds all_tools."""
+    from google.adk.tools import FunctionTool
 
-    if diagnostico_df is not None:
-        if 'Queixa' not in diagnostico_df.columns:
-            pass 
-        else:
-            diagnostico_info = diagnostico_df[diagnostico_df['Queixa'] == queixa_selecionada]
-            if not diagnostico_info.empty:
-                diagnostico_row = diagnostico_info.iloc[0]
-                diagnostico_possivel = diagnostico_row.get('Diagnostico_Possivel', "N/A")
-                exames_sugeridos = diagnostico_row.get('Exames_Sugeridos', "N/A")
-                procedimentos_adicionais = diagnostico_row.get('Procedimentos_Adicionais', "N/A")
-                
-                contexto_diagnostico_str = f"Diagnóstico Possível: {diagnostico_possivel}\nExames Sugeridos: {exames_sugeridos}\nProcedimentos Adicionais: {procedimentos_adicionais}"
-    
-    instrucao_llm = "Com base nas informações fornecidas, gere uma análise detalhada para o médico veterinário apresentar ao tutor, incluindo possíveis diagnósticos, exames recomendados e próximos passos."
+    tools = {name: FunctionTool(func=func) for name, func in _TOOL_FUNCTIONS.items()}
+    globals().update(tools)
+    # List of all tools to be imported by the agent
+    globals()["all_tools"] = list(tools.values())
 
-    prompt_final = f"{persona}\n\nQueixa Principal: {queixa_selecionada}\n\nRespostas Coletadas:\n{respostas_formatadas}\nContexto do Diagnóstico:\n{contexto_diagnostico_str}\n\nInstrução:\n{instrucao_llm}"
-    
-    return prompt_final
-
-# Create FunctionTool instances
-listar_categorias_tool = FunctionTool(func=ListarCategorias)
-listar_queixas_por_categoria_tool = FunctionTool(func=ListarQueixasPorCategoria)
-gerar_pergunta_especifica_tool = FunctionTool(func=GerarPerguntaEspecifica)
-processar_resposta_pergunta_tool = FunctionTool(func=ProcessarRespostaPergunta)
-gerar_analise_final_tool = FunctionTool(func=GerarAnaliseFinal)
-
-# List of all tools to be imported by the agent
-all_tools = [
-    listar_categorias_tool,
-    listar_queixas_por_categoria_tool,
-    gerar_pergunta_especifica_tool,
-    processar_resposta_pergunta_tool,
-    gerar_analise_final_tool,
-]
+def __getattr__(name):
+    if name == "all_tools" or name in _TOOL_FUNCTIONS:
+        _create_tools()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == "__main__":
     load_dataframes()
@@ -0,0 +1,162 @@
+"""
+Free-text triage: classifies an opening message ("cachorro vomitando desde ontem")
+into a category and complaint of the catalog, so the dialogue can skip the menus.
+
+Each (Categoria, Queixa) pair of the catalog is one document made of the
+complaint's name, its category and its questions (stemmed as in
+PredictVet.scoring, after accent folding). The inverted index is built once per
+catalog version. Colloquial words are first rewritten to the catalog's own
+vocabulary through SYNONYMS ("tossindo" -> "tosse", "xixi" -> "urinar"), and
+words after a negation ("não está vomitando") are ignored.
+
+A complaint is only chosen when the message names it (its name or a synonym of
+it) and it clearly outscores the runner-up. Otherwise, if the matching complaints
+all belong to one category (or the message names a single category), only the
+category is chosen.
+
+    triage_index(snapshot).classify("Meu gato está tossindo muito à noite")
+    -> Triage(categoria="Respiratório", queixa="Tosse", score=9.592)
+"""
+import math
+import re
+from typing import NamedTuple
+
+try:
+    from PredictVet import catalog, scoring
+    from PredictVet.matching import fold
+except ImportError:
+    # Imported from tools.py running as a script
+    import catalog
+    import scoring
+    from matching import fold
+
+# The chosen complaint must score at least MIN_MARGIN times the runner-up
+MIN_MARGIN = 1.5
+
+# Term weight of each part of a document
+NAME_WEIGHT = 3.0
+CATEGORY_WEIGHT = 1.5
+QUESTION_WEIGHT = 1.0
+
+# Colloquial words (folded) rewritten to words of the catalog before matching
+SYNONYMS = {
+    # Gastrointestinal
+    "enjoo": "vomito", "enjoado": "vomito", "enjoada": "vomito", "nausea": "vomito", "nauseas": "vomito",
+    "ansia": "vomito", "regurgitando": "vomito", "regurgitou": "vomito", "golfando": "vomito",
+    "caganeira": "diarreia", "desarranjo": "diarreia", "disenteria": "diarreia", "fezes moles": "diarreia",
+    "fezes liquidas": "diarreia", "coco mole": "diarreia", "intestino solto": "diarreia",
+    # Respiratório
+    "tossindo": "tosse", "tossiu": "tosse", "tossia": "tosse", "engasgando": "tosse",
+    "espirrou": "espirro", "espirros": "espirro", "ofegando": "dificuldade para respirar",
+    "falta de ar": "dificuldade para respirar", "dispneia": "dificuldade para respirar",
+    "respirando mal": "dificuldade para respirar", "ofegante": "dificuldade para respirar",
+    # Pele e Pelos
+    "cocando": "coceira", "coca": "coceira", "cocar": "coceira", "cocou": "coceira", "prurido": "coceira",
+    "pruriginoso": "coceira", "lambendo": "coceira", "se lambe": "coceira", "alopecia": "queda de pelo",
+    "pelado": "queda de pelo", "pelada": "queda de pelo", "perdendo pelo": "queda de pelo",
+    "perdendo pelos": "queda de pelo", "caindo pelo": "queda de pelo", "falhas no pelo": "queda de pelo",
+    # Urinário
+    "xixi": "urinar", "mijando": "urinar", "mijar": "urinar", "disuria": "dificuldade para urinar",
+    "estranguria": "dificuldade para urinar", "nao consegue urinar": "dificuldade para urinar",
+    # Oftalmológico
+    "remela": "secrecao nos olhos", "ramela": "secrecao nos olhos", "lacrimejando": "secrecao nos olhos",
+    "conjuntivite": "secrecao nos olhos", "olho": "olhos",
+    # Comportamental
+    "agressivo": "agressividade", "agressiva": "agressividade", "bravo": "agressividade",
+    "brava": "agressividade", "mordendo": "agressividade", "mordeu": "agressividade",
+    "morde": "agressividade", "rosnando": "agressividade", "atacando": "agressividade",
+}
+
+# Words that say nothing about the complaint
+IGNORED = frozenset(fold(
+    "cachorro cachorra cao caes cadela gato gata gatos filhote filhotes meu minha dono tutor "
+    "desde ontem hoje dia dias semana semanas mes meses anos vez agora muito muita bastante"
+).split())
+
+_SYNONYM_PATTERN = re.compile(r"\b(?:" + "|".join(sorted(map(re.escape, SYNONYMS), key=len, reverse=True)) + r")\b")
+
+class Triage(NamedTuple):
+    """Classification of a message; queixa is None when only the category is known."""
+    categoria: str
+    queixa: str | None
+    score: float
+
+def normalize(text) -> str:
+    """Folded text with colloquial words rewritten to the catalog vocabulary."""
+    folded = " ".join(word for word in fold(text).split() if word not in IGNORED)
+    return _SYNONYM_PATTERN.sub(lambda match: SYNONYMS[match.group(0)], folded)
+
+def message_terms(text) -> set:
+    """Stems affirmed by a message (words after a negation are left out)."""
+    return scoring.answer_terms("", normalize(text))[0]
+
+class TriageIndex:
+    """Inverted index over the (categoria, queixa) pairs of a catalog index."""
+
+    def __init__(self, index: catalog.CatalogIndex):
+        self.documents = []
+        self._name_terms = []
+        postings = {}
+        for categoria in index.categorias:
+            for queixa in index.queixas_por_categoria.get(categoria, ()):
+                document = len(self.documents)
+                self.documents.append((categoria, queixa))
+                weights = {}
+                name_terms = set(scoring.terms(queixa))
+                category_terms = set(scoring.terms(categoria))
+                parts = [(name_terms, NAME_WEIGHT), (category_terms, CATEGORY_WEIGHT)]
+                parts += [(scoring.terms(pergunta), QUESTION_WEIGHT) for pergunta in index.perguntas_por_queixa.get(queixa, ())]
+                for part_terms, weight in parts:
+                    for term in part_terms:
+                        weights[term] = max(weights.get(term, 0.0), weight)
+                # Naming the category ("respiratório") does not name "Dificuldade para respirar"
+                self._name_terms.append(frozenset(name_terms - category_terms))
+                for term, weight in weights.items():
+                    postings.setdefault(term, []).append((document, weight))
+        self._category_terms = {categoria: frozenset(scoring.terms(categoria))
+                                for categoria in {categoria for categoria, _ in self.documents}}
+        # Terms shared by many complaints ("frequencia", "animal"...) tell them apart less
+        count = len(self.documents)
+        self._postings = {term: tuple((document, weight * math.log(1 + count / len(entries)))
+                                      for document, weight in entries)
+                          for term, entries in postings.items()}
+
+    def classify(self, text: str) -> Triage | None:
+        """The most likely category and complaint of a message, or None if unclear."""
+        query = message_terms(text)
+        scores = {}
+        named = set()
+        for term in query:
+            for document, weight in self._postings.get(term, ()):
+                scores[document] = scores.get(document, 0.0) + weight
+                if term in self._name_terms[document]:
+                    named.add(document)
+        if not scores:
+            return None
+
+        ranked = sorted(scores, key=lambda document: (-scores[document], document))
+        best = ranked[0]
+        runner_up = scores[ranked[1]] if len(ranked) > 1 else 0.0
+        if best in named and scores[best] >= MIN_MARGIN * runner_up:
+            categoria, queixa = self.documents[best]
+            return Triage(categoria, queixa, round(scores[best], 3))
+
+        # No clear complaint: settle for the category, if only one is in question
+        categorias = {self.documents[document][0] for document in named}
+        categorias |= {categoria for categoria, terms in self._category_terms.items() if terms & query}
+        if len(categorias) == 1:
+            categoria = categorias.pop()
+            return Triage(categoria, None, round(max(scores[document] for document in scores
+                                                     if self.documents[document][0] == categoria), 3))
+        return None
+
+def triage_index(snapshot: catalog.CatalogSnapshot) -> TriageIndex:
+    """The snapshot's triage index, built on first use and kept for the catalog version."""
+    return catalog.memoize(snapshot, ("triage_index",), lambda: TriageIndex(snapshot.index))
+
+def classify(text: str) -> Triage | None:
+    """Classifies a message against the active catalog version (None without a catalog)."""
+    snapshot = catalog.active_snapshot()
+    if snapshot is None:
+        return None
+    return triage_index(snapshot).classify(text)
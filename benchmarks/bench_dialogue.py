@@ -0,0 +1,279 @@
+"""
+Microbenchmarks for the dialogue state machine and the catalog tools.
+
+For each catalog scale a synthetic catalog with that many complaint rows is
+written to a temporary directory and measured in a fresh interpreter:
+  - load:  catalog load time, traced peak allocation and process max RSS
+  - steps: latency percentiles of handle_predictvet_interaction per dialogue step
+           (initial, choose_category, choose_complaint, answer_question,
+           confirm_analysis), with llm_component mocked and the analysis cache off,
+           plus traced allocation peak per call
+  - tools: latency percentiles of ListarCategorias, ListarQueixasPorCategoria,
+           GerarPerguntaEspecifica and GerarAnaliseFinal
+
+Timings and allocations are taken in separate passes, so tracemalloc overhead
+does not leak into the latencies.
+
+Usage (from the repository root):
+    python benchmarks/bench_dialogue.py [--scales 10 1000 100000 1000000] [--iterations 200] [--loader binary]
+                                        [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SCALES = [10, 1_000, 100_000, 1_000_000]
+STEPS = ("initial", "choose_category", "choose_complaint", "answer_question", "confirm_analysis")
+TOOLS = ("ListarCategorias", "ListarQueixasPorCategoria", "GerarPerguntaEspecifica", "GerarAnaliseFinal")
+# Comparison threshold for --compare: p50 slower than this ratio is flagged
+REGRESSION_RATIO = 1.2
+
+def write_catalog(directory: str, rows: int, categories: int = 10) -> tuple:
+    """
+    Writes a synthetic catalog with `rows` complaint rows (one question per complaint,
+    two questions every tenth complaint) and one diagnosis row per complaint.
+    Returns the (queixas, diagnostico) CSV paths.
+    """
+    queixas_path = os.path.join(directory, "queixas.csv")
+    diagnostico_path = os.path.join(directory, "diagnostico.csv")
+    categories = max(1, min(categories, rows))
+    with open(queixas_path, "w", newline="", encoding="utf-8") as q, \
+         open(diagnostico_path, "w", newline="", encoding="utf-8") as d:
+        queixas, diagnostico = csv.writer(q), csv.writer(d)
+        queixas.writerow(["Categoria", "Queixa", "Pergunta_Especifica"])
+        diagnostico.writerow(["Queixa", "Sintoma_Chave", "Diagnostico_Possivel", "Exames_Sugeridos", "Procedimentos_Adicionais"])
+        complaint = 0
+        written = 0
+        while written < rows:
+            queixa = f"Queixa {complaint:07d}"
+            categoria = f"Categoria {complaint % categories:03d}"
+            for question in range(2 if complaint % 10 == 0 else 1):
+                if written == rows:
+                    break
+                queixas.writerow([categoria, queixa, f"Pergunta {question} sobre {queixa.lower()}?"])
+                written += 1
+            diagnostico.writerow([queixa, f"Sintoma {complaint}", f"Diagnóstico {complaint}",
+                                  "Hemograma", "Exame físico"])
+            complaint += 1
+    return queixas_path, diagnostico_path
+
+def percentiles(samples_ns: list) -> dict:
+    """Summary of latency samples in microseconds."""
+    ordered = sorted(samples_ns)
+    if not ordered:
+        return {}
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] / 1000, 2)
+
+    return {"n": len(ordered), "mean_us": round(sum(ordered) / len(ordered) / 1000, 2),
+            "p50_us": at(0.50), "p90_us": at(0.90), "p99_us": at(0.99), "max_us": round(ordered[-1] / 1000, 2)}
+
+def max_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+class _MockResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class _MockLlm:
+    """Stands in for llm_component, so only PredictVet's own work is measured."""
+
+    def generate_content(self, prompt: str) -> _MockResponse:
+        return _MockResponse(f"Análise simulada ({len(prompt)} caracteres de prompt).")
+
+def run_scale(iterations: int, seed: int) -> dict:
+    """Runs in the child interpreter, with the catalog paths already in the environment."""
+    rng = random.Random(seed)
+    sink = io.StringIO()
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        import PredictVet.agent as agent
+        from PredictVet import catalog, tools
+        snapshot = catalog.ensure_loaded()
+    load = {"seconds": round(time.perf_counter() - started, 4), "max_rss_bytes": max_rss_bytes()}
+    if snapshot is None:
+        raise SystemExit("catalog failed to load")
+    # Allocation profile of a second, traced load (not installed)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(sink):
+        catalog.load_snapshot()
+    load["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    agent.llm_component = _MockLlm()
+
+    index = snapshot.index
+    categories = list(index.categorias)
+    complaints = {categoria: list(index.queixas_por_categoria[categoria]) for categoria in categories}
+
+    def conversation() -> list:
+        """Messages of one full consultation, one per step."""
+        category = rng.randrange(len(categories))
+        complaint = rng.randrange(len(complaints[categories[category]]))
+        return ["INICIAR", str(category + 1), str(complaint + 1), f"Sim, há {rng.randint(1, 9)} dias", "sim"]
+
+    def tool_calls() -> list:
+        categoria = rng.choice(categories)
+        queixa = rng.choice(complaints[categoria])
+        return [("ListarCategorias", tools.ListarCategorias, {}),
+                ("ListarQueixasPorCategoria", tools.ListarQueixasPorCategoria, {"categoria": categoria}),
+                ("GerarPerguntaEspecifica", tools.GerarPerguntaEspecifica, {"queixa": queixa}),
+                ("GerarAnaliseFinal", tools.GerarAnaliseFinal,
+                 {"queixa_selecionada": queixa, "respostas_coletadas": {"Pergunta?": "Sim"}})]
+
+    def measure(traced: bool) -> tuple:
+        steps = {step: [] for step in STEPS}
+        tool_samples = {tool: [] for tool in TOOLS}
+
+        def timed(call):
+            if traced:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                call()
+                return tracemalloc.get_traced_memory()[1] - before
+            start = time.perf_counter_ns()
+            call()
+            return time.perf_counter_ns() - start
+
+        with contextlib.redirect_stdout(sink):
+            for _ in range(iterations):
+                state = {}
+                for step, message in zip(STEPS, conversation()):
+                    steps[step].append(timed(lambda: agent.handle_predictvet_interaction(message, state)))
+                for name, tool, kwargs in tool_calls():
+                    tool_samples[name].append(timed(lambda: tool(**kwargs)))
+                sink.seek(0)
+                sink.truncate()
+        return steps, tool_samples
+
+    # Warm-up pass, so lazily built per-version structures are not billed to the first samples
+    with contextlib.redirect_stdout(sink):
+        state = {}
+        for message in conversation():
+            agent.handle_predictvet_interaction(message, state)
+    steps, tool_samples = measure(traced=False)
+    tracemalloc.start()
+    step_allocations, tool_allocations = measure(traced=True)
+    tracemalloc.stop()
+
+    def summary(samples: dict, allocations: dict) -> dict:
+        return {name: dict(percentiles(samples[name]),
+                           alloc_peak_bytes_p50=sorted(allocations[name])[len(allocations[name]) // 2])
+                for name in samples}
+
+    return {"catalog": {"categories": len(categories), "complaints": len(index.perguntas_por_queixa),
+                        "version": snapshot.version},
+            "load": load,
+            "steps": summary(steps, step_allocations),
+            "tools": summary(tool_samples, tool_allocations),
+            "max_rss_bytes": max_rss_bytes()}
+
+def measure_scale(rows: int, iterations: int, seed: int, loader: str = "stdlib") -> dict:
+    """
+    Writes the synthetic catalog (compiled too, for the binary loader) and runs
+    one scale in a fresh interpreter.
+    """
+    with tempfile.TemporaryDirectory(prefix="predictvet-bench-") as directory:
+        queixas_path, diagnostico_path = write_catalog(directory, rows)
+        binary_path = os.path.join(directory, "catalog.pvc")
+        if loader == "binary":
+            subprocess.run([sys.executable, "-m", "PredictVet.catalog_binary", "--queixas", queixas_path,
+                            "--diagnostico", diagnostico_path, "--output", binary_path],
+                           cwd=REPO_ROOT, capture_output=True, check=True)
+        env = dict(os.environ, PREDICTVET_QUEIXAS_CSV=queixas_path, PREDICTVET_DIAGNOSTICO_CSV=diagnostico_path,
+                   PREDICTVET_CATALOG_BINARY=binary_path, PREDICTVET_CATALOG_LOADER=loader,
+                   PREDICTVET_ANALYSIS_CACHE_SIZE="0", PREDICTVET_ANALYSIS_CACHE_PATH="",
+                   PREDICTVET_SPECULATIVE_ANALYSIS="0", PYTHONPATH=REPO_ROOT)
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child",
+                                 "--iterations", str(iterations), "--seed", str(seed)],
+                                cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"scale {rows} failed:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report: dict, baseline: dict) -> list:
+    """Lines describing p50 changes against a previous report, flagging regressions."""
+    lines = []
+    for scale, result in report["scales"].items():
+        previous = baseline.get("scales", {}).get(scale)
+        if previous is None:
+            continue
+        for section in ("steps", "tools"):
+            for name, stats in result[section].items():
+                before = previous.get(section, {}).get(name, {}).get("p50_us")
+                if not before:
+                    continue
+                ratio = stats["p50_us"] / before
+                flag = "  REGRESSION" if ratio > REGRESSION_RATIO else ""
+                lines.append(f"{scale:>8} {name:<26} {before:>10.1f}us -> {stats['p50_us']:>10.1f}us  x{ratio:.2f}{flag}")
+    return lines
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", type=int, default=DEFAULT_SCALES, help="complaint rows per synthetic catalog")
+    parser.add_argument("--iterations", type=int, default=200, help="consultations (and tool call rounds) per scale")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--loader", choices=("stdlib", "pandas", "binary"), default="stdlib",
+                        help="catalog loader (binary compiles each synthetic catalog first)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to compare p50 latencies against")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scale(args.iterations, args.seed)))
+        return
+
+    report = {"meta": {"commit": git_commit(), "python": platform.python_version(),
+                       "platform": platform.platform(), "iterations": args.iterations,
+                       "loader": args.loader,
+                       "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")},
+              "scales": {}}
+    for rows in args.scales:
+        report["scales"][str(rows)] = measure_scale(rows, args.iterations, args.seed, args.loader)
+        print(f"scale {rows}: done", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+    if not args.output:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'rows':>8} {'name':<26} {'p50':>10} {'p99':>10} {'alloc p50':>11}")
+    for rows, result in report["scales"].items():
+        for section in ("steps", "tools"):
+            for name, stats in result[section].items():
+                print(f"{rows:>8} {name:<26} {stats['p50_us']:>8.1f}us {stats['p99_us']:>8.1f}us "
+                      f"{stats['alloc_peak_bytes_p50']:>10}B")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Cold-start benchmark for PredictVet.
+
+Each sample runs in a fresh interpreter and measures:
+  - import_s:      time to `import PredictVet.agent`
+  - first_turn_s:  time for the first handle_predictvet_interaction("INICIAR") call
+  - total_s:       import + warm-up work + first turn
+
+Scenarios:
+  - eager:  what importing the agent used to do (pandas load_dataframes() with dumps
+            and LlmAgent construction before serving anything)
+  - pandas: lazy startup, catalog loaded on first use with the pandas loader
+  - stdlib: lazy startup, catalog loaded on first use with the stdlib loader (default)
+
+Usage (from the repository root):
+    python benchmarks/bench_startup.py --runs 5 [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import contextlib, io, json, sys, time
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import PredictVet.agent as agent
+    t1 = time.perf_counter()
+    if EAGER:
+        from PredictVet.tools import load_dataframes
+        load_dataframes()
+        agent.root_agent
+    t2 = time.perf_counter()
+    agent.handle_predictvet_interaction("INICIAR", {})
+    t3 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "first_turn_s": t3 - t2,
+    "total_s": t3 - t0,
+    "pandas_imported": "pandas" in sys.modules,
+    "adk_imported": "google.adk.agents.llm_agent" in sys.modules,
+}))
+"""
+
+SCENARIOS = {
+    "eager": {"eager": True, "loader": "pandas"},
+    "pandas": {"eager": False, "loader": "pandas"},
+    "stdlib": {"eager": False, "loader": "stdlib"},
+}
+
+def run_sample(scenario: str) -> dict:
+    """Runs one cold start of the given scenario in a fresh interpreter."""
+    config = SCENARIOS[scenario]
+    env = dict(os.environ, PREDICTVET_CATALOG_LOADER=config["loader"])
+    code = _CHILD.replace("EAGER", str(config["eager"]))
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per scenario")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    report = {}
+    for scenario in args.scenarios:
+        samples = [run_sample(scenario) for _ in range(args.runs)]
+        report[scenario] = {
+            metric: statistics.median(sample[metric] for sample in samples)
+            for metric in ("import_s", "first_turn_s", "total_s")
+        }
+        report[scenario]["pandas_imported"] = samples[-1]["pandas_imported"]
+        report[scenario]["adk_imported"] = samples[-1]["adk_imported"]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'scenario':<8} {'import':>9} {'1st turn':>9} {'total':>9}  pandas  adk   (median of {args.runs})")
+    for scenario, row in report.items():
+        print(f"{scenario:<8} {row['import_s'] * 1000:>7.1f}ms {row['first_turn_s'] * 1000:>7.1f}ms "
+              f"{row['total_s'] * 1000:>7.1f}ms  {str(row['pandas_imported']):<6}  {row['adk_imported']}")
+
+if __name__ == "__main__":
+    main()
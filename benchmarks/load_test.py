@@ -0,0 +1,521 @@
+"""
+End-to-end HTTP load and soak test for the PredictVet server.
+
+Virtual users replay scripted multi-turn consultations over HTTP, each in a new
+session, for as long as their stage lasts. The LLM is a local fake
+(PredictVet.fake_llm) with configurable latency and error distributions, so the
+numbers describe PredictVet and its LLM client, not the provider.
+
+Targets:
+  --spawn         starts the fake LLM and `python -m PredictVet.serve` (with the API of
+                  --protocol) pointed at it
+                  (both as subprocesses, so they do not share the load generator's GIL),
+                  and samples the server processes' memory
+  --url URL       a server that is already running; point it at a fake LLM yourself
+                  (PREDICTVET_LLM_URL) and pass --server-pid to sample its memory
+Protocols:
+  predictvet      POST /chat of PredictVet.serve --api chat (default)
+  adk             the ADK api_server: POST /apps/<app>/users/<user>/sessions/<id>, then POST /run
+
+Transcripts are built in (the scenarios of test_agent_interaction.py plus free-text
+triage), or read from --transcripts: a JSON list of message lists, or JSONL with
+one message list or {"name": ..., "messages": [...]} per line (a name prefixes the
+transcript's step labels, e.g. to compare urgent and routine complaints). "{n}" in a message becomes a
+random number, so not every analysis is served from the analysis cache.
+
+Modes:
+  ramp (default)  one stage per --concurrency level, --stage-seconds each: throughput,
+                  per-step latency percentiles, error rates and server memory per stage
+  soak            --soak SECONDS at the highest --concurrency level, with memory,
+                  throughput and latency sampled every --sample-interval seconds and
+                  the memory growth rate (MB/hour, after the first 10% of the run)
+
+Usage (from the repository root):
+    python benchmarks/load_test.py --spawn --workers 4 --concurrency 1 4 16 64 --stage-seconds 30 \\
+        --llm-latency 1.5 --llm-distribution lognormal --llm-error-rate 0.02
+    python benchmarks/load_test.py --spawn --soak 3600 --concurrency 16 --output soak.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --protocol adk --app-name PredictVet
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, ((step, message), ...)); the step labels the latency samples. A ❌ reply counts as
+# an error, except for steps named invalid_* (where the agent is expected to reject the message).
+TRANSCRIPTS = (
+    ("happy_path", (("initial", "INICIAR"), ("choose_category", "Gastrointestinal"), ("choose_complaint", "Vômito"),
+                    ("answer_question", "Ontem à noite, após comer grama, {n} vezes."), ("confirm_analysis", "sim"))),
+    ("numbered_menus", (("initial", "INICIAR"), ("choose_category", "2"), ("choose_complaint", "1"),
+                        ("answer_question", "Seca, piora à noite, há {n} dias."), ("confirm_analysis", "sim"))),
+    ("invalid_selections", (("initial", "INICIAR"), ("invalid_category", "Categoria Super Inválida 9000"),
+                            ("choose_category", "Pele e Pelos"),
+                            ("invalid_complaint", "Queixa Muito Específica Que Não Existe"),
+                            ("choose_complaint", "Coceira"), ("answer_question", "Nas patas e orelhas, há {n} dias."),
+                            ("confirm_analysis", "não"), ("answer_question", "Também tem feridas com crostas."),
+                            ("confirm_analysis", "sim"))),
+    ("fuzzy_selection", (("initial", "INICIAR"), ("choose_category", "respiratorio"), ("choose_complaint", "espiro"),
+                         ("answer_question", "Sim, secreção amarela há {n} dias."), ("confirm_analysis", "sim"))),
+    ("free_text_triage", (("triage", "Cachorro vomitando desde ontem, {n} episódios"),
+                          ("answer_question", "Sim, com diarreia."), ("confirm_analysis", "sim"))),
+)
+
+class RequestFailed(Exception):
+    """A request that did not produce a reply; outcome labels it in the report."""
+
+    def __init__(self, outcome: str):
+        super().__init__(outcome)
+        self.outcome = outcome
+
+class _HTTPClient:
+    """One virtual user's connection; reconnects once when a reused connection turns out stale."""
+
+    def __init__(self, base_url: str, timeout: float):
+        parts = urlsplit(base_url)
+        self._host, self._port = parts.hostname, parts.port or 80
+        self._prefix = parts.path.rstrip("/")
+        self._timeout = timeout
+        self._connection = None
+
+    def _post(self, path: str, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        for attempt in (1, 2):
+            reused = self._connection is not None
+            if not reused:
+                self._connection = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+            try:
+                self._connection.request("POST", self._prefix + path, body, {"Content-Type": "application/json"})
+                response = self._connection.getresponse()
+                data = response.read()
+            except socket.timeout:
+                self.close()
+                raise RequestFailed("timeout") from None
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if reused and attempt == 1:
+                    continue
+                raise RequestFailed("transport") from None
+            if response.will_close:
+                self.close()
+            if response.status != 200:
+                raise RequestFailed(f"http_{response.status}")
+            try:
+                return json.loads(data)
+            except ValueError:
+                raise RequestFailed("invalid_response") from None
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+class PredictVetClient(_HTTPClient):
+    """POST /chat of PredictVet.serve."""
+
+    def new_session(self) -> str:
+        return uuid.uuid4().hex
+
+    def send(self, session_id: str, message: str) -> str:
+        return str(self._post("/chat", {"session_id": session_id, "message": message}).get("reply", ""))
+
+class ADKClient(_HTTPClient):
+    """The ADK api_server's session and /run endpoints."""
+
+    def __init__(self, base_url: str, timeout: float, app_name: str, user_id: str):
+        super().__init__(base_url, timeout)
+        self._app_name, self._user_id = app_name, user_id
+
+    def new_session(self) -> str:
+        session_id = uuid.uuid4().hex
+        self._post(f"/apps/{self._app_name}/users/{self._user_id}/sessions/{session_id}", {})
+        return session_id
+
+    def send(self, session_id: str, message: str) -> str:
+        events = self._post("/run", {"app_name": self._app_name, "user_id": self._user_id, "session_id": session_id,
+                                     "new_message": {"role": "user", "parts": [{"text": message}]}})
+        texts = [part.get("text", "") for event in events or () for part in (event.get("content") or {}).get("parts", ())]
+        return "".join(text for text in texts if text)
+
+def load_transcripts(path: str) -> tuple:
+    """Reads --transcripts; steps are labelled turn1, turn2... (or <name>/turn1...)"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        scripts = json.loads(text)
+    except ValueError:
+        scripts = [json.loads(line) for line in text.splitlines() if line.strip()]
+    transcripts = []
+    for position, script in enumerate(scripts, 1):
+        messages = script.get("messages", ()) if isinstance(script, dict) else script
+        name = script.get("name") if isinstance(script, dict) else None
+        prefix = f"{name}/" if name else ""
+        if messages:
+            transcripts.append((name or f"transcript{position}",
+                                tuple((f"{prefix}turn{turn}", str(message)) for turn, message in enumerate(messages, 1))))
+    if not transcripts:
+        raise SystemExit(f"No transcripts in {path}")
+    return tuple(transcripts)
+
+def percentiles_ms(samples: list) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"n": 0}
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000, 1)
+
+    return {"n": len(ordered), "p50_ms": at(0.50), "p90_ms": at(0.90), "p99_ms": at(0.99),
+            "max_ms": round(ordered[-1] * 1000, 1)}
+
+class Recorder:
+    """Thread-safe sample sink; take() hands over and resets what was recorded since the last call."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._latencies = {}
+        self._outcomes = {}
+        self._step_errors = {}
+        self._consultations = 0
+
+    def request(self, step: str, seconds: float, outcome: str) -> None:
+        with self._lock:
+            self._latencies.setdefault(step, []).append(seconds)
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            if outcome != "ok":
+                self._step_errors[step] = self._step_errors.get(step, 0) + 1
+
+    def consultation(self) -> None:
+        with self._lock:
+            self._consultations += 1
+
+    def take(self) -> tuple:
+        with self._lock:
+            taken = self._latencies, self._outcomes, self._step_errors, self._consultations
+            self._reset()
+        return taken
+
+def summarize(latencies: dict, outcomes: dict, step_errors: dict, consultations: int, seconds: float) -> dict:
+    requests = sum(outcomes.values())
+    errors = {outcome: count for outcome, count in outcomes.items() if outcome != "ok"}
+    return {"seconds": round(seconds, 1), "requests": requests,
+            "throughput_rps": round(requests / seconds, 2) if seconds else 0.0,
+            "consultations": consultations,
+            "consultations_per_s": round(consultations / seconds, 2) if seconds else 0.0,
+            "error_rate": round(sum(errors.values()) / requests, 4) if requests else 0.0, "errors": errors,
+            "all": percentiles_ms([sample for samples in latencies.values() for sample in samples]),
+            "steps": {step: dict(percentiles_ms(samples), errors=step_errors.get(step, 0))
+                      for step, samples in sorted(latencies.items())}}
+
+def virtual_user(make_client, transcripts: tuple, recorder: Recorder, stop: threading.Event, seed: int,
+                 think_time: float) -> None:
+    rng = random.Random(seed)
+    client = make_client()
+    try:
+        while not stop.is_set():
+            _, turns = rng.choice(transcripts)
+            try:
+                session_id = client.new_session()
+            except RequestFailed as e:
+                recorder.request("new_session", 0.0, e.outcome)
+                stop.wait(1.0)
+                continue
+            completed = True
+            for step, message in turns:
+                if stop.is_set():
+                    completed = False
+                    break
+                started = time.perf_counter()
+                try:
+                    reply = client.send(session_id, message.replace("{n}", str(rng.randint(1, 30))))
+                    # The agent answers flow errors (e.g. a failed analysis) with a ❌ reply and HTTP 200
+                    failed = reply.lstrip().startswith("❌") and not step.startswith("invalid_")
+                    outcome = "error_reply" if failed else "ok"
+                except RequestFailed as e:
+                    outcome = e.outcome
+                recorder.request(step, time.perf_counter() - started, outcome)
+                if outcome not in ("ok", "error_reply"):
+                    completed = False
+                    break
+                if think_time:
+                    stop.wait(rng.expovariate(1 / think_time))
+            if completed:
+                recorder.consultation()
+    finally:
+        client.close()
+
+# --- Server processes ---
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float, name: str) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{name} exited with status {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"{name} did not start listening on port {port} within {timeout:.0f}s")
+
+def _proc_children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def _proc_memory_kb(pid: int) -> tuple:
+    """(rss, pss) of one process in kB; pss splits the copy-on-write pages shared by the workers."""
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+def server_memory(pid: int | None) -> dict | None:
+    """RSS and PSS in MB of the server process and its workers (Linux only)."""
+    if pid is None or not os.path.exists(f"/proc/{pid}"):
+        return None
+    pids = [pid] + _proc_children(pid)
+    totals = [_proc_memory_kb(process) for process in pids]
+    return {"processes": len(pids), "rss_mb": round(sum(rss for rss, _ in totals) / 1024, 1),
+            "pss_mb": round(sum(pss for _, pss in totals) / 1024, 1) if any(pss for _, pss in totals) else None}
+
+def spawn_servers(args, log) -> tuple:
+    """Starts the fake LLM and the PredictVet server; returns (base_url, server, fake_llm)."""
+    llm_port, server_port = free_port(), free_port()
+    fake_llm = subprocess.Popen(
+        [sys.executable, "-m", "PredictVet.fake_llm", "--host", "127.0.0.1", "--port", str(llm_port),
+         "--latency", str(args.llm_latency), "--latency-distribution", args.llm_distribution,
+         "--jitter", str(args.llm_jitter), "--error-rate", str(args.llm_error_rate),
+         "--error-statuses", args.llm_error_statuses, "--slow-rate", str(args.llm_slow_rate),
+         "--slow-latency", str(args.llm_slow_latency), "--drop-rate", str(args.llm_drop_rate)],
+        cwd=REPO_ROOT, stdout=log, stderr=log)
+    wait_for_port(llm_port, fake_llm, 30, "fake LLM")
+    env = dict(os.environ, PREDICTVET_LLM_URL=f"http://127.0.0.1:{llm_port}", PYTHONPATH=REPO_ROOT)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "PredictVet.serve", "--api", "adk" if args.protocol == "adk" else "chat",
+         "--host", "127.0.0.1", "--port", str(server_port),
+         "--workers", str(args.workers), "--max-requests", str(args.max_requests),
+         "--session-db", os.path.join(tempfile.mkdtemp(prefix="predictvet-load-"), "sessions.db")],
+        cwd=REPO_ROOT, env=env, stdout=log, stderr=log)
+    try:
+        wait_for_port(server_port, server, 120, "PredictVet server")
+    except SystemExit:
+        fake_llm.terminate()
+        raise
+    return f"http://127.0.0.1:{server_port}", server, fake_llm
+
+def stop_process(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+# --- Runs ---
+
+def run_ramp(args, make_client, transcripts, server_pid) -> list:
+    recorder, stop, users, stages = Recorder(), threading.Event(), [], []
+    try:
+        for concurrency in args.concurrency:
+            while len(users) < concurrency:
+                user = threading.Thread(target=virtual_user, daemon=True,
+                                        args=(make_client, transcripts, recorder, stop, args.seed + len(users),
+                                              args.think_time))
+                user.start()
+                users.append(user)
+            memory_before = server_memory(server_pid)
+            recorder.take()
+            started = time.monotonic()
+            time.sleep(args.stage_seconds)
+            stage = summarize(*recorder.take(), time.monotonic() - started)
+            stage.update(concurrency=concurrency, memory_before=memory_before, memory_after=server_memory(server_pid))
+            stages.append(stage)
+            print(f"concurrency {concurrency:>4}: {stage['throughput_rps']:>8.1f} req/s  "
+                  f"p50 {stage['all'].get('p50_ms', 0):>8.1f}ms  p99 {stage['all'].get('p99_ms', 0):>8.1f}ms  "
+                  f"errors {stage['error_rate']:.2%}", file=sys.stderr)
+    finally:
+        stop.set()
+        for user in users:
+            user.join(args.timeout + 5)
+    return stages
+
+def memory_growth_mb_per_hour(samples: list) -> float | None:
+    """Least-squares slope of the server memory over the run, skipping the first 10% (warmup)."""
+    points = [(sample["t"], (sample["memory"] or {}).get("pss_mb") or (sample["memory"] or {}).get("rss_mb"))
+              for sample in samples[len(samples) // 10:]]
+    points = [(t, mb) for t, mb in points if mb is not None]
+    if len(points) < 3:
+        return None
+    mean_t = sum(t for t, _ in points) / len(points)
+    mean_mb = sum(mb for _, mb in points) / len(points)
+    variance = sum((t - mean_t) ** 2 for t, _ in points)
+    if not variance:
+        return None
+    slope = sum((t - mean_t) * (mb - mean_mb) for t, mb in points) / variance
+    return round(slope * 3600, 2)
+
+def run_soak(args, make_client, transcripts, server_pid) -> dict:
+    concurrency = max(args.concurrency)
+    recorder, stop = Recorder(), threading.Event()
+    users = [threading.Thread(target=virtual_user, daemon=True,
+                              args=(make_client, transcripts, recorder, stop, args.seed + i, args.think_time))
+             for i in range(concurrency)]
+    for user in users:
+        user.start()
+    samples, totals = [], {"latencies": {}, "outcomes": {}, "step_errors": {}, "consultations": 0}
+    started = last = time.monotonic()
+    try:
+        while time.monotonic() - started < args.soak:
+            time.sleep(min(args.sample_interval, max(args.soak - (time.monotonic() - started), 0.1)))
+            now = time.monotonic()
+            latencies, outcomes, step_errors, consultations = recorder.take()
+            window = summarize(latencies, outcomes, step_errors, consultations, now - last)
+            sample = {"t": round(now - started, 1), "memory": server_memory(server_pid),
+                      "throughput_rps": window["throughput_rps"], "error_rate": window["error_rate"],
+                      "p50_ms": window["all"].get("p50_ms"), "p99_ms": window["all"].get("p99_ms")}
+            samples.append(sample)
+            for step, values in latencies.items():
+                totals["latencies"].setdefault(step, []).extend(values)
+            for outcome, count in outcomes.items():
+                totals["outcomes"][outcome] = totals["outcomes"].get(outcome, 0) + count
+            for step, count in step_errors.items():
+                totals["step_errors"][step] = totals["step_errors"].get(step, 0) + count
+            totals["consultations"] += consultations
+            last = now
+            memory = sample["memory"] or {}
+            print(f"t={sample['t']:>7.0f}s  {sample['throughput_rps']:>8.1f} req/s  p99 {sample['p99_ms'] or 0:>8.1f}ms  "
+                  f"errors {sample['error_rate']:.2%}  pss {memory.get('pss_mb')} MB", file=sys.stderr)
+    finally:
+        stop.set()
+        for user in users:
+            user.join(args.timeout + 5)
+    result = summarize(totals["latencies"], totals["outcomes"], totals["step_errors"], totals["consultations"],
+                       time.monotonic() - started)
+    result.update(concurrency=concurrency, samples=samples,
+                  memory_before=samples[0]["memory"] if samples else None,
+                  memory_after=samples[-1]["memory"] if samples else None,
+                  memory_growth_mb_per_hour=memory_growth_mb_per_hour(samples))
+    return result
+
+def print_stages(stages: list) -> None:
+    print(f"{'users':>6} {'step':<20} {'n':>7} {'errors':>7} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for stage in stages:
+        for step, stats in list(stage["steps"].items()) + [("(all)", stage["all"])]:
+            if stats.get("n"):
+                errors = stats.get("errors", sum(stage["errors"].values()))
+                print(f"{stage['concurrency']:>6} {step:<20} {stats['n']:>7} {errors:>7} {stats['p50_ms']:>7.1f}ms "
+                      f"{stats['p90_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms {stats['max_ms']:>7.1f}ms")
+        memory = stage.get("memory_after") or {}
+        print(f"{stage['concurrency']:>6} throughput {stage['throughput_rps']:.1f} req/s, "
+              f"{stage['consultations_per_s']:.2f} consultations/s, error rate {stage['error_rate']:.2%} "
+              f"{stage['errors'] or ''}, server rss {memory.get('rss_mb')} MB pss {memory.get('pss_mb')} MB")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--spawn", action="store_true", help="start a fake LLM and PredictVet.serve locally")
+    target.add_argument("--url", help="base URL of a running server")
+    parser.add_argument("--protocol", choices=("predictvet", "adk"), default="predictvet")
+    parser.add_argument("--app-name", default="PredictVet", help="ADK app name (adk protocol)")
+    parser.add_argument("--server-pid", type=int, help="pid of the running server, to sample its memory (--url)")
+    parser.add_argument("--transcripts", help="JSON/JSONL file of message lists (default: built-in consultations)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8, 16], help="virtual users per stage")
+    parser.add_argument("--stage-seconds", type=float, default=20.0)
+    parser.add_argument("--soak", type=float, default=0.0, help="soak for this many seconds instead of ramping")
+    parser.add_argument("--sample-interval", type=float, default=30.0, help="soak sampling interval in seconds")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds a user waits between turns")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    spawn = parser.add_argument_group("spawned server and fake LLM (--spawn)")
+    spawn.add_argument("--workers", type=int, default=2)
+    spawn.add_argument("--max-requests", type=int, default=0, help="worker recycling (0 = never, to expose leaks)")
+    spawn.add_argument("--llm-latency", type=float, default=0.5)
+    spawn.add_argument("--llm-distribution", choices=("fixed", "uniform", "exponential", "lognormal"), default="lognormal")
+    spawn.add_argument("--llm-jitter", type=float, default=0.5)
+    spawn.add_argument("--llm-error-rate", type=float, default=0.0)
+    spawn.add_argument("--llm-error-statuses", default="503=3,429=1,500=1")
+    spawn.add_argument("--llm-slow-rate", type=float, default=0.0)
+    spawn.add_argument("--llm-slow-latency", type=float, default=30.0)
+    spawn.add_argument("--llm-drop-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts) if args.transcripts else TRANSCRIPTS
+    processes, server_pid = [], args.server_pid
+    log = None
+    try:
+        if args.spawn:
+            log = tempfile.NamedTemporaryFile("w", prefix="predictvet-load-", suffix=".log", delete=False)
+            print(f"Server and fake LLM output: {log.name}", file=sys.stderr)
+            base_url, server, fake_llm = spawn_servers(args, log)
+            processes = [server, fake_llm]
+            server_pid = server.pid
+        else:
+            base_url = args.url
+        if args.protocol == "adk":
+            def make_client():
+                return ADKClient(base_url, args.timeout, args.app_name, f"load-{uuid.uuid4().hex[:8]}")
+        else:
+            def make_client():
+                return PredictVetClient(base_url, args.timeout)
+
+        report = {"meta": {"target": "spawned" if args.spawn else base_url, "protocol": args.protocol,
+                           "python": platform.python_version(), "platform": platform.platform(),
+                           "transcripts": len(transcripts), "think_time": args.think_time,
+                           "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                           "spawn": {key: value for key, value in vars(args).items()
+                                     if key == "workers" or key.startswith(("llm_", "max_requests"))}
+                           if args.spawn else None}}
+        if args.soak > 0:
+            report["soak"] = run_soak(args, make_client, transcripts, server_pid)
+        else:
+            report["stages"] = run_ramp(args, make_client, transcripts, server_pid)
+    finally:
+        for process in processes:
+            stop_process(process)
+        if log is not None:
+            log.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if "stages" in report:
+        print_stages(report["stages"])
+    else:
+        soak = report["soak"]
+        print_stages([soak])
+        print(f"memory growth: {soak['memory_growth_mb_per_hour']} MB/hour over {soak['seconds']:.0f}s")
+
+if __name__ == "__main__":
+    main()
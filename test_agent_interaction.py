@@ -74,13 +74,29 @@ def run_all_tests():
         agent_session_state_s4 = {}
         
         # Patching 'ListarCategorias' in the module where it's looked up by handle_predictvet_interaction
-        # which is PredictVetAgentModule (PredictVet.agent)
-        with patch.object(PredictVetAgentModule, 'ListarCategorias', return_value=["Error: Queixas DataFrame not loaded. Cannot list categories."]) as mock_listar_cat:
+        # which is PredictVetAgentModule (PredictVet.agent). Menus are pre-rendered per catalog
+        # version, so get_menus must also report the catalog as unavailable for the tool to be called.
+        with patch.object(PredictVetAgentModule, 'get_menus', return_value=None), \
+             patch.object(PredictVetAgentModule, 'ListarCategorias', return_value=["Error: Queixas DataFrame not loaded. Cannot list categories."]) as mock_listar_cat:
             print("\nSimulated: PredictVetAgentModule.ListarCategorias will now return an error.")
             simulate_interaction(agent_session_state_s4, "INICIAR_FLUXO")
             mock_listar_cat.assert_called_once() # Ensure it was called
         print("\nRestored: PredictVetAgentModule.ListarCategorias (mock exited scope).")
     
+        # Scenario 5: Free-typed selections without accents and with typos
+        print("\n\n--- Scenario 5: Accent-insensitive and fuzzy selection ---")
+        agent_session_state_s5 = {}
+        simulate_interaction(agent_session_state_s5, "INICIAR_FLUXO")
+        simulate_interaction(agent_session_state_s5, "respiratorio")
+        simulate_interaction(agent_session_state_s5, "espiro")
+
+        # Scenario 6: Free-text opening message goes straight to the complaint's question
+        print("\n\n--- Scenario 6: Free-text triage ---")
+        agent_session_state_s6 = {}
+        simulate_interaction(agent_session_state_s6, "Cachorro vomitando desde ontem")
+        simulate_interaction(agent_session_state_s6, "INICIAR")
+        simulate_interaction(agent_session_state_s6, "problema respiratório")
+
     finally:
         PredictVetAgentModule.llm_component = original_llm_component
         print("\nOriginal LLM component restored.")
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import time
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet.analysis_cache import AnalysisCache, make_key
+
+PERGUNTA = "O animal tem febre?"
+
+def test_key_ignores_case_spacing_and_order_only():
+    key = make_key("Vômito", {PERGUNTA: "Não tem febre", "Come?": "Sim"}, "v1", "abc")
+    assert make_key("vômito", {"Come?": "sim", PERGUNTA: "  NÃO  tem febre "}, "v1", "abc") == key
+    # Answers that differ only by punctuation can mean the opposite
+    assert make_key("Vômito", {PERGUNTA: "Não, tem febre", "Come?": "Sim"}, "v1", "abc") != key
+    assert make_key("Vômito", {PERGUNTA: "Não tem febre", "Come?": "Sim"}, "v2", "abc") != key
+    assert make_key("Vômito", {PERGUNTA: "Não tem febre", "Come?": "Sim"}, "v1", "def") != key
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnalysisCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a") == "A"
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.stats()["evictions"] == 1
+
+def test_entries_expire_after_the_ttl():
+    cache = AnalysisCache(max_entries=2, ttl_seconds=0.05)
+    cache.put("a", "A")
+    assert cache.get("a") == "A"
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_sqlite_tier_survives_a_restart():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "analyses.db")
+        AnalysisCache(max_entries=2, ttl_seconds=60, path=path).put("a", "A")
+        restarted = AnalysisCache(max_entries=2, ttl_seconds=60, path=path)
+        assert restarted.get("a") == "A"
+        assert restarted.stats()["disk_hits"] == 1
+
+        # Expired rows are not served after a restart either
+        AnalysisCache(max_entries=2, ttl_seconds=0.05, path=path).put("b", "B")
+        time.sleep(0.1)
+        assert AnalysisCache(max_entries=2, ttl_seconds=60, path=path).get("b") is None
+
+if __name__ == "__main__":
+    test_key_ignores_case_spacing_and_order_only()
+    test_least_recently_used_entry_is_evicted()
+    test_entries_expire_after_the_ttl()
+    test_sqlite_tier_survives_a_restart()
+    print("Analysis cache checks passed.")
@@ -0,0 +1,75 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import batch
+from PredictVet.analysis_cache import get_analysis_cache
+from PredictVet.llm_client import LLMUnavailableError
+
+CASES = [
+    {"case_id": "1", "queixa": "Vômito", "respostas": {"O vômito é acompanhado de diarreia?": "Lote 1"}},
+    {"case_id": "2", "queixa": "Tosse", "respostas": {"A tosse é seca?": "Lote 2"}},
+    ["não", "é", "um", "objeto"],
+    {"id": "3", "complaint": "Coceira", "answers": {"Há feridas?": "Lote 3"}},
+]
+
+def _records(path: str) -> list:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass
+    return records
+
+def test_rerun_resumes_after_errors_and_a_crash():
+    prompts = []
+
+    async def generate(prompt: str, priority: int) -> str:
+        prompts.append(prompt)
+        if "Lote 2" in prompt and fail_case_2:
+            raise LLMUnavailableError("HTTP 503")
+        return "Análise simulada"
+
+    previous = batch.generate_analysis_text_async
+    batch.generate_analysis_text_async = generate
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "casos.jsonl")
+        output_path = os.path.join(directory, "resultados.jsonl")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(json.dumps(case, ensure_ascii=False) for case in CASES) + "\n")
+        try:
+            fail_case_2 = True
+            summary = asyncio.run(batch.run_batch(input_path, output_path, concurrency=2))
+            assert (summary["ok"], summary["error"], summary["invalid"], summary["skipped"]) == (2, 1, 1, 0)
+            assert len(prompts) == 3
+
+            # A crash in the middle of a write leaves a partial line behind
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write('{"case_id": "2", "sta')
+
+            fail_case_2 = False
+            summary = asyncio.run(batch.run_batch(input_path, output_path, concurrency=2))
+            # Only the failed case runs again; finished and invalid ones are skipped
+            assert (summary["ok"], summary["error"], summary["invalid"], summary["skipped"]) == (1, 0, 0, 3)
+            assert len(prompts) == 4 and "Lote 2" in prompts[-1]
+
+            records = _records(output_path)
+            # Records of one run are written as cases finish, in any order
+            assert sorted((record["case_id"], record["status"]) for record in records[:4]) == [
+                ("1", "ok"), ("2", "error"), ("3", "ok"), ("line-3", "invalid")]
+            assert (records[4]["case_id"], records[4]["status"]) == ("2", "ok") and len(records) == 5
+            assert batch.finished_case_ids(output_path) == {"1", "2", "3", "line-3"}
+        finally:
+            batch.generate_analysis_text_async = previous
+            get_analysis_cache().clear()
+
+if __name__ == "__main__":
+    test_rerun_resumes_after_errors_and_a_crash()
+    print("Batch checks passed.")
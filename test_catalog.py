@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import catalog
+
+QUEIXAS = "Categoria,Queixa,Pergunta_Especifica\nGastrointestinal,Vômito,O vômito é acompanhado de diarreia?\n"
+DIAGNOSTICO = "Queixa,Sintoma_Chave,Diagnostico_Possivel,Exames_Sugeridos,Procedimentos_Adicionais\n" \
+              "Vômito,Diarreia,Gastroenterite Aguda,Exame de fezes,Hidratação\n"
+
+def _write(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _wait_for_reload() -> None:
+    # The background reload holds the lock until the new snapshot is installed
+    with catalog._reload_lock:
+        pass
+
+def test_reload_follows_the_snapshot_files_and_pins_conversations():
+    previous = catalog.current_snapshot()
+    with tempfile.TemporaryDirectory() as directory:
+        queixas_path = os.path.join(directory, "queixas.csv")
+        diagnostico_path = os.path.join(directory, "diagnostico.csv")
+        _write(queixas_path, QUEIXAS)
+        _write(diagnostico_path, DIAGNOSTICO)
+        try:
+            first = catalog.load_snapshot(queixas_path, diagnostico_path, "stdlib",
+                                          os.path.join(directory, "catalog.pvc"))
+            catalog.install_snapshot(first)
+            assert first.paths[:2] == (queixas_path, diagnostico_path)
+
+            # Unchanged files loaded from explicit paths do not trigger a reload
+            assert catalog.check_for_updates() is False
+
+            _write(queixas_path, QUEIXAS + "Respiratório,Tosse,A tosse é seca?\n")
+            assert catalog.check_for_updates() is True
+            _wait_for_reload()
+            second = catalog.current_snapshot()
+            assert second.version != first.version
+            assert second.paths == first.paths
+            assert second.index.categorias == ("Gastrointestinal", "Respiratório")
+            assert catalog.check_for_updates() is False
+
+            # A conversation pinned to the first version keeps reading it
+            with catalog.pinned_snapshot(first.version):
+                assert catalog.active_snapshot() is first
+            assert catalog.active_snapshot() is second
+        finally:
+            catalog._current = previous
+
+if __name__ == "__main__":
+    test_reload_follows_the_snapshot_files_and_pins_conversations()
+    print("Catalog checks passed.")
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import catalog, ingest
+from PredictVet.catalog_binary import BinaryCatalogError, compile_catalog, open_binary_catalog
+
+QUEIXAS = ("Categoria,Queixa,Pergunta_Especifica\n"
+           "Gastrointestinal,Vômito,O vômito é acompanhado de diarreia?\n"
+           "Gastrointestinal,Vômito,Com que frequência?\n"
+           "Urinário,Dificuldade para urinar,Há sangue na urina?\n"
+           "Oftalmológico,Secreção nos olhos,\n")
+DIAGNOSTICO = ("Queixa,Sintoma_Chave,Diagnostico_Possivel,Exames_Sugeridos,Procedimentos_Adicionais\n"
+               "Vômito,Diarreia,Gastroenterite Aguda,\"Exame de fezes, Hemograma\",\n"
+               "Dificuldade para urinar,Esforço/dor,Obstrução Urinária,Urinálise,Cateterismo uretral de emergência\n")
+
+def _write(path: str, text: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _plain(index: catalog.CatalogIndex) -> tuple:
+    """The index as plain values, comparable across loaders."""
+    return (tuple(index.categorias),
+            {key: tuple(value) for key, value in index.queixas_por_categoria.items()},
+            {key: tuple(value) for key, value in index.perguntas_por_queixa.items()},
+            {key: tuple(dict(row) for row in rows) for key, rows in index.diagnosticos_por_queixa.items()})
+
+def _compiled(directory: str) -> tuple[str, str, str]:
+    queixas_path = os.path.join(directory, "queixas.csv")
+    diagnostico_path = os.path.join(directory, "diagnostico.csv")
+    binary_path = os.path.join(directory, "catalog.pvc")
+    _write(queixas_path, QUEIXAS)
+    _write(diagnostico_path, DIAGNOSTICO)
+    compile_catalog(queixas_path, diagnostico_path, binary_path)
+    return queixas_path, diagnostico_path, binary_path
+
+def test_binary_catalog_round_trip():
+    with tempfile.TemporaryDirectory() as directory:
+        queixas_path, diagnostico_path, binary_path = _compiled(directory)
+        parsed = catalog.load_snapshot(queixas_path, diagnostico_path, "stdlib", binary_path)
+        version, index, queixas_columns, diagnostico_columns = open_binary_catalog(binary_path)
+
+        assert version == parsed.version == ingest.content_version((queixas_path, diagnostico_path))
+        assert _plain(index) == _plain(parsed.index)
+        assert (queixas_columns, diagnostico_columns) == (parsed.queixas_columns, parsed.diagnostico_columns)
+        # Lookups of missing keys behave like the dict-based index
+        assert "Tosse" not in index.perguntas_por_queixa
+        assert index.perguntas_por_queixa.get("Tosse") is None
+
+def test_corrupt_or_stale_binary_is_not_used():
+    with tempfile.TemporaryDirectory() as directory:
+        queixas_path, diagnostico_path, binary_path = _compiled(directory)
+        with open(binary_path, "r+b") as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+        try:
+            open_binary_catalog(binary_path)
+        except BinaryCatalogError as e:
+            assert "checksum" in str(e)
+        else:
+            raise AssertionError("a corrupt file must not be mapped")
+
+        # The "auto" loader parses the CSVs when the compiled file is older than them
+        compile_catalog(queixas_path, diagnostico_path, binary_path)
+        _write(queixas_path, QUEIXAS + "Respiratório,Tosse,A tosse é seca?\n")
+        snapshot = catalog.load_snapshot(queixas_path, diagnostico_path, "auto", binary_path)
+        assert snapshot.loader == "stdlib"
+        assert "Tosse" in snapshot.index.perguntas_por_queixa
+
+def test_shipped_binary_matches_the_shipped_sheets():
+    version, _, _, _ = open_binary_catalog(catalog.BINARY_PATH)
+    assert version == ingest.content_version((catalog.QUEIXAS_PATH, catalog.DIAGNOSTICO_PATH))
+
+if __name__ == "__main__":
+    test_binary_catalog_round_trip()
+    test_corrupt_or_stale_binary_is_not_used()
+    test_shipped_binary_matches_the_shipped_sheets()
+    print("Binary catalog checks passed.")
@@ -0,0 +1,90 @@
+import csv
+import os
+import sys
+import tempfile
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import catalog, tools
+from PredictVet.ingest import CatalogFormatError, SheetReader
+
+HEADER = "Queixa,Sintoma_Chave,Diagnostico_Possivel\n"
+
+def _sheet(directory: str, text: str, name: str = "diagnostico.csv") -> str:
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+    return path
+
+def _read(path: str, **settings) -> tuple[list, SheetReader]:
+    reader = SheetReader(path, chunk_rows=2, **settings)
+    return [row for chunk in reader.chunks() for row in chunk], reader
+
+def test_malformed_rows_are_quarantined():
+    with tempfile.TemporaryDirectory() as directory:
+        path = _sheet(directory, HEADER
+                      + "Vômito,Diarreia,Gastroenterite\n"
+                      + "Tosse,Seca,Traqueobronquite, infecciosa\n"  # unquoted comma
+                      + ",Febre,Infecção\n"                          # blank key
+                      + "\n"                                         # blank line
+                      + "Espirro,\"Secreção,Rinite\n")              # unclosed quote up to the end
+        rows, reader = _read(path, quarantine_dir=os.path.join(directory, "quarantine"))
+        assert rows == [("Vômito", "Diarreia", "Gastroenterite")]
+        report = reader.report
+        assert report.quarantined == {"extra_fields": 1, "blank_key": 1, "unclosed_quote": 1}
+        assert report.blank == 1 and report.rows_kept == 1 and not report.clean
+
+        with open(report.quarantine_path, encoding="utf-8", newline="") as f:
+            quarantined = list(csv.reader(f))
+        assert quarantined[0] == ["line", "reason", "Queixa", "Sintoma_Chave", "Diagnostico_Possivel"]
+        assert [row[1] for row in quarantined[1:]] == ["extra_fields", "blank_key", "unclosed_quote"]
+
+def test_short_rows_are_padded_when_they_reach_the_key():
+    with tempfile.TemporaryDirectory() as directory:
+        rows, reader = _read(_sheet(directory, "Sintoma_Chave,Queixa,Diagnostico_Possivel\n"
+                                               " Diarreia , Vômito \n"
+                                               "Febre\n"))
+        assert rows == [("Diarreia", "Vômito", "")]
+        assert reader.report.repaired == {"missing_fields": 1}
+        assert reader.report.quarantined == {"missing_fields": 1}
+
+def test_duplicate_rows_are_dropped():
+    with tempfile.TemporaryDirectory() as directory:
+        path = _sheet(directory, HEADER + "Vômito,Diarreia,Gastroenterite\n" * 3
+                      + "Vômito, Diarreia ,Gastroenterite\n"  # same cells once stripped
+                      + "Tosse,Seca,Traqueobronquite\n" * 2)
+        rows, reader = _read(path)
+        assert rows == [("Vômito", "Diarreia", "Gastroenterite"), ("Tosse", "Seca", "Traqueobronquite")]
+        assert reader.report.duplicates == 4 and not reader.report.dedup_limited
+
+        # Past the bound, only the first distinct rows are remembered
+        rows, reader = _read(path, dedup_rows=1)
+        assert rows == [("Vômito", "Diarreia", "Gastroenterite")] + [("Tosse", "Seca", "Traqueobronquite")] * 2
+        assert reader.report.duplicates == 3 and reader.report.dedup_limited
+
+def test_sheet_without_header_cannot_be_ingested():
+    with tempfile.TemporaryDirectory() as directory:
+        path = _sheet(directory, "")
+        try:
+            _read(path)
+        except CatalogFormatError:
+            pass
+        else:
+            raise AssertionError("an empty sheet has no columns")
+
+        # load_dataframes() logs it and keeps the installed catalog
+        previous, queixas_path = catalog.current_snapshot(), catalog.QUEIXAS_PATH
+        catalog.QUEIXAS_PATH = path
+        try:
+            tools.load_dataframes()
+            assert catalog.current_snapshot() is previous
+        finally:
+            catalog.QUEIXAS_PATH = queixas_path
+
+if __name__ == "__main__":
+    test_malformed_rows_are_quarantined()
+    test_short_rows_are_padded_when_they_reach_the_key()
+    test_duplicate_rows_are_dropped()
+    test_sheet_without_header_cannot_be_ingested()
+    print("Ingest checks passed.")
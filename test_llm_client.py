@@ -0,0 +1,150 @@
+import asyncio
+import os
+import sys
+import time
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import agent, llm_client
+from PredictVet.fake_llm import start_fake_llm
+from PredictVet.llm_client import HTTPBackend, LLMClient, LLMError, LLMTimeoutError, LLMUnavailableError
+
+def _client(server, **settings) -> LLMClient:
+    backend = HTTPBackend(server.url, "fake")
+    settings.setdefault("backoff", 0.01)
+    return LLMClient(backend, async_backend=backend.acall, **settings)
+
+def test_transient_errors_are_retried():
+    server = start_fake_llm(error_rate=1.0, error_status=503)
+    try:
+        retries = llm_client._RETRIES.value()
+        try:
+            _client(server, retries=2).generate("prompt")
+        except LLMUnavailableError:
+            pass
+        else:
+            raise AssertionError("a call that always gets 503 must fail")
+        # First attempt plus two retries
+        assert server.requests == 3
+        assert llm_client._RETRIES.value() == retries + 2
+    finally:
+        server.shutdown()
+
+def test_permanent_errors_are_not_retried():
+    server = start_fake_llm(error_rate=1.0, error_status=400)
+    try:
+        try:
+            _client(server, retries=2).generate("prompt")
+        except LLMUnavailableError:
+            raise AssertionError("HTTP 400 is not transient")
+        except LLMError:
+            pass
+        assert server.requests == 1
+    finally:
+        server.shutdown()
+
+def test_deadline_expires():
+    server = start_fake_llm(slow_rate=1.0, slow_latency=2.0)
+    try:
+        for generate in (lambda client: client.generate("prompt", timeout=0.3),
+                         lambda client: asyncio.run(client.agenerate("prompt", timeout=0.3))):
+            started = time.monotonic()
+            try:
+                generate(_client(server, retries=2))
+            except LLMTimeoutError:
+                pass
+            else:
+                raise AssertionError("a call slower than its deadline must time out")
+            # The deadline covers every attempt: no retry outlives it
+            assert time.monotonic() - started < 1.0
+    finally:
+        server.shutdown()
+
+def test_slow_attempt_is_hedged_once():
+    server = start_fake_llm(slow_rate=1.0, slow_latency=0.3)
+    try:
+        client = _client(server, hedge_percentile=50)
+        # Past answers took 20ms: the attempt still running after that gets a hedge
+        client._latencies.extend([0.02] * llm_client.HEDGE_MIN_SAMPLES)
+        hedges = llm_client._HEDGES.value(winner="primary") + llm_client._HEDGES.value(winner="hedge")
+        assert client.generate("prompt", timeout=2).startswith("Análise simulada")
+        assert server.requests == 2
+        assert llm_client._HEDGES.value(winner="primary") + llm_client._HEDGES.value(winner="hedge") == hedges + 1
+    finally:
+        server.shutdown()
+
+def test_losing_hedge_is_cancelled():
+    server = start_fake_llm(slow_rate=1.0, slow_latency=0.3)
+    cancelled = []
+    try:
+        client = _client(server, hedge_percentile=50)
+        client._latencies.extend([0.02] * llm_client.HEDGE_MIN_SAMPLES)
+
+        async def backend(prompt: str, timeout: float) -> str:
+            try:
+                return await client.backend.acall(prompt, timeout)
+            except asyncio.CancelledError:
+                cancelled.append(prompt)
+                raise
+        client.async_backend = backend
+
+        async def call() -> str:
+            text = await client.agenerate("prompt", timeout=2)
+            # Nothing is left running once the winner has answered
+            assert asyncio.all_tasks() == {asyncio.current_task()}
+            return text
+
+        assert asyncio.run(call()).startswith("Análise simulada")
+        assert server.requests == 2
+        assert cancelled == ["prompt"]
+    finally:
+        server.shutdown()
+
+def _reach_confirmation(state: dict, handle) -> None:
+    for message in ("INICIAR_FLUXO", "Gastrointestinal", "Vômito"):
+        handle(message, state)
+    while state["current_step"] == "answer_question":
+        handle("Ontem à noite, após comer grama.", state)
+    assert state["current_step"] == "confirm_analysis"
+
+def test_session_is_kept_after_a_failed_analysis():
+    server = start_fake_llm(error_rate=1.0, error_status=503)
+    previous_client = llm_client._default_client
+    llm_client._default_client = _client(server, retries=1, timeout=2)
+    try:
+        def handle(message: str, state: dict) -> str:
+            return agent.handle_predictvet_interaction(new_message=message, agent_session_state=state)
+
+        def handle_async(message: str, state: dict) -> str:
+            return asyncio.run(agent.handle_predictvet_interaction_async(new_message=message, agent_session_state=state))
+
+        for turn in (handle, handle_async):
+            server.error_rate = 1.0
+            state = {}
+            _reach_confirmation(state, turn)
+            answers = dict(state["collected_answers"])
+
+            turn("sim", state)
+            # The failed analysis leaves the session at the confirmation, answers intact
+            assert state["current_step"] == "confirm_analysis"
+            assert state["collected_answers"] == answers
+
+            # A new "sim" retries and then finishes the consultation
+            server.error_rate = 0.0
+            reply = turn("sim", state)
+            assert "Análise simulada" in reply
+            assert state["current_step"] == "initial"
+            agent.get_analysis_cache().clear()
+    finally:
+        llm_client._default_client = previous_client
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_transient_errors_are_retried()
+    test_permanent_errors_are_not_retried()
+    test_deadline_expires()
+    test_slow_attempt_is_hedged_once()
+    test_losing_hedge_is_cancelled()
+    test_session_is_kept_after_a_failed_analysis()
+    print("LLM client checks passed.")
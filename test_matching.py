@@ -0,0 +1,63 @@
+import os
+import sys
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import matching
+from PredictVet.matching import OptionIndex, edit_distance, fold
+
+CATEGORIAS = ("Gastrointestinal", "Respiratório", "Pele e Pelos", "Urinário", "Reprodutor")
+QUEIXAS = ("Vômito", "Diarreia", "Dificuldade para urinar", "Dificuldade para respirar", "Coceira", "Tosse")
+
+def test_accents_case_and_spacing_are_ignored():
+    assert fold(" Respiratório!") == "respiratorio"
+    index = OptionIndex(CATEGORIAS)
+    assert index.resolve("respiratorio") == "Respiratório"
+    assert index.resolve("URINÁRIO") == "Urinário"
+    assert index.resolve("peleepelos") == "Pele e Pelos"
+    assert OptionIndex(QUEIXAS).resolve("vomito") == "Vômito"
+
+def test_typos_within_the_allowed_distance():
+    assert edit_distance("cocera", "coceira", 1) == 1
+    assert edit_distance("tosse", "coceira", 1) == 2
+    index = OptionIndex(QUEIXAS)
+    assert index.resolve("cocera") == "Coceira"
+    assert index.resolve("diareia") == "Diarreia"
+    # Transposed letters count as one edit
+    assert index.resolve("dairreia") == "Diarreia"
+    # Short words must be typed exactly
+    assert index.resolve("tose") is None
+
+def test_ambiguous_prefixes_resolve_to_nothing():
+    categorias, queixas = OptionIndex(CATEGORIAS), OptionIndex(QUEIXAS)
+    assert categorias.resolve("resp") == "Respiratório"
+    # "re" is too short and "dificuldade" starts two complaints
+    assert categorias.resolve("re") is None
+    assert queixas.resolve("dificuldade") is None
+    assert queixas.resolve("dific urinar") == "Dificuldade para urinar"
+    assert queixas.resolve("para") is None
+
+def test_long_free_text_skips_the_fuzzy_search():
+    index = OptionIndex(QUEIXAS)
+    message = "meu cachorro está vomitando desde ontem à noite depois de comer grama no quintal " * 3
+
+    def deletes(word: str, distance: int) -> set:
+        raise AssertionError("deletion variants built for a text longer than every option")
+
+    previous = matching._deletes
+    matching._deletes = deletes
+    try:
+        assert index.resolve(message) is None
+        # A typo near an option's length still goes through the fuzzy search
+        matching._deletes = previous
+        assert index.resolve("dificuldade para urinnar") == "Dificuldade para urinar"
+    finally:
+        matching._deletes = previous
+
+if __name__ == "__main__":
+    test_accents_case_and_spacing_are_ignored()
+    test_typos_within_the_allowed_distance()
+    test_ambiguous_prefixes_resolve_to_nothing()
+    test_long_free_text_skips_the_fuzzy_search()
+    print("Matching checks passed.")
@@ -0,0 +1,90 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import metrics, serve
+
+def _free_ports(count: int) -> int:
+    """First of `count` consecutive free ports."""
+    while True:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            first = probe.getsockname()[1]
+        try:
+            for port in range(first, first + count):
+                with socket.socket() as probe:
+                    probe.bind(("127.0.0.1", port))
+            return first
+        except OSError:
+            continue
+
+def _samples() -> dict:
+    return {metric.name: list(metric.samples()) for metric in metrics._registry.values() if list(metric.samples())}
+
+def test_disabled_block_records_nothing():
+    counter = metrics.counter("predictvet_test_disabled_total")
+    with metrics.disabled():
+        counter.inc()
+    assert counter.value() == 0
+    counter.inc()
+    assert counter.value() == 1
+
+def test_warmup_is_not_recorded():
+    before = _samples()
+    serve.warmup()
+    assert _samples() == before
+
+def test_stopped_endpoint_frees_its_port():
+    port = _free_ports(1)
+    metrics.start_http_server(port, "127.0.0.1")
+    metrics.stop_http_server()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", port))
+
+def _get(url: str, data: bytes = None) -> bytes:
+    with urllib.request.urlopen(url, data, timeout=5) as response:
+        return response.read()
+
+def test_each_worker_serves_its_own_metrics():
+    port, metrics_port = _free_ports(1), _free_ports(2)
+    env = dict(os.environ, PREDICTVET_METRICS_PORT=str(metrics_port))
+    server = subprocess.Popen([sys.executable, "-m", "PredictVet.serve", "--api", "chat", "--workers", "2",
+                               "--port", str(port), "--max-requests", "0"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                _get(f"http://127.0.0.1:{metrics_port + 1}/metrics")
+                break
+            except OSError:
+                assert time.monotonic() < deadline and server.poll() is None, "workers did not start"
+                time.sleep(0.1)
+        for _ in range(6):
+            _get(f"http://127.0.0.1:{port}/chat", json.dumps({"message": "INICIAR"}).encode("utf-8"))
+
+        turns = 0
+        for worker_port in (metrics_port, metrics_port + 1):
+            for line in _get(f"http://127.0.0.1:{worker_port}/metrics").decode("utf-8").splitlines():
+                # Only the six turns are counted: warmup in the parent recorded none
+                assert not line.startswith('predictvet_step_seconds_count{step="choose_category"}')
+                if line.startswith('predictvet_step_seconds_count{step="initial"}'):
+                    turns += int(line.split()[-1])
+        assert turns == 6
+    finally:
+        server.terminate()
+        server.wait(10)
+
+if __name__ == "__main__":
+    test_disabled_block_records_nothing()
+    test_warmup_is_not_recorded()
+    test_stopped_endpoint_frees_its_port()
+    test_each_worker_serves_its_own_metrics()
+    print("Metrics checks passed.")
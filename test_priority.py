@@ -0,0 +1,95 @@
+import os
+import sys
+import threading
+import time
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet.llm_client import Admission, LLMOverloadedError
+from PredictVet.priority import BACKGROUND, EMERGENCY, ROUTINE, URGENT, row_priority
+
+def test_row_priority_from_column_and_words():
+    assert row_priority({"Procedimentos_Adicionais": "Cateterismo uretral de emergência"}) == EMERGENCY
+    assert row_priority({"Procedimentos_Adicionais": "Internação urgente"}) == URGENT
+    assert row_priority({"Exames_Sugeridos": "Ultrassom com urgência"}) == URGENT
+    assert row_priority({"Procedimentos_Adicionais": "Cirurgia (se confirmado)"}) == URGENT
+    assert row_priority({"Diagnostico_Possivel": "Dermatite"}) == ROUTINE
+    # An explicit column wins over the words
+    assert row_priority({"Prioridade": "Rotina", "Procedimentos_Adicionais": "Cirurgia"}) == ROUTINE
+    assert row_priority({"Prioridade": "3"}) == BACKGROUND
+
+def _queue(admission: Admission, priority: int, admitted: list, errors: list, ready=None) -> threading.Thread:
+    """Starts a call that queues at `priority` and returns once it is waiting (or ready() holds)."""
+    queued = admission.queued
+    ready = ready or (lambda: admission.queued > queued)
+
+    def call() -> None:
+        try:
+            with admission.admitted(priority):
+                admitted.append(priority)
+        except LLMOverloadedError as e:
+            errors.append((priority, e))
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    while not ready() and thread.is_alive():
+        time.sleep(0.005)
+    return thread
+
+def test_emergency_queued_behind_routine_calls_goes_first():
+    admission = Admission(limit=1, queue_size=10, queue_timeout=2)
+    admitted, errors = [], []
+    admission.acquire(ROUTINE)
+    threads = [_queue(admission, priority, admitted, errors) for priority in (ROUTINE, BACKGROUND, ROUTINE, EMERGENCY)]
+    assert admission.queued == 4
+    admission.release()
+    for thread in threads:
+        thread.join()
+    assert admitted == [EMERGENCY, ROUTINE, ROUTINE, BACKGROUND]
+    assert errors == []
+    assert admission.running == 0
+
+def test_reserved_slots_are_left_to_emergencies():
+    admission = Admission(limit=2, queue_size=0, reserved=1)
+    admission.acquire(ROUTINE)
+    try:
+        admission.acquire(URGENT)
+    except LLMOverloadedError:
+        pass
+    else:
+        raise AssertionError("the last slot is reserved for emergencies")
+    admission.acquire(EMERGENCY)
+    assert admission.running == 2
+
+def test_full_queue_rejects_at_once():
+    admission = Admission(limit=1, queue_size=1, queue_timeout=5)
+    admitted, errors = [], []
+    admission.acquire(ROUTINE)
+    waiting = _queue(admission, ROUTINE, admitted, errors)
+
+    started = time.monotonic()
+    try:
+        admission.acquire(ROUTINE)
+    except LLMOverloadedError:
+        pass
+    else:
+        raise AssertionError("a full queue must reject calls of the same priority")
+    # Rejected without waiting for the queue timeout
+    assert time.monotonic() - started < 0.5
+
+    # A more urgent call displaces the queued routine one instead of being rejected
+    emergency = _queue(admission, EMERGENCY, admitted, errors, ready=lambda: errors)
+    waiting.join(1)
+    assert admission.queued == 1
+    assert [priority for priority, _ in errors] == [ROUTINE]
+    admission.release()
+    emergency.join(1)
+    assert admitted == [EMERGENCY]
+
+if __name__ == "__main__":
+    test_row_priority_from_column_and_words()
+    test_emergency_queued_behind_routine_calls_goes_first()
+    test_reserved_slots_are_left_to_emergencies()
+    test_full_queue_rejects_at_once()
+    print("Priority checks passed.")
@@ -0,0 +1,22 @@
+import os
+import sys
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet.prompt_budget import merge_answer
+
+def test_merge_answer_drops_repeated_clauses():
+    assert merge_answer("Vomitou duas vezes.", "Vomitou duas vezes. Está apático.") == "Vomitou duas vezes. Está apático."
+    assert merge_answer("Ontem à noite, após comer grama.", "Ontem à noite, após comer grama.") == "Ontem à noite, após comer grama."
+
+def test_merge_answer_keeps_new_and_contradicting_details():
+    # Negations and short clauses are clinical details, not repetitions of the previous text
+    assert merge_answer("Sem diarreia.", "Diarreia.") == "Sem diarreia. Diarreia."
+    assert merge_answer("Não tem febre nem tosse.", "Tem febre.") == "Não tem febre nem tosse. Tem febre."
+    assert merge_answer("Vomita de manhã, não come.", "Come.") == "Vomita de manhã, não come. Come."
+
+if __name__ == "__main__":
+    test_merge_answer_drops_repeated_clauses()
+    test_merge_answer_keeps_new_and_contradicting_details()
+    print("merge_answer checks passed.")
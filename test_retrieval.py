@@ -0,0 +1,48 @@
+import os
+import sys
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import catalog
+from PredictVet.retrieval import RetrievalIndex, related_entries
+
+def test_related_entries_come_from_other_complaints():
+    snapshot = catalog.ensure_loaded()
+    entries = related_entries(snapshot, "Vômito", {"O vômito é acompanhado de diarreia?": "Sim"}, k=3)
+    assert [(entry.queixa, entry.row["Diagnostico_Possivel"]) for entry in entries] == [("Diarreia", "Colite Infecciosa")]
+    # The consultation's own complaint is never returned
+    assert all(entry.queixa != "Vômito" for entry in entries)
+    assert related_entries(snapshot, "Vômito", {}, k=0) == []
+
+def _index(rows: int) -> RetrievalIndex:
+    """Every row shares "Hemograma" (a common term); one row in fifty has a rare symptom."""
+    queixas = [{"Categoria": "Geral", "Queixa": f"Queixa {i}", "Pergunta_Especifica": "Desde quando?"} for i in range(rows)]
+    diagnosticos = [{"Queixa": f"Queixa {i}", "Sintoma_Chave": "Convulsões" if i % 50 == 3 else "Apatia",
+                     "Diagnostico_Possivel": f"Diagnóstico {i}", "Exames_Sugeridos": "Hemograma",
+                     "Procedimentos_Adicionais": "Observação"} for i in range(rows)]
+    return RetrievalIndex(catalog.build_catalog_index(queixas, diagnosticos))
+
+def test_rare_terms_pick_the_candidates_and_common_ones_rescore_them():
+    index = _index(200)
+    respostas = {"Sintomas?": "Convulsões, pediram hemograma"}
+    # Enough rows have the rare symptom: "hemograma" does not add the 196 others; equal scores keep the sheet order
+    entries = index.search("Queixa 0", respostas, k=3, exclude_queixa="Queixa 0")
+    assert [entry.queixa for entry in entries] == ["Queixa 3", "Queixa 53", "Queixa 103"]
+    # Too few: the common terms add candidates, ranked below the rare symptom
+    entries = index.search("Queixa 0", respostas, k=6, exclude_queixa="Queixa 0")
+    assert [entry.queixa for entry in entries[:4]] == ["Queixa 3", "Queixa 53", "Queixa 103", "Queixa 153"]
+    assert len(entries) == 6 and "Queixa 0" not in [entry.queixa for entry in entries]
+
+    # Rows of other complaints are found even when the first term scored only finds the excluded ones
+    own = RetrievalIndex(catalog.build_catalog_index(
+        [{"Categoria": "Geral", "Queixa": name, "Pergunta_Especifica": "?"} for name in ("Vômito", "Diarreia")],
+        [{"Queixa": "Vômito", "Sintoma_Chave": "Diarreia"}, {"Queixa": "Vômito", "Sintoma_Chave": "Diária"},
+         {"Queixa": "Diarreia", "Sintoma_Chave": "Muco"}]))
+    entries = own.search("Vômito", {"Tem diarreia?": "Sim"}, k=3, exclude_queixa="Vômito")
+    assert [entry.queixa for entry in entries] == ["Diarreia"]
+
+if __name__ == "__main__":
+    test_related_entries_come_from_other_complaints()
+    test_rare_terms_pick_the_candidates_and_common_ones_rescore_them()
+    print("Retrieval checks passed.")
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import catalog
+from PredictVet.scoring import answer_terms, rank_diagnoses
+
+PERGUNTA = "O vômito é acompanhado de diarreia?"
+
+def _ranking(respostas: dict) -> list:
+    matches = rank_diagnoses(catalog.ensure_loaded(), "Vômito", respostas)
+    return [(match.row["Diagnostico_Possivel"], match.score > 0, match.matched) for match in matches]
+
+def test_yes_no_answers_affirm_or_deny_their_question():
+    affirmed, denied = answer_terms(PERGUNTA, "Sim")
+    assert {"vomit", "acomp", "diarr"} <= affirmed and not denied
+    assert answer_terms(PERGUNTA, "Não") == (set(), {"vomit", "acomp", "diarr"})
+    # A contrast ends the negation
+    assert answer_terms("", "Não tem diarreia, mas vomita diariamente") == ({"vomit", "diari"}, {"diarr"})
+
+def test_answers_rank_the_matching_diagnosis_first():
+    assert _ranking({PERGUNTA: "Sim"})[0] == ("Gastroenterite Aguda", True, ("Diarreia",))
+    assert _ranking({"Com que frequência?": "Vomita diariamente, sem diarreia"}) == [
+        ("Corpo Estranho Gastrointestinal", True, ("diária",)),
+        ("Gastroenterite Aguda", False, ()),
+    ]
+    # A denied symptom counts against its diagnosis
+    assert _ranking({PERGUNTA: "Não"})[-1][0] == "Gastroenterite Aguda"
+
+def test_no_matching_answer_keeps_the_sheet_order():
+    assert [name for name, _, _ in _ranking({})] == ["Gastroenterite Aguda", "Corpo Estranho Gastrointestinal"]
+    assert rank_diagnoses(catalog.ensure_loaded(), "Queixa inexistente", {PERGUNTA: "Sim"}) == []
+
+if __name__ == "__main__":
+    test_yes_no_answers_affirm_or_deny_their_question()
+    test_answers_rank_the_matching_diagnosis_first()
+    test_no_matching_answer_keeps_the_sheet_order()
+    print("Scoring checks passed.")
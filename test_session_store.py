@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import catalog
+from PredictVet.session_store import InMemorySessionStore, SQLiteSessionStore, decode_state, encode_state
+
+def _session() -> dict:
+    snapshot = catalog.ensure_loaded()
+    index = snapshot.index
+    categoria = index.categorias[0]
+    queixa = index.queixas_por_categoria[categoria][0]
+    perguntas = index.perguntas_por_queixa[queixa]
+    return {
+        "current_step": "answer_question",
+        "selected_category": categoria,
+        "selected_complaint": queixa,
+        "collected_answers": {perguntas[0]: "Desde ontem.", "Pergunta fora do catálogo?": "Não."},
+        "last_question_asked": perguntas[1] if len(perguntas) > 1 else perguntas[0],
+        "catalog_version": snapshot.version,
+        "speculative_key": "abc",
+    }
+
+def test_state_round_trip_uses_catalog_indices():
+    state = _session()
+    data = encode_state(state)
+    compact = json.loads(data)
+    # Catalog texts are stored as positions; the answer outside the catalog stays as text
+    assert compact["c"] == 0 and compact["q"] == 0
+    assert compact["a"][0][0] == 0 and compact["a"][1][0] == "Pergunta fora do catálogo?"
+    assert decode_state(data) == state
+
+def test_state_survives_a_missing_catalog_version():
+    state = _session()
+    compact = json.loads(encode_state(state))
+    compact["v"] = "000000000000"
+    restored = decode_state(json.dumps(compact).encode("utf-8"))
+    assert restored == dict(state, catalog_version="000000000000")
+
+    # Sessions written with bare indices cannot be resolved without their version
+    del compact["t"]
+    assert decode_state(json.dumps(compact).encode("utf-8")) == {}
+
+def _stores(directory: str, **settings) -> list:
+    return [InMemorySessionStore(**settings), SQLiteSessionStore(os.path.join(directory, "sessions.db"), **settings)]
+
+def test_stores_round_trip_and_expire_idle_sessions():
+    state = _session()
+    with tempfile.TemporaryDirectory() as directory:
+        for store in _stores(directory, ttl_seconds=0.1):
+            assert store.get("a") == {}
+            store.put("a", state)
+            assert store.get("a") == state
+            time.sleep(0.2)
+            assert store.get("a") == {}
+            store.evict()
+            assert len(store) == 0
+
+def test_stores_evict_least_recently_written_sessions():
+    state = _session()
+    with tempfile.TemporaryDirectory() as directory:
+        for store in _stores(directory, max_sessions=2):
+            for session_id in ("a", "b", "c"):
+                store.put(session_id, state)
+                time.sleep(0.01)
+            store.evict()
+            assert len(store) == 2
+            assert store.get("a") == {}
+            assert store.get("b") == state and store.get("c") == state
+            store.delete("b")
+            assert store.get("b") == {}
+
+if __name__ == "__main__":
+    test_state_round_trip_uses_catalog_indices()
+    test_state_survives_a_missing_catalog_version()
+    test_stores_round_trip_and_expire_idle_sessions()
+    test_stores_evict_least_recently_written_sessions()
+    print("Session store checks passed.")
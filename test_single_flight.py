@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import agent, single_flight
+
+def _coalesced() -> float:
+    return single_flight._CALLS.value(flight="analysis", role="coalesced")
+
+def _claims() -> int:
+    stats = agent._analysis_flights.stats()
+    return stats["leaders"] + stats["coalesced"]
+
+def _run_concurrently(calls: list) -> tuple[list, list]:
+    """Runs every (cache_key, prompt) at once against a slow fake generation."""
+    prompts, results = [], [None] * len(calls)
+    release = threading.Event()
+
+    def generate(prompt: str, mode: str = "sync", priority: int = 0) -> str:
+        prompts.append(prompt)
+        release.wait(2)
+        return "Análise de " + prompt
+
+    def call(i: int, cache_key: str, prompt: str) -> None:
+        results[i] = agent._generate_shared(cache_key, prompt)
+
+    previous = agent.generate_analysis_text
+    agent.generate_analysis_text = generate
+    claims = _claims()
+    try:
+        threads = [threading.Thread(target=call, args=(i, *args)) for i, args in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        # Every caller has claimed its flight before the generation is released
+        while _claims() < claims + len(calls):
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        agent.generate_analysis_text = previous
+        agent.get_analysis_cache().clear()
+    return prompts, results
+
+def test_different_prompts_under_one_cache_key_are_not_merged():
+    # Answers differing only by case share the cache key but not the prompt sent to the LLM
+    prompts, results = _run_concurrently([("mesma-chave", "Prompt: Não tem febre"),
+                                          ("mesma-chave", "Prompt: NÃO TEM FEBRE")])
+    assert sorted(prompts) == ["Prompt: NÃO TEM FEBRE", "Prompt: Não tem febre"]
+    assert sorted(results) == ["Análise de Prompt: NÃO TEM FEBRE", "Análise de Prompt: Não tem febre"]
+
+def test_identical_prompts_are_merged():
+    coalesced = _coalesced()
+    prompts, results = _run_concurrently([("chave-a", "Prompt: Vômito"), ("chave-b", "Prompt: Vômito")])
+    assert prompts == ["Prompt: Vômito"]
+    assert results == ["Análise de Prompt: Vômito"] * 2
+    assert _coalesced() == coalesced + 1
+
+def test_async_flights_follow_the_prompt():
+    calls = []
+
+    async def generate(prompt: str, priority: int = 0) -> str:
+        calls.append(prompt)
+        await asyncio.sleep(0.1)
+        return "Análise de " + prompt
+
+    async def run() -> list:
+        return await asyncio.gather(agent._generate_shared_async("chave", "Prompt: A"),
+                                    agent._generate_shared_async("chave", "Prompt: B"),
+                                    agent._generate_shared_async("outra-chave", "Prompt: A"))
+
+    previous = agent.generate_analysis_text_async
+    agent.generate_analysis_text_async = generate
+    coalesced = _coalesced()
+    try:
+        results = asyncio.run(run())
+    finally:
+        agent.generate_analysis_text_async = previous
+        agent.get_analysis_cache().clear()
+    assert sorted(calls) == ["Prompt: A", "Prompt: B"]
+    assert results == ["Análise de Prompt: A", "Análise de Prompt: B", "Análise de Prompt: A"]
+    assert _coalesced() == coalesced + 1
+
+if __name__ == "__main__":
+    test_different_prompts_under_one_cache_key_are_not_merged()
+    test_identical_prompts_are_merged()
+    test_async_flights_follow_the_prompt()
+    print("Single-flight checks passed.")
@@ -0,0 +1,40 @@
+import os
+import sys
+
+# Ensure 'PredictVet' can be imported. Assumes script is run from repo root.
+sys.path.insert(0, os.getcwd())
+
+from PredictVet import agent, catalog
+from PredictVet.triage import normalize, triage_index
+
+def _classify(text: str):
+    triage = triage_index(catalog.ensure_loaded()).classify(text)
+    return (triage.categoria, triage.queixa) if triage else None
+
+def test_colloquial_messages_name_their_complaint():
+    assert normalize("Ele está fazendo Xixi com dificuldade") == "ele esta fazendo urinar com dificuldade"
+    assert _classify("Meu gato está tossindo muito à noite") == ("Respiratório", "Tosse")
+    assert _classify("cachorro vomitando desde ontem") == ("Gastrointestinal", "Vômito")
+    assert _classify("fazendo xixi com dificuldade") == ("Urinário", "Dificuldade para urinar")
+
+def test_negated_words_are_ignored():
+    assert _classify("não está vomitando, mas tem diarreia") == ("Gastrointestinal", "Diarreia")
+
+def test_unclear_messages_settle_for_the_category_or_nothing():
+    assert _classify("problema respiratório") == ("Respiratório", None)
+    assert _classify("oi, tudo bem?") is None
+
+def test_opening_message_skips_the_menus():
+    state = {}
+    reply = agent.handle_predictvet_interaction(new_message="Meu gato está tossindo muito à noite",
+                                                agent_session_state=state)
+    assert state["selected_complaint"] == "Tosse"
+    assert state["current_step"] == "answer_question"
+    assert state["last_question_asked"] in reply
+
+if __name__ == "__main__":
+    test_colloquial_messages_name_their_complaint()
+    test_negated_words_are_ignored()
+    test_unclear_messages_settle_for_the_category_or_nothing()
+    test_opening_message_skips_the_menus()
+    print("Triage checks passed.")